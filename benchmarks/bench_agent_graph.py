@@ -0,0 +1,272 @@
+"""End-to-end benchmark of the agent graph with a scripted local fake model.
+
+Generates synthetic repositories, then drives build_agent_graph through a full
+planner -> analyzer -> planner -> editor -> planner run whose tool calls and routing
+keywords are predetermined, so everything but the LLM is measured. Each repository
+size runs in a fresh process, and the report is printed (or written) as JSON so
+results can be compared across commits.
+
+Usage:
+    python benchmarks/bench_agent_graph.py [--sizes 1000,10000,100000] [--runs 3] [-o results.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import redirect_stdout
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage
+
+FILES_PER_DIR = 100
+TARGET_FILE = "pkg_0000/module_00000.py"
+
+MODULE_TEMPLATE = '''"""Synthetic module {index}."""
+import os
+
+
+class Handler{index}:
+    """Handles requests for module {index}."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def process(self, items):
+        total = 0
+        for item in items:
+            total += len(str(item))
+        return total
+
+    def describe(self):
+        return f"Handler{index}({{self.name}})"
+
+
+def helper_{index}(value):
+    return value * {index}
+
+
+def load_{index}(path):
+    with open(path) as f:
+        return f.read()
+'''
+
+
+def generate_repo(root: str, num_files: int) -> None:
+    """Write `num_files` Python modules, FILES_PER_DIR per package directory."""
+    for index in range(num_files):
+        package = os.path.join(root, f"pkg_{index // FILES_PER_DIR:04d}")
+        if index % FILES_PER_DIR == 0:
+            os.makedirs(package, exist_ok=True)
+            with open(os.path.join(package, "__init__.py"), "w") as f:
+                f.write("")
+        with open(os.path.join(package, f"module_{index:05d}.py"), "w") as f:
+            f.write(MODULE_TEMPLATE.format(index=index))
+
+
+def benchmark_script() -> List[AIMessage]:
+    """Planner, analyzer and editor turns covering every routing keyword of the graph."""
+    def call(name: str, args: Dict, call_id: str) -> Dict:
+        return {"name": name, "args": args, "id": call_id}
+
+    return [
+        AIMessage(content="Looking at the repository layout.",
+                  tool_calls=[call("get_repo_tree", {}, "call_tree")]),
+        AIMessage(content=f"ANALYZE CODE\nproblem_statement: helper_0 returns the wrong value in {TARGET_FILE}"),
+        AIMessage(content="Reading the module.", tool_calls=[
+            call("get_class_and_function_info", {"relative_file_path": TARGET_FILE}, "call_outline"),
+            call("get_function_info", {"relative_file_path": TARGET_FILE, "function_name": "helper_0"}, "call_func"),
+            call("open_file", {"relative_file_path": TARGET_FILE, "line_number": 21}, "call_open"),
+        ]),
+        AIMessage(content="helper_0 multiplies by zero.\nANALYSIS COMPLETE"),
+        AIMessage(content=f"EDIT FILE\nFix helper_0 in {TARGET_FILE}"),
+        AIMessage(content="Locating the function.", tool_calls=[
+            call("find_file", {"file_name": "module_00000.py"}, "call_find"),
+            call("search_file", {"search_term": "def helper_0", "file_path": TARGET_FILE}, "call_search"),
+            call("open_file", {"relative_file_path": TARGET_FILE, "line_number": 21}, "call_open_edit"),
+        ]),
+        AIMessage(content="Applying the fix.", tool_calls=[
+            call("edit_file", {"start_line": 21, "end_line": 22,
+                               "content": "def helper_0(value):\n    return value\n",
+                               "filename": TARGET_FILE}, "call_edit"),
+        ]),
+        AIMessage(content="EDITING COMPLETED"),
+        AIMessage(content="The fix is in place.\nPATCH COMPLETED"),
+    ]
+
+
+class TimingHandler(BaseCallbackHandler):
+    """Collects the duration of every graph node and tool call from the callback events."""
+
+    def __init__(self, node_names):
+        self.node_names = set(node_names)
+        self.starts: Dict = {}
+        self.nodes: Dict[str, List[float]] = defaultdict(list)
+        self.tools: Dict[str, List[float]] = defaultdict(list)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        name = kwargs.get("name")
+        if name not in self.node_names or (metadata or {}).get("langgraph_node") != name:
+            return
+        # Agent nodes wrap a runnable of the same name, only the outer run is the node
+        parent = self.starts.get(parent_run_id)
+        if parent is None or parent[1] != name:
+            self.starts[run_id] = ("node", name, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self.finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.finish(run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self.starts[run_id] = ("tool", kwargs.get("name") or serialized.get("name"), time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self.finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.finish(run_id)
+
+    def finish(self, run_id) -> None:
+        start = self.starts.pop(run_id, None)
+        if start is not None:
+            kind, name, began = start
+            (self.nodes if kind == "node" else self.tools)[name].append(time.perf_counter() - began)
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict]:
+    return {
+        name: {
+            "calls": len(times),
+            "total_ms": round(sum(times) * 1000, 3),
+            "mean_ms": round(statistics.mean(times) * 1000, 3),
+            "max_ms": round(max(times) * 1000, 3),
+        }
+        for name, times in sorted(samples.items())
+    }
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def bench_size(num_files: int, runs: int, work_dir: str) -> Dict:
+    """Benchmark one repository size. Runs in its own process so peak RSS is per size."""
+    # Configuration warnings are printed on import, stdout is reserved for the report
+    with redirect_stdout(sys.stderr):
+        from code_agent import main as agent_main
+        from code_agent.fake_llm import FakeChatModel
+        from code_agent.shared_context import drop_workspace, use_workspace
+
+    agent_main.console.quiet = True
+    result = {"files": num_files}
+
+    start = time.perf_counter()
+    template_repo = os.path.join(work_dir, f"repo_{num_files}")
+    generate_repo(template_repo, num_files)
+    result["generate_s"] = round(time.perf_counter() - start, 3)
+
+    llm = FakeChatModel(responses=benchmark_script())
+    node_names = ["planner", "code_editor", "code_analysis", "HIL",
+                  "planner_tool", "code_edit_tool", "code_analysis_tool"]
+    handler = TimingHandler(node_names)
+    index_times, compile_times, wall_times, steps = [], [], [], []
+
+    for run in range(runs):
+        # The run edits a file, so every run starts from a fresh copy with a cold index
+        repo = os.path.join(work_dir, f"run_{num_files}_{run}")
+        shutil.copytree(template_repo, repo)
+        repo = os.path.realpath(repo)
+        with use_workspace(repo) as workspace:
+            run_start = time.perf_counter()
+            workspace.ensure_repo_index()
+            index_times.append(time.perf_counter() - run_start)
+
+            compile_start = time.perf_counter()
+            graph = agent_main.build_agent_graph(llm, auto_approve=True, prompt_caching=False)
+            compile_times.append(time.perf_counter() - compile_start)
+
+            state = {"messages": [agent_main.HumanMessage(content=f"Fix helper_0 repo_path={repo}")],
+                     "sender": "user"}
+            config = {"recursion_limit": 100, "callbacks": [handler]}
+            # Tools print progress to stdout
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                steps.append(sum(1 for _ in graph.stream(state, config=config)))
+            wall_times.append(time.perf_counter() - run_start)
+        drop_workspace(repo)
+        shutil.rmtree(repo, ignore_errors=True)
+
+    result.update({
+        "runs": runs,
+        "steps_per_run": steps[0],
+        "index_s": round(statistics.median(index_times), 3),
+        "compile_s": round(statistics.median(compile_times), 3),
+        "wall_s": round(statistics.median(wall_times), 3),
+        "wall_s_all": [round(t, 3) for t in wall_times],
+        "nodes": summarize(handler.nodes),
+        "tools": summarize(handler.tools),
+        "peak_rss_mb": peak_rss_mb(),
+    })
+    return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma separated repository sizes in files")
+    parser.add_argument("--runs", type=int, default=3, help="Graph runs per size (the median is reported)")
+    parser.add_argument("--work-dir", help="Directory for the generated repositories (default: a temp dir)")
+    parser.add_argument("-o", "--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="codehawk-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    report = {
+        "commit": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [],
+    }
+    try:
+        context = multiprocessing.get_context("spawn")
+        for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+            with context.Pool(1) as pool:
+                result = pool.apply(bench_size, (size, args.runs, work_dir))
+            report["results"].append(result)
+            print(f"{size:>7} files: wall {result['wall_s']:.3f} s, index {result['index_s']:.3f} s, "
+                  f"peak RSS {result['peak_rss_mb']} MB", file=sys.stderr)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
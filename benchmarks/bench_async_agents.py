@@ -0,0 +1,54 @@
+"""Compare throughput of sequential run_agent calls against concurrent arun_agents sessions.
+
+Uses a local fake chat model with a simulated response latency, so no provider is called.
+
+Usage:
+    python benchmarks/bench_async_agents.py [--sessions 32] [--concurrency 16] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_agent import main as agent_main
+from code_agent.fake_llm import FakeChatModel, default_script
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per LLM call")
+    parser.add_argument("--workspace", default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    args = parser.parse_args()
+
+    agent_main.console.quiet = True
+    llm = FakeChatModel(responses=default_script(), latency=args.latency)
+    run = {"question": "benchmark", "model": llm, "workspace_dir": args.workspace, "auto_approve": True}
+
+    # Warm the workspace index so both paths measure only the agent runs
+    agent_main.run_agent(**run)
+
+    start = time.perf_counter()
+    for _ in range(args.sessions):
+        agent_main.run_agent(**run)
+    sync_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = asyncio.run(agent_main.arun_agents([run] * args.sessions, concurrency=args.concurrency))
+    async_time = time.perf_counter() - start
+    failures = [r for r in results if isinstance(r, BaseException)]
+
+    print(f"{args.sessions} sessions, {args.latency * 1000:.0f} ms per LLM call")
+    print(f"{'sync run_agent':<28}{sync_time:8.2f} s  {args.sessions / sync_time:8.2f} sessions/s")
+    print(f"{'arun_agents (x' + str(args.concurrency) + ')':<28}{async_time:8.2f} s  "
+          f"{args.sessions / async_time:8.2f} sessions/s  {sync_time / async_time:5.1f}x")
+    if failures:
+        print(f"{len(failures)} async sessions failed, first error: {failures[0]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Compare the wall time of a multi-file analysis with and without fan-out.
+
+Generates a repository whose problem involves `--files` modules. The analyzer
+without fan-out opens them one LLM turn at a time, as the code_analysis agent does;
+with fan-out one single-turn analyzer per file runs, `--concurrency` at a time.
+Uses a local fake chat model with a simulated response latency, so no provider is
+called.
+
+Usage:
+    python benchmarks/bench_fanout.py [--files 8] [--concurrency 1 4 8] [--latency 0.3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage
+
+from code_agent import main as agent_main
+from code_agent.fake_llm import FakeChatModel
+
+
+def write_repo(root: str, files: int) -> list:
+    paths = []
+    for i in range(files):
+        path = os.path.join("service", f"handler_{i}.py")
+        os.makedirs(os.path.join(root, "service"), exist_ok=True)
+        with open(os.path.join(root, path), "w") as f:
+            f.write(f"class Handler{i}:\n    def load_settings(self, path):\n        return open(path).read()\n\n")
+            f.write("".join(f"def helper_{i}_{j}(x):\n    return x + {j}\n\n" for j in range(200)))
+        paths.append(path)
+    return paths
+
+
+def planner(files: int) -> FakeChatModel:
+    # The first turn asks for the analysis, every later one ends the run
+    analyze = AIMessage(content="ANALYZE CODE\nproblem_statement: load_settings of every handler leaks the file")
+    return FakeChatModel(responses=[analyze] + [AIMessage(content="PATCH COMPLETED")] * (files + 3))
+
+
+def sequential_analyzer(paths: list, latency: float) -> FakeChatModel:
+    opens = [AIMessage(content="", tool_calls=[{"name": "open_file", "args": {"relative_file_path": path},
+                                                "id": f"open_{i}"}])
+             for i, path in enumerate(paths)]
+    return FakeChatModel(responses=opens + [AIMessage(content="load_settings must close the file.\nANALYSIS COMPLETE")],
+                         latency=latency)
+
+
+def file_analyzer(latency: float) -> FakeChatModel:
+    return FakeChatModel(responses=[AIMessage(content="load_settings (line 2) must close the file it opens.")],
+                         latency=latency)
+
+
+def timed(run) -> tuple:
+    start = time.perf_counter()
+    result = agent_main.run_agent(**run)
+    return time.perf_counter() - start, result["budget"]["llm_calls"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=8, help="Files involved in the problem")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.3, help="Simulated seconds per analyzer LLM call")
+    args = parser.parse_args()
+
+    agent_main.console.quiet = True
+    with tempfile.TemporaryDirectory() as root:
+        paths = write_repo(root, args.files)
+        run = {"question": "Fix load_settings", "workspace_dir": root, "auto_approve": True}
+
+        # Warm the workspace index so every configuration measures only the analysis
+        agent_main.run_agent(**run, model=planner(args.files), role_models={"code_analysis": file_analyzer(0)},
+                             fanout=args.files)
+
+        baseline, calls = timed({**run, "model": planner(args.files),
+                                 "role_models": {"code_analysis": sequential_analyzer(paths, args.latency)}})
+        print(f"{args.files} files, {args.latency * 1000:.0f} ms per analyzer LLM call")
+        print(f"{'one turn per file':<28}{baseline:8.2f} s  {calls:3d} LLM calls")
+        for concurrency in args.concurrency:
+            elapsed, calls = timed({**run, "model": planner(args.files),
+                                    "role_models": {"code_analysis": file_analyzer(args.latency)},
+                                    "fanout": {"max_files": args.files, "concurrency": concurrency}})
+            print(f"{'fan-out (x' + str(concurrency) + ')':<28}{elapsed:8.2f} s  {calls:3d} LLM calls  "
+                  f"{baseline / elapsed:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Import-time benchmark of the CLI entry point, with a regression threshold.
+
+Imports a module (the CLI's `test` by default) in fresh interpreters started with
+`-X importtime`, reports the median total import time and the slowest imported
+packages, and exits with status 1 when the median is above `--threshold` ms or
+when a module that should load lazily (a provider SDK, a notebook-only package) was
+imported anyway. Run it in CI or before a release:
+
+    python benchmarks/bench_import_time.py [--module test] [--runs 5] [--threshold 1500] [-o report.json]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the CLI path must not import at startup
+LAZY_MODULES = (
+    "langchain_openai",
+    "langchain_anthropic",
+    "langchain_google_genai",
+    "google.api_core",
+    "IPython",
+    "networkx",
+    "tree_sitter_languages",
+    "pygments",
+    "grep_ast",
+)
+
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def measure(module: str) -> Dict:
+    """Import `module` in a fresh interpreter and parse its `-X importtime` output."""
+    script = f"import sys, json, {module}; print(json.dumps(sorted(sys.modules)))"
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    self_us: Dict[str, int] = {}
+    cumulative_us: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            own, total, _indent, name = match.groups()
+            self_us[name] = int(own)
+            cumulative_us[name] = int(total)
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return {"total_ms": cumulative_us[module] / 1000, "self_us": self_us, "modules": loaded}
+
+
+def top_packages(runs: List[Dict], top: int) -> List[Dict]:
+    """Slowest top-level packages by the median self time of all their modules across runs."""
+    per_package = defaultdict(list)
+    for run in runs:
+        totals = defaultdict(int)
+        for name, own_us in run["self_us"].items():
+            totals[name.split(".")[0]] += own_us
+        for name, total_us in totals.items():
+            per_package[name].append(total_us)
+    rows = [{"package": name, "ms": round(statistics.median(values) / 1000, 1)}
+            for name, values in per_package.items()]
+    return sorted(rows, key=lambda row: row["ms"], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="test", help="Module to import (default: the CLI entry point)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure (the median is reported)")
+    parser.add_argument("--threshold", type=float, default=1500, help="Fail when the median import time is above this many ms")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest packages to report")
+    parser.add_argument("-o", "--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    # A first import warms the bytecode and OS file caches
+    measure(args.module)
+    runs = [measure(args.module) for _ in range(args.runs)]
+    median_ms = statistics.median(run["total_ms"] for run in runs)
+    eager = sorted({name for run in runs for name in LAZY_MODULES if name in run["modules"]})
+
+    report = {
+        "module": args.module,
+        "python": sys.version.split()[0],
+        "runs_ms": [round(run["total_ms"], 1) for run in runs],
+        "median_ms": round(median_ms, 1),
+        "threshold_ms": args.threshold,
+        "eager_modules": eager,
+        "slowest_packages": top_packages(runs, args.top),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    failures = []
+    if median_ms > args.threshold:
+        failures.append(f"median import time {median_ms:.0f} ms is above the {args.threshold:.0f} ms threshold")
+    if eager:
+        failures.append(f"modules that should load lazily were imported: {', '.join(eager)}")
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
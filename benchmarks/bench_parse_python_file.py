@@ -0,0 +1,120 @@
+"""Benchmark parse_python_file against the previous ast.walk based implementation.
+
+Usage:
+    python benchmarks/bench_parse_python_file.py [--classes 200] [--methods 20] [--functions 500]
+"""
+import argparse
+import ast
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_agent.structure import get_function_signature, parse_python_file
+
+
+def legacy_parse_python_file(file_path, file_content):
+    """The ast.walk implementation parse_python_file used before the shallow scanner."""
+    parsed_data = ast.parse(file_content)
+    class_info = []
+    function_names = []
+    class_methods = set()
+
+    for node in ast.walk(parsed_data):
+        if isinstance(node, ast.ClassDef):
+            methods = []
+            for n in node.body:
+                if isinstance(n, ast.FunctionDef):
+                    methods.append({
+                        "name": n.name,
+                        "signature": "def " + get_function_signature(n),
+                        "start_line": n.lineno,
+                        "end_line": n.end_lineno,
+                        "text": "\n".join(file_content.splitlines()[n.lineno - 1 : n.end_lineno]),
+                    })
+                    class_methods.add(n.name)
+            class_info.append({
+                "name": node.name,
+                "start_line": node.lineno,
+                "end_line": node.end_lineno,
+                "text": "\n".join(file_content.splitlines()[node.lineno - 1 : node.end_lineno]),
+                "methods": methods,
+            })
+        elif isinstance(node, ast.FunctionDef):
+            if node.name not in class_methods:
+                function_names.append({
+                    "name": node.name,
+                    "signature": get_function_signature(node),
+                    "start_line": node.lineno,
+                    "end_line": node.end_lineno,
+                    "text": "\n".join(file_content.splitlines()[node.lineno - 1 : node.end_lineno]),
+                })
+
+    return class_info, function_names, file_content.splitlines()
+
+
+def generate_module(num_classes: int, num_methods: int, num_functions: int) -> str:
+    """Generate a large module with classes, methods and top-level functions."""
+    parts = []
+    for c in range(num_classes):
+        parts.append(f"class Generated{c}:\n    \"\"\"Class {c}.\"\"\"\n")
+        for m in range(num_methods):
+            parts.append(
+                f"    def method_{m}(self, a, b=1, *args, **kwargs):\n"
+                f"        total = a + b\n"
+                f"        for item in args:\n"
+                f"            total += item\n"
+                f"        return total\n\n"
+            )
+    for f in range(num_functions):
+        parts.append(
+            f"def function_{f}(x, y=2):\n"
+            f"    \"\"\"Function {f}.\"\"\"\n"
+            f"    def helper(z):\n"
+            f"        return z * 2\n"
+            f"    return helper(x) + y\n\n"
+        )
+    return "".join(parts)
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classes", type=int, default=200)
+    parser.add_argument("--methods", type=int, default=20)
+    parser.add_argument("--functions", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    code = generate_module(args.classes, args.methods, args.functions)
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False, encoding="utf-8") as f:
+        f.write(code)
+        path = f.name
+
+    try:
+        num_lines = code.count("\n")
+        legacy = best_of(args.repeat, legacy_parse_python_file, path, code)
+        scanner_content = best_of(args.repeat, parse_python_file, path, code)
+        scanner_file = best_of(args.repeat, parse_python_file, path)
+
+        print(f"Module: {num_lines} lines, {args.classes} classes x {args.methods} methods, "
+              f"{args.functions} functions")
+        print(f"{'legacy ast.walk':<28}{legacy * 1000:10.1f} ms")
+        print(f"{'scanner (content)':<28}{scanner_content * 1000:10.1f} ms  {legacy / scanner_content:6.1f}x")
+        print(f"{'scanner (line index)':<28}{scanner_file * 1000:10.1f} ms  {legacy / scanner_file:6.1f}x")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Measure the tool calls that follow a response with and without speculative prefetch.
+
+Generates a repository of large modules, then times the open_file, search_file and
+get_class_and_function_info calls an analyzer makes on the files a planner
+response names: once on cold caches and once after Prefetcher has processed the
+response. The OS page cache is warm in both cases, so the difference is the line
+index, outline and search work the prefetcher moves off the critical path.
+
+Usage:
+    python benchmarks/bench_prefetch.py [--files 4] [--lines 100000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage
+
+from code_agent import line_index
+from code_agent.prefetch import Prefetcher, response_text
+from code_agent.shared_context import get_workspace, use_workspace
+from code_agent.tools import get_class_and_function_info, open_file, search_file
+
+
+def write_repo(root: str, files: int, lines: int) -> list:
+    os.makedirs(os.path.join(root, "pkg"), exist_ok=True)
+    paths = []
+    for i in range(files):
+        path = f"pkg/module_{i}.py"
+        with open(os.path.join(root, path), "w") as f:
+            f.write(f"def load_table_{i}(rows):\n    return [row for row in rows]\n\n")
+            f.write("".join(f"CONSTANT_{j} = {j}  # padding line of generated module\n" for j in range(lines)))
+        paths.append(path)
+    return paths
+
+
+def tool_calls(paths: list) -> float:
+    start = time.perf_counter()
+    for i, path in enumerate(paths):
+        open_file.invoke({"relative_file_path": path, "line_number": 1})
+        search_file.invoke({"search_term": f"load_table_{i}", "file_path": path})
+        get_class_and_function_info.invoke({"relative_file_path": path})
+    return time.perf_counter() - start
+
+
+def cold(workspace) -> None:
+    line_index._cache.clear()
+    workspace.repo_index.outlines.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--lines", type=int, default=100_000, help="Lines per generated module")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = write_repo(root, args.files, args.lines)
+        workspace = get_workspace(root)
+        workspace.ensure_repo_index()
+        response = AIMessage(content="ANALYZE CODE\nThe bug is in " +
+                             ", ".join(f"`load_table_{i}` of {path}" for i, path in enumerate(paths)))
+        with use_workspace(workspace):
+            cold(workspace)
+            baseline = tool_calls(paths)
+
+            cold(workspace)
+            prefetcher = Prefetcher(workspace)
+            start = time.perf_counter()
+            prefetcher.prefetch(response_text(response))
+            prefetcher.pool.shutdown(wait=True)
+            warm_up = time.perf_counter() - start
+            prefetched = tool_calls(paths)
+
+    print(f"{args.files} files of {args.lines} lines, {len(paths) * 3} tool calls")
+    print(f"{'cold caches':<28}{baseline * 1000:9.1f} ms")
+    print(f"{'after prefetch':<28}{prefetched * 1000:9.1f} ms  {baseline / max(prefetched, 1e-9):6.1f}x  "
+          f"(prefetch took {warm_up * 1000:.1f} ms in the background)")
+    print(prefetcher.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark console rendering of large tool outputs against the previous render_step.
+
+Renders graph steps carrying `open_file`-like tool results of growing size to a
+terminal console writing into memory, with the previous implementation (markup
+parsed and highlighted, output printed whole) and with StepRenderer at each
+verbosity.
+
+Usage:
+    python benchmarks/bench_render.py [--sizes 10000 100000 1000000] [--steps 20]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, ToolMessage
+from rich.console import Console
+
+from code_agent.display import VERBOSITIES, StepRenderer
+from code_agent.main import COLORS
+
+
+def legacy_render_step(console: Console, step):
+    """The tool result path of the render_step run_agent used before StepRenderer."""
+    for key, value in step.items():
+        for message in value["messages"]:
+            if isinstance(message, ToolMessage):
+                console.print(f"\n[{key.upper()} - TOOL RESULT]: [bold]{message.name}[/bold]", style=COLORS[key])
+                console.print(message.content.strip() + "\n", style=COLORS[key])
+            else:
+                console.print(f"\n[{key.upper()}]: {message.content}\n", style=COLORS[key])
+
+
+def tool_output(size: int) -> str:
+    line = 'def handler(request): return {"status": 200, "items": [1, 2, 3], "path": "/api/v1/items"}  # line'
+    lines = []
+    total = 0
+    while total < size:
+        lines.append(f"{len(lines) + 1}: {line}")
+        total += len(lines[-1]) + 1
+    return "\n".join(lines)
+
+
+def terminal() -> Console:
+    return Console(file=io.StringIO(), force_terminal=True, color_system="truecolor", width=120)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Tool output sizes in bytes")
+    parser.add_argument("--steps", type=int, default=20, help="Steps rendered per measurement")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        steps = [
+            {"code_analysis": {"messages": [AIMessage(content="Opening the handler.")]}},
+            {"code_analysis_tool": {"messages": [ToolMessage(content=tool_output(size), name="open_file",
+                                                             tool_call_id="1")]}},
+        ] * (args.steps // 2)
+
+        console = terminal()
+        start = time.perf_counter()
+        for step in steps:
+            legacy_render_step(console, step)
+        legacy = time.perf_counter() - start
+        print(f"{size:>9} bytes  legacy  {legacy * 1000:9.1f} ms  {len(console.file.getvalue()):>10} chars written")
+
+        for verbosity in VERBOSITIES:
+            console = terminal()
+            renderer = StepRenderer(console, COLORS, verbosity=verbosity)
+            start = time.perf_counter()
+            for step in steps:
+                renderer.render_step(step)
+            renderer.close()
+            elapsed = time.perf_counter() - start
+            print(f"{'':>9}        {verbosity:<7} {elapsed * 1000:9.1f} ms  {len(console.file.getvalue()):>10} chars written"
+                  f"  ({legacy / max(elapsed, 1e-9):.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -27,17 +27,47 @@ os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY or ""
 os.environ["GROQ_API_KEY"] = GROQ_API_KEY or ""
 os.environ["ANTHROPIC_API_KEY"] = ANTHROPIC_API_KEY or ""
 
-from .core import CodeStructureAnalyzer
-from .code_walker import find_src_files, filter_important_files
-from .progress import Spinner
-from .repo_mapper import Tag, get_ranked_tags
-from .tree_context import TreeContext, to_tree, render_tree
+# Public names and their submodules, imported on first access so that importing
+# the package (or one of its light submodules) doesn't load the whole agent
+_EXPORTS = {
+    'CodeStructureAnalyzer': '.core',
+    'RepoIndex': '.core',
+    'find_src_files': '.code_walker',
+    'filter_important_files': '.code_walker',
+    'Spinner': '.progress',
+    'WorkspaceContext': '.shared_context',
+    'get_workspace': '.shared_context',
+    'use_workspace': '.shared_context',
+    'Tag': '.repo_mapper',
+    'get_ranked_tags': '.repo_mapper',
+    'TreeContext': '.tree_context',
+    'to_tree': '.tree_context',
+    'render_tree': '.tree_context',
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
 
 __all__ = [
     'CodeStructureAnalyzer',
+    'RepoIndex',
     'find_src_files',
     'filter_important_files',
     'Spinner',
+    'WorkspaceContext',
+    'get_workspace',
+    'use_workspace',
     'Tag',
     'get_ranked_tags',
     'TreeContext',
@@ -0,0 +1,100 @@
+"""Structured next-action signalling between the agents and the routers.
+
+Each agent is bound an extra `next_action` tool whose `action` argument is limited
+to the moves it can make. The agent node strips that call from the AI message and
+stores the action in the graph state, so the routers dispatch on it instead of
+searching the text for keywords. The keywords are still written into the message
+(and still matched when the model doesn't call the tool), so the history reads
+the same either way.
+"""
+from typing import Dict, Literal, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field, create_model
+
+NEXT_ACTION_TOOL = "next_action"
+
+# Action name -> the keyword the prompts use for it
+ACTION_KEYWORDS: Dict[str, str] = {
+    "analyze_code": "ANALYZE CODE",
+    "ask_user": "ASK USER",
+    "edit_file": "EDIT FILE",
+    "patch_completed": "PATCH COMPLETED",
+    "analysis_complete": "ANALYSIS COMPLETE",
+    "file_opened": "FILE OPENED",
+    "editing_completed": "EDITING COMPLETED",
+}
+
+PLANNER_ACTIONS = ("analyze_code", "ask_user", "edit_file", "patch_completed")
+ANALYZER_ACTIONS = ("analysis_complete", "edit_file")
+EDITOR_ACTIONS = ("file_opened", "editing_completed")
+
+
+def next_action_tool(actions: Tuple[str, ...]) -> StructuredTool:
+    """The `next_action` tool for an agent that can take `actions`.
+
+    It is only bound to the model, never executed: the agent node removes the call.
+    """
+    schema = create_model(
+        "NextAction",
+        __base__=BaseModel,
+        action=(Literal[actions], Field(description="What should happen next")),
+        summary=(str, Field(default="", description="Instructions or findings for the next agent")),
+    )
+
+    def next_action(action: str, summary: str = "") -> str:
+        return action
+
+    listing = ", ".join(f"{action} ({ACTION_KEYWORDS[action]})" for action in actions)
+    return StructuredTool.from_function(
+        next_action,
+        name=NEXT_ACTION_TOOL,
+        description=f"Hand control to the next step of the workflow. Call it alone, after your other "
+                    f"tool results are in. Actions: {listing}.",
+        args_schema=schema,
+    )
+
+
+def extract_next_action(message: BaseMessage) -> Tuple[BaseMessage, Optional[str]]:
+    """Remove `next_action` calls from an AI message and return the cleaned message and the action.
+
+    The action is dropped when the message also calls real tools: they run first and
+    the agent decides again with their results. The action keyword and summary are
+    appended to the text, so the message never ends up empty.
+    """
+    if not isinstance(message, AIMessage):
+        return message, None
+    calls = [call for call in message.tool_calls if call["name"] == NEXT_ACTION_TOOL]
+    if not calls:
+        return message, None
+
+    ids = {call.get("id") for call in calls}
+    remaining = [call for call in message.tool_calls if call["name"] != NEXT_ACTION_TOOL]
+    args = calls[-1]["args"]
+    action = args.get("action") if not remaining and args.get("action") in ACTION_KEYWORDS else None
+
+    content = message.content
+    if isinstance(content, list):
+        # Anthropic responses repeat the tool calls as tool_use blocks
+        content = [block for block in content
+                   if not (isinstance(block, dict) and block.get("type") == "tool_use" and block.get("id") in ids)]
+    additional_kwargs = dict(message.additional_kwargs)
+    if "tool_calls" in additional_kwargs:
+        additional_kwargs["tool_calls"] = [call for call in additional_kwargs["tool_calls"] if call.get("id") not in ids]
+        if not additional_kwargs["tool_calls"]:
+            del additional_kwargs["tool_calls"]
+
+    if action is not None:
+        note = "\n".join(part for part in (ACTION_KEYWORDS[action], args.get("summary", "")) if part)
+        if isinstance(content, list):
+            content = content + [{"type": "text", "text": note}]
+        else:
+            content = f"{content}\n{note}" if content else note
+
+    cleaned = message.model_copy(update={
+        "content": content,
+        "tool_calls": remaining,
+        "additional_kwargs": additional_kwargs,
+    })
+    return cleaned, action
@@ -0,0 +1,359 @@
+"""Approval of proposed changes without blocking the graph.
+
+When the planner asks for approval ("ASK USER"), the HIL node builds a proposal
+from its message (the code it wants to write, the number of lines and the files
+it names) and hands it to the run's approval backend:
+
+- `AutoApprove` accepts everything, for unattended runs.
+- `PolicyApprover` accepts a proposal of at most `max_lines` lines of code whose
+  files all match an `allowed_paths` glob, and passes anything else to its
+  `fallback` backend, or rejects it with the reasons when there is none.
+- `InteractiveApprover` asks on the terminal.
+- `QueueApprover` writes the proposal to a directory an external reviewer (a
+  person, a bot, the server's POST /approve) answers in.
+
+A backend that can't decide on the spot makes the node call langgraph's
+`interrupt`: the run stops after checkpointing its state, and run_agent resolves
+the request outside the graph (prompting, or reading the queue) and resumes it
+with `Command(resume=decision)`. A queued request left unanswered ends the run
+as pending; it continues with --resume once a decision was written, from this or
+any other process.
+
+Reviewers can answer the queue with:
+
+    python -m code_agent.approval [--queue DIR] list
+    python -m code_agent.approval [--queue DIR] approve THREAD_ID
+    python -m code_agent.approval [--queue DIR] reject THREAD_ID --reason "Keep the public API"
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional, Sequence, Union
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+DEFAULT_QUEUE_DIR = os.path.join(".codehawk", "approvals")
+MODES = ("interactive", "auto", "policy", "queue")
+
+CODE_BLOCK = re.compile(r"```[\w+-]*\n(.*?)```", re.DOTALL)
+PATH = re.compile(r"(?<![\w/.-])(?:\.{0,2}/)?(?:[\w.-]+/)*[\w-]+\.\w+")
+
+
+def decision(approved: bool, reviewer: str, reason: str = "") -> Dict:
+    return {"approved": approved, "reviewer": reviewer, "reason": reason}
+
+
+def feedback_message(result: Dict) -> HumanMessage:
+    """The message the planner reads for a decision."""
+    text = "User feedback: yes" if result.get("approved") else "User feedback: no"
+    if result.get("reason"):
+        text += f". {result['reason']}"
+    return HumanMessage(content=text)
+
+
+def mentioned_paths(text: str, root: str) -> List[str]:
+    """Workspace-relative paths named in `text` outside its code blocks.
+
+    A candidate counts when it contains a directory separator or exists in the
+    workspace, so dotted names like `os.path` aren't taken for files. Paths that
+    leave the workspace keep their "../" or absolute form.
+    """
+    prose = CODE_BLOCK.sub("", text)
+    paths = []
+    for candidate in PATH.findall(prose):
+        full = os.path.realpath(os.path.join(root, candidate))
+        if "/" not in candidate and not os.path.exists(full):
+            continue
+        relative = os.path.relpath(full, root).replace(os.sep, "/")
+        path = full if os.path.isabs(candidate) and relative.startswith("..") else relative
+        if path not in paths:
+            paths.append(path)
+    return paths
+
+
+def build_proposal(messages: Sequence[BaseMessage], root: str) -> Dict:
+    """The change the last AI message proposes: its text, code, code line count and files."""
+    text = ""
+    for message in reversed(messages):
+        if isinstance(message, AIMessage) and isinstance(message.content, str) and message.content.strip():
+            text = message.content
+            break
+    blocks = [block.strip("\n") for block in CODE_BLOCK.findall(text)]
+    code = "\n\n".join(blocks)
+    return {
+        "text": text,
+        "code": code or "No code changes found",
+        "lines": sum(len(block.splitlines()) for block in blocks),
+        "paths": mentioned_paths(text, root),
+        "id": hashlib.sha1(text.encode("utf-8")).hexdigest()[:12],
+    }
+
+
+class ApprovalBackend:
+    """Decides on proposals. `review` runs inside the graph and must not block; it
+    returns None when the decision has to wait, which interrupts the graph until
+    `resolve` (called by the run loop) returns one."""
+
+    name = "backend"
+    # Whether review can return None and interrupt the graph
+    interrupts = True
+    # Whether the decision can arrive after the process exits, so the run needs a persistent checkpoint
+    persistent = False
+
+    def review(self, proposal: Dict) -> Optional[Dict]:
+        return None
+
+    def resolve(self, request: Dict, thread_id: str) -> Optional[Dict]:
+        """Decision for an interrupted run's request, or None while it is still pending.
+
+        Backends that never interrupt are never asked; by default nothing is decided.
+        """
+        return None
+
+
+class AutoApprove(ApprovalBackend):
+    name = "auto"
+    interrupts = False
+
+    def review(self, proposal: Dict) -> Optional[Dict]:
+        return decision(True, "auto")
+
+
+class InteractiveApprover(ApprovalBackend):
+    name = "interactive"
+
+    def resolve(self, request: Dict, thread_id: str) -> Optional[Dict]:
+        proposal = request["proposal"]
+        print("\nProposed code changes:")
+        print(proposal["code"])
+        if proposal["paths"]:
+            print(f"\nFiles: {', '.join(proposal['paths'])}")
+        print("\nDo you approve these changes? (yes/no, or what to change instead):")
+        answer = input().strip()
+        if "yes" in answer.lower() or answer.lower() == "y":
+            return decision(True, "user")
+        return decision(False, "user", "" if answer.lower() in ("no", "n") else answer)
+
+
+class QueueApprover(ApprovalBackend):
+    """Proposals written to `directory` as <thread_id>.request.json, answered by
+    <thread_id>.decision.json. `wait` seconds are spent polling for the answer
+    before the run ends as pending."""
+
+    persistent = True
+
+    def __init__(self, directory: str = DEFAULT_QUEUE_DIR, wait: float = 0, poll_interval: float = 0.5):
+        self.directory = os.path.abspath(directory)
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self.name = f"queue {self.directory}"
+
+    def request_path(self, thread_id: str) -> str:
+        return os.path.join(self.directory, f"{thread_id}.request.json")
+
+    def decision_path(self, thread_id: str) -> str:
+        return os.path.join(self.directory, f"{thread_id}.decision.json")
+
+    def submit(self, request: Dict, thread_id: str) -> None:
+        write_json(self.request_path(thread_id), {**request, "thread_id": thread_id, "submitted": time.time()})
+
+    def take_decision(self, request: Dict, thread_id: str) -> Optional[Dict]:
+        """The decision for `request`, removing it and the request from the queue."""
+        try:
+            with open(self.decision_path(thread_id), "r", encoding="utf-8") as f:
+                answer = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if answer.get("id") not in (None, request["proposal"]["id"]):
+            # Written for an earlier proposal of the thread
+            return None
+        for path in (self.decision_path(thread_id), self.request_path(thread_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        return decision(bool(answer.get("approved")), answer.get("reviewer") or "reviewer", answer.get("reason") or "")
+
+    def resolve(self, request: Dict, thread_id: str) -> Optional[Dict]:
+        found = self.take_decision(request, thread_id)
+        if found is not None:
+            return found
+        if not os.path.exists(self.request_path(thread_id)):
+            self.submit(request, thread_id)
+        deadline = time.monotonic() + self.wait
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            found = self.take_decision(request, thread_id)
+            if found is not None:
+                return found
+        return None
+
+
+class PolicyApprover(ApprovalBackend):
+    """Accepts proposals within the rules and defers the others to `fallback`.
+
+    `allowed_paths` are fnmatch globs of workspace-relative paths ("*" also matches
+    "/"). A proposal that names no file can't be checked against them and is
+    deferred too.
+    """
+
+    def __init__(self, max_lines: Optional[int] = None, allowed_paths: Optional[Sequence[str]] = None,
+                 fallback: Optional[ApprovalBackend] = None):
+        self.max_lines = max_lines
+        self.allowed_paths = list(allowed_paths) if allowed_paths else None
+        self.fallback = fallback
+        self.interrupts = fallback.interrupts if fallback else False
+        self.persistent = fallback.persistent if fallback else False
+        rules = []
+        if max_lines is not None:
+            rules.append(f"at most {max_lines} lines")
+        if self.allowed_paths:
+            rules.append(f"paths {', '.join(self.allowed_paths)}")
+        self.name = f"policy ({'; '.join(rules) or 'no rules'})" + (f", else {fallback.name}" if fallback else "")
+
+    def violations(self, proposal: Dict) -> List[str]:
+        found = []
+        if self.max_lines is not None and proposal["lines"] > self.max_lines:
+            found.append(f"the change has {proposal['lines']} lines of code, more than {self.max_lines}")
+        if self.allowed_paths is not None:
+            if not proposal["paths"]:
+                found.append("the proposal names no files to check against the allowed paths")
+            outside = [path for path in proposal["paths"]
+                       if not any(fnmatch.fnmatch(path, pattern) for pattern in self.allowed_paths)]
+            if outside:
+                found.append(f"{', '.join(outside)} not in the allowed paths")
+        return found
+
+    def review(self, proposal: Dict) -> Optional[Dict]:
+        found = self.violations(proposal)
+        if not found:
+            return decision(True, "policy")
+        if self.fallback is None:
+            return decision(False, "policy", f"Not approved automatically: {'; '.join(found)}.")
+        return self.fallback.review(proposal)
+
+    def resolve(self, request: Dict, thread_id: str) -> Optional[Dict]:
+        return self.fallback.resolve(request, thread_id)
+
+
+def make_approver(options: Union[None, str, Dict, ApprovalBackend], auto_approve: bool = False) -> ApprovalBackend:
+    """Approval backend from a mode name or an options dict.
+
+    Options: "mode" (one of MODES), for "policy" "max_lines", "allowed_paths" and
+    "fallback" (a mode or options dict), for "queue" "queue_dir" and "wait".
+    Without options, `auto_approve` selects AutoApprove, otherwise the terminal is asked.
+    """
+    if isinstance(options, ApprovalBackend):
+        return options
+    if options is None:
+        options = "auto" if auto_approve else "interactive"
+    if isinstance(options, str):
+        options = {"mode": options}
+    mode = options.get("mode", "interactive")
+    if mode == "auto":
+        return AutoApprove()
+    if mode == "interactive":
+        return InteractiveApprover()
+    if mode == "queue":
+        return QueueApprover(options.get("queue_dir") or DEFAULT_QUEUE_DIR, options.get("wait") or 0)
+    if mode == "policy":
+        fallback = options.get("fallback")
+        return PolicyApprover(options.get("max_lines"), options.get("allowed_paths"),
+                              make_approver(fallback) if fallback else None)
+    raise ValueError(f"Unknown approval mode {mode!r}, expected one of {', '.join(MODES)}")
+
+
+def approval_node(approver: ApprovalBackend):
+    """The HIL graph node. The run's backend can also come from the config's
+    configurable as "approver", for graphs shared between runs."""
+    from langgraph.types import interrupt
+
+    from .shared_context import current_workspace
+
+    def node(state, config):
+        backend = (config or {}).get("configurable", {}).get("approver", approver)
+        proposal = build_proposal(state["messages"], str(current_workspace().root_path))
+        result = backend.review(proposal)
+        if result is None:
+            # Returns the resumed decision; the first time it stops the run here
+            result = interrupt({"proposal": proposal, "backend": backend.name})
+        return {"messages": [feedback_message(result)], "sender": "user"}
+
+    return node
+
+
+def pending_request(snapshot) -> Optional[Dict]:
+    """The approval request an interrupted run waits on, from its state snapshot."""
+    for task in snapshot.tasks:
+        for pending in task.interrupts:
+            if isinstance(pending.value, dict) and "proposal" in pending.value:
+                return pending.value
+    return None
+
+
+def write_json(path: str, data: Dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    # Readers never see a partly written file
+    os.replace(temporary, path)
+
+
+def write_decision(thread_id: str, approved: bool, reason: str = "", reviewer: str = "reviewer",
+                   queue_dir: str = DEFAULT_QUEUE_DIR) -> Dict:
+    """Answer the queued request of `thread_id`."""
+    queue = QueueApprover(queue_dir)
+    answer = {"approved": approved, "reason": reason, "reviewer": reviewer}
+    try:
+        with open(queue.request_path(thread_id), "r", encoding="utf-8") as f:
+            answer["id"] = json.load(f)["proposal"]["id"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        # Answered ahead of the request, it applies to whatever the thread proposes next
+        pass
+    write_json(queue.decision_path(thread_id), answer)
+    return answer
+
+
+def list_requests(queue_dir: str = DEFAULT_QUEUE_DIR) -> List[Dict]:
+    if not os.path.isdir(queue_dir):
+        return []
+    requests = []
+    for name in sorted(os.listdir(queue_dir)):
+        if name.endswith(".request.json"):
+            with open(os.path.join(queue_dir, name), "r", encoding="utf-8") as f:
+                requests.append(json.load(f))
+    return requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Review the proposals waiting in an approval queue.")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_DIR, help="Queue directory of the runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List the waiting proposals")
+    show = commands.add_parser("show", help="Print a waiting proposal")
+    show.add_argument("thread_id")
+    for verb in ("approve", "reject"):
+        command = commands.add_parser(verb, help=f"{verb.capitalize()} the proposal of a thread")
+        command.add_argument("thread_id")
+        command.add_argument("--reason", default="", help="Told to the planner, e.g. what to change instead")
+        command.add_argument("--reviewer", default=os.getenv("USER", "reviewer"))
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for request in list_requests(args.queue):
+            proposal = request["proposal"]
+            print(f"{request['thread_id']}  {proposal['lines']:>4} lines  {', '.join(proposal['paths']) or '-'}")
+    elif args.command == "show":
+        with open(QueueApprover(args.queue).request_path(args.thread_id), "r", encoding="utf-8") as f:
+            print(json.load(f)["proposal"]["text"])
+    else:
+        write_decision(args.thread_id, args.command == "approve", args.reason, args.reviewer, args.queue)
+        verdict = "Approved" if args.command == "approve" else "Rejected"
+        print(f"{verdict} {args.thread_id}; continue the run with --resume --thread-id {args.thread_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Batch runner that solves many tasks in parallel, one isolated worker process per task.
+
+Tasks are read from a JSONL file, one task per line. SWE-bench style fields are
+understood:
+
+    {"instance_id": "...", "problem_statement": "...", "repo_path": "/path/to/repo", "base_commit": "..."}
+
+(`task_id`/`id`, `question` and `workspace` are accepted as aliases.) Every task
+runs in its own process on its own copy of the repository, and one result line per
+task is appended to the output JSONL as soon as it finishes. Restarting with the
+same output file skips the tasks that already completed.
+
+Usage:
+    python -m code_agent.batch tasks.jsonl -o results.jsonl -j 8 -m claude
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+def task_id_of(task: Dict) -> str:
+    return str(task.get("instance_id") or task.get("task_id") or task.get("id"))
+
+
+def load_tasks(tasks_path: str) -> List[Dict]:
+    """Read tasks from a JSONL file, skipping blank lines."""
+    tasks = []
+    with open(tasks_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            task = json.loads(line)
+            if task_id_of(task) == "None":
+                task["task_id"] = f"task-{line_no}"
+            tasks.append(task)
+    return tasks
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """Return the ids of tasks that already completed in a previous run of the batch."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash, the task will simply run again
+                continue
+            if result.get("status") == "completed":
+                completed.add(result["task_id"])
+    return completed
+
+
+def git(workspace: str, *args: str) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=workspace, check=True, capture_output=True, text=True
+    ).stdout
+
+
+def prepare_workspace(repo_path: str, work_dir: str, task_id: str, base_commit: Optional[str] = None) -> str:
+    """Create a private copy of the repository for one task.
+
+    Git repositories are cloned locally (sharing objects with the original), other
+    directories are copied and committed to a scratch repository, so the patch can
+    always be taken with `git diff`.
+    """
+    workspace = tempfile.mkdtemp(prefix=f"{task_id.replace('/', '_')}-", dir=work_dir)
+    if os.path.isdir(os.path.join(repo_path, ".git")):
+        subprocess.run(["git", "clone", "-q", "--local", "--shared", repo_path, workspace],
+                       check=True, capture_output=True)
+        if base_commit:
+            git(workspace, "checkout", "-q", base_commit)
+    else:
+        shutil.copytree(repo_path, workspace, dirs_exist_ok=True)
+        git(workspace, "init", "-q")
+        git(workspace, "add", "-A")
+        git(workspace, "-c", "user.name=codehawk", "-c", "user.email=codehawk@localhost",
+            "commit", "-q", "--allow-empty", "-m", "base")
+    return workspace
+
+
+def collect_patch(workspace: str) -> str:
+    """Return the diff of everything the agent changed, new files included."""
+    git(workspace, "add", "-A")
+    return git(workspace, "diff", "--cached", "HEAD")
+
+
+def run_task(task: Dict, options: Dict) -> Dict:
+    """Solve one task. Runs inside a worker process."""
+    task_id = task_id_of(task)
+    question = task.get("problem_statement") or task.get("question", "")
+    repo_path = task.get("repo_path") or task.get("workspace") or options["repo_path"]
+    result = {"task_id": task_id, "status": "error", "patch": "", "final_message": None,
+              "error": None, "timings": {}}
+    timings = result["timings"]
+    start = time.perf_counter()
+    workspace = None
+
+    log_dir = options.get("log_dir")
+    log_path = os.path.join(log_dir, f"{task_id.replace('/', '_')}.log") if log_dir else os.devnull
+    with open(log_path, "w", encoding="utf-8") as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            workspace = prepare_workspace(repo_path, options["work_dir"], task_id, task.get("base_commit"))
+            timings["setup_s"] = time.perf_counter() - start
+
+            from code_agent.main import run_agent
+            agent_start = time.perf_counter()
+            outcome = run_agent(
+                question=question,
+                model=options["model"],
+                temperature=options["temperature"],
+                workspace_dir=workspace,
+                auto_approve=True,
+                # Without a log directory the console output is discarded anyway
+                verbosity="summary" if log_dir else "quiet",
+            )
+            timings["agent_s"] = time.perf_counter() - agent_start
+            result["final_message"] = outcome["final_message"] if outcome else None
+
+            patch_start = time.perf_counter()
+            result["patch"] = collect_patch(workspace)
+            timings["patch_s"] = time.perf_counter() - patch_start
+            result["status"] = "completed"
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        finally:
+            if workspace and not options.get("keep_workspaces"):
+                shutil.rmtree(workspace, ignore_errors=True)
+
+    timings["total_s"] = time.perf_counter() - start
+    return result
+
+
+def run_pool(tasks: List[Dict], options: Dict, pool_args: Dict,
+             record: Callable[[Dict, Dict], None]) -> Tuple[List[Dict], List[Dict]]:
+    """Run `tasks` in one process pool, passing each task and its result to `record`.
+
+    At most `max_workers` tasks are submitted at a time, so when a worker dies
+    (e.g. killed by the OS) and breaks the pool, the tasks it may have been running
+    are known. Returns those in-flight tasks and the ones not yet submitted; both
+    lists are empty when every task ran.
+    """
+    queue = deque(tasks)
+    running = {}
+    with ProcessPoolExecutor(**pool_args) as pool:
+        while queue or running:
+            while queue and len(running) < pool_args["max_workers"]:
+                task = queue.popleft()
+                try:
+                    running[pool.submit(run_task, task, options)] = task
+                except BrokenProcessPool:
+                    queue.appendleft(task)
+                    return list(running.values()), list(queue)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = []
+            for future in done:
+                task = running.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    broken.append(task)
+                    continue
+                except Exception as e:
+                    result = {"task_id": task_id_of(task), "status": "error", "patch": "", "final_message": None,
+                              "error": f"{type(e).__name__}: {e}", "timings": {}}
+                record(task, result)
+            if broken:
+                return broken + list(running.values()), list(queue)
+    return [], []
+
+
+def run_batch(
+    tasks: Iterable[Dict],
+    output_path: str,
+    concurrency: int = 4,
+    model: str = "claude",
+    temperature: float = 0,
+    repo_path: Optional[str] = None,
+    work_dir: Optional[str] = None,
+    log_dir: Optional[str] = None,
+    keep_workspaces: bool = False,
+) -> Dict[str, int]:
+    """Run all tasks not yet completed in `output_path`, at most `concurrency` at a time."""
+    completed = load_completed(output_path)
+    pending = [task for task in tasks if task_id_of(task) not in completed]
+    counts = {"skipped": len(completed), "completed": 0, "error": 0}
+    if not pending:
+        return counts
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix="codehawk-batch-")
+    os.makedirs(work_dir, exist_ok=True)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    options = {
+        "model": model,
+        "temperature": temperature,
+        "repo_path": repo_path,
+        "work_dir": work_dir,
+        "log_dir": log_dir,
+        "keep_workspaces": keep_workspaces,
+    }
+
+    # A fresh process per task where supported, so no state leaks between tasks
+    pool_args = {"max_workers": concurrency, "mp_context": multiprocessing.get_context("spawn")}
+    if sys.version_info >= (3, 11):
+        pool_args["max_tasks_per_child"] = 1
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        def record(task: Dict, result: Dict):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            counts[result["status"]] += 1
+            print(f"[{result['status']}] {task_id_of(task)} ({result['timings'].get('total_s', 0):.1f}s)")
+
+        while pending:
+            in_flight, pending = run_pool(pending, options, pool_args, record)
+            # A dead worker breaks the whole pool, failing every in-flight task with it.
+            # Rerun those alone so only the task that kills its worker again is
+            # recorded as failed; the rest continue in a fresh pool.
+            for task in in_flight:
+                crashed, _ = run_pool([task], options, {**pool_args, "max_workers": 1}, record)
+                if crashed:
+                    record(task, {"task_id": task_id_of(task), "status": "error", "patch": "",
+                                  "final_message": None, "error": "BrokenProcessPool: the worker process died",
+                                  "timings": {}})
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve a JSONL file of tasks in parallel worker processes.")
+    parser.add_argument("tasks", help="JSONL file with one task per line")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file results are appended to")
+    parser.add_argument("-j", "--concurrency", type=int, default=4, help="Number of tasks run at once")
+    parser.add_argument("-m", "--model", default="claude", help="The model to use (claude, gemini or llama)")
+    parser.add_argument("-t", "--temperature", type=float, default=0)
+    parser.add_argument("-w", "--workspace", help="Repository used for tasks that don't name one")
+    parser.add_argument("--work-dir", help="Directory for the per-task repository copies")
+    parser.add_argument("--log-dir", help="Directory for per-task agent logs")
+    parser.add_argument("--keep-workspaces", action="store_true", help="Don't delete the per-task copies")
+    args = parser.parse_args()
+
+    counts = run_batch(
+        load_tasks(args.tasks),
+        args.output,
+        concurrency=args.concurrency,
+        model=args.model,
+        temperature=args.temperature,
+        repo_path=args.workspace,
+        work_dir=args.work_dir,
+        log_dir=args.log_dir,
+        keep_workspaces=args.keep_workspaces,
+    )
+    print(f"Completed: {counts['completed']}, errors: {counts['error']}, "
+          f"skipped (already done): {counts['skipped']}")
+
+
+if __name__ == "__main__":
+    main()
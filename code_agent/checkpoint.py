@@ -0,0 +1,158 @@
+"""SQLite checkpointing of agent runs, so an interrupted run resumes where it stopped.
+
+Every checkpoint stores the whole message history, so on long runs the same
+large tool outputs would be written again at every step. `CompactSqliteSaver`
+moves message bodies above `min_blob_chars` into a `blobs` table keyed by their
+hash, written once per body in the same transaction as the checkpoint; the
+checkpoints themselves only keep a short reference.
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+DEFAULT_CHECKPOINT_DB = os.path.join(".codehawk", "checkpoints.sqlite")
+BLOB_MARKER = "\x00blob:"
+
+
+def new_thread_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class BlobSerializer(SerializerProtocol):
+    """JsonPlus serialization with large message bodies replaced by blob references.
+
+    New bodies wait in `pending` until the saver writes them with its next transaction.
+    """
+
+    def __init__(self, saver: "CompactSqliteSaver", min_blob_chars: int = 2048):
+        self.saver = saver
+        self.min_blob_chars = min_blob_chars
+        self.inner = JsonPlusSerializer()
+        self.pending: Dict[str, str] = {}
+        self.stored = set()
+        self._lock = threading.Lock()
+
+    def externalize(self, obj: Any) -> Any:
+        """Copy of `obj` whose large message bodies are blob references. Other values are shared."""
+        if isinstance(obj, BaseMessage):
+            content = obj.content
+            if not isinstance(content, str) or len(content) < self.min_blob_chars:
+                return obj
+            digest = hashlib.sha1(content.encode("utf-8", "replace")).hexdigest()
+            with self._lock:
+                if digest not in self.stored:
+                    self.pending[digest] = content
+            return obj.model_copy(update={"content": BLOB_MARKER + digest})
+        if isinstance(obj, dict):
+            return {key: self.externalize(value) for key, value in obj.items()}
+        if isinstance(obj, list):
+            return [self.externalize(value) for value in obj]
+        if isinstance(obj, tuple) and not hasattr(obj, "_fields"):
+            return tuple(self.externalize(value) for value in obj)
+        return obj
+
+    def internalize(self, obj: Any) -> Any:
+        if isinstance(obj, BaseMessage):
+            content = obj.content
+            if isinstance(content, str) and content.startswith(BLOB_MARKER):
+                obj.content = self.saver.load_blob(content[len(BLOB_MARKER):])
+            return obj
+        if isinstance(obj, dict):
+            for key, value in obj.items():
+                obj[key] = self.internalize(value)
+        elif isinstance(obj, list):
+            for i, value in enumerate(obj):
+                obj[i] = self.internalize(value)
+        elif isinstance(obj, tuple) and not hasattr(obj, "_fields"):
+            return tuple(self.internalize(value) for value in obj)
+        return obj
+
+    def take_pending(self) -> Dict[str, str]:
+        with self._lock:
+            pending, self.pending = self.pending, {}
+            self.stored.update(pending)
+        return pending
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.inner.dumps(self.externalize(obj))
+
+    def loads(self, data: bytes) -> Any:
+        return self.internalize(self.inner.loads(data))
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return self.inner.dumps_typed(self.externalize(obj))
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return self.internalize(self.inner.loads_typed(data))
+
+
+class CompactSqliteSaver(SqliteSaver):
+    """SqliteSaver that stores large message bodies once, with async methods run in a thread."""
+
+    def __init__(self, conn, min_blob_chars: int = 2048):
+        super().__init__(conn)
+        self.serde = BlobSerializer(self, min_blob_chars)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.execute("CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self.conn.commit()
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator:
+        with super().cursor(transaction) as cur:
+            yield cur
+            # Bodies referenced by what was just written go into the same transaction
+            pending = self.serde.take_pending() if transaction else None
+            if pending:
+                cur.executemany("INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)", pending.items())
+
+    def load_blob(self, digest: str) -> str:
+        # Called while deserializing, with the saver's lock already held by this thread
+        row = self.conn.execute("SELECT data FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            raise KeyError(f"Checkpoint blob {digest} is missing")
+        return row[0]
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        def list_all():
+            return list(self.list(config, filter=filter, before=before, limit=limit))
+
+        for item in await asyncio.to_thread(list_all):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = ""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+
+@contextmanager
+def open_checkpointer(db_path: Optional[str], min_blob_chars: int = 2048) -> Iterator[Optional[CompactSqliteSaver]]:
+    """Checkpointer on the SQLite file `db_path`, or None when no path is given."""
+    if not db_path:
+        yield None
+        return
+    directory = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        yield CompactSqliteSaver(conn, min_blob_chars)
+    finally:
+        conn.close()
@@ -0,0 +1,225 @@
+"""Thin client of the CodeHawk server (see server.py).
+
+Imports only the standard library, so a question reaches the warm server in
+milliseconds. The run's events are printed as they stream in. Requests carry the
+server's token, read from the file the server writes at startup (see token_path)
+unless given with --token or CODEHAWK_TOKEN:
+
+    python -m code_agent.client -q "Fix the failing test" -w path/to/repo --auto-approve
+    python -m code_agent.client --status
+    python -m code_agent.client --server unix:/tmp/codehawk.sock -q "..." --auto-approve --json
+    python -m code_agent.client -q "..." --approval policy --approve-max-lines 40 --approval-fallback queue
+    python -m code_agent.client --approve --thread-id 3f2a9c01d4e5
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+from typing import Dict, Iterator, Optional
+
+DEFAULT_SERVER = os.getenv("CODEHAWK_SERVER", "127.0.0.1:8765")
+TOKEN_DIR = os.path.join(os.path.expanduser("~"), ".codehawk")
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def connect(address: str, timeout: Optional[float] = None) -> http.client.HTTPConnection:
+    """Connection to "host:port", "http://host:port" or "unix:/path/to/socket"."""
+    if address.startswith("unix:"):
+        return UnixHTTPConnection(address[len("unix:"):], timeout)
+    if address.startswith("http://"):
+        address = address[len("http://"):]
+    host, _, port = address.rstrip("/").rpartition(":")
+    return http.client.HTTPConnection(host or "127.0.0.1", int(port), timeout=timeout)
+
+
+def token_path(address: str) -> str:
+    """The file the server at `address` writes its token to: next to its socket, or per port in ~/.codehawk."""
+    if address.startswith("unix:"):
+        return address[len("unix:"):] + ".token"
+    port = address.rstrip("/").rpartition(":")[2]
+    return os.path.join(TOKEN_DIR, f"server-{port}.token")
+
+
+def read_token(address: str) -> Optional[str]:
+    token = os.getenv("CODEHAWK_TOKEN")
+    if token:
+        return token
+    try:
+        with open(token_path(address), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def request(address: str, method: str, path: str, body: Optional[Dict] = None,
+            token: Optional[str] = None) -> http.client.HTTPResponse:
+    connection = connect(address)
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    headers = {"Content-Type": "application/json"} if data is not None else {}
+    token = token or read_token(address)
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    connection.request(method, path, body=data, headers=headers)
+    response = connection.getresponse()
+    if response.status != 200:
+        detail = json.loads(response.read() or b"{}").get("error", response.reason)
+        raise RuntimeError(f"Server returned {response.status}: {detail}")
+    return response
+
+
+def call(address: str, method: str, path: str, body: Optional[Dict] = None, token: Optional[str] = None) -> Dict:
+    return json.loads(request(address, method, path, body, token).read())
+
+
+def stream_run(address: str, run: Dict, token: Optional[str] = None) -> Iterator[Dict]:
+    """Send a run to the server and yield its events as they arrive."""
+    response = request(address, "POST", "/run", run, token)
+    for line in response:
+        if line.strip():
+            yield json.loads(line)
+
+
+def content_text(content) -> str:
+    if isinstance(content, list):
+        return "\n".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return content or ""
+
+
+def print_event(event: Dict, max_tool_chars: int = 2000) -> None:
+    kind = event["event"]
+    if kind == "run_start":
+        print(f"[run {event['thread_id']}] setup {event['setup_ms']} ms "
+              f"(graph {'warm' if event['graph_cached'] else 'built'}, index {'warm' if event['index_warm'] else 'building'})")
+    elif kind == "step":
+        for node, update in event["step"].items():
+            for message in (update or {}).get("messages", []):
+                text = content_text(message.get("content")).strip()
+                if message["type"] == "tool":
+                    if len(text) > max_tool_chars:
+                        text = text[:max_tool_chars] + f"\n... ({len(text) - max_tool_chars} more characters)"
+                    print(f"\n[{node.upper()} - TOOL RESULT]: {message.get('name')}\n{text}")
+                    continue
+                if text:
+                    print(f"\n[{node.upper()}]: {text}")
+                for tool_call in message.get("tool_calls", []):
+                    print(f"[{node.upper()} - USING TOOL]: {tool_call['name']}({json.dumps(tool_call['args'])[:200]})")
+    elif kind == "run_end":
+        result = event["result"]
+        budget = result.get("budget", {})
+        print(f"\n[DONE]: {result['steps']} steps in {result.get('wall_s')} s, "
+              f"{budget.get('llm_calls')} LLM calls, thread {result.get('thread_id')}")
+        pending = result.get("pending_approval")
+        if pending:
+            proposal = pending["proposal"]
+            print(f"\n[APPROVAL]: waiting for {pending['backend']}: {proposal['lines']} lines of code in "
+                  f"{', '.join(proposal['paths']) or 'unnamed files'}. Decide with --approve or --reject "
+                  f"--thread-id {result.get('thread_id')}")
+    elif kind == "error":
+        print(f"\n[ERROR]: {event['error']}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a request to a running CodeHawk server.")
+    parser.add_argument("-q", "--question", help="The natural language request for the agent")
+    parser.add_argument("-m", "--model", default="claude", help="The model to use (claude, gemini or llama)")
+    parser.add_argument("--analysis-model", help="Model of the code analysis agent, defaults to --model")
+    parser.add_argument("--editor-model", help="Model of the code editing agent, defaults to --model")
+    parser.add_argument("--escalate", action="store_true", help="Retry invalid tool calls and stalls of the role models on --model")
+    parser.add_argument("--fanout", type=int, help="Analyze up to this many candidate files in parallel, one analyzer each")
+    parser.add_argument("--no-prefetch", action="store_true", help="Don't warm the files and symbols the agents mention ahead of their tool calls")
+    parser.add_argument("-w", "--workspace", default=os.getcwd(), help="The workspace directory (defaults to the current directory)")
+    parser.add_argument("--server", default=DEFAULT_SERVER, help="host:port or unix:/path of the server (env CODEHAWK_SERVER)")
+    parser.add_argument("--token", help="The server's token, read from the file it writes at startup by default (env CODEHAWK_TOKEN)")
+    parser.add_argument("--auto-approve", action="store_true", help="Accept proposed changes without prompting")
+    parser.add_argument("--approval", choices=["auto", "policy", "queue"], help="How proposed changes are approved (the server can't prompt)")
+    parser.add_argument("--approve-max-lines", type=int, help="Policy: approve proposals of at most this many lines of code")
+    parser.add_argument("--approve-paths", nargs="+", metavar="GLOB", help="Policy: approve proposals touching only these paths")
+    parser.add_argument("--approval-fallback", choices=["queue"], help="Policy: queue the proposals it doesn't approve instead of rejecting them")
+    parser.add_argument("--approve", action="store_true", help="Approve the queued proposal of --thread-id and continue the run")
+    parser.add_argument("--reject", action="store_true", help="Reject the queued proposal of --thread-id and continue the run")
+    parser.add_argument("--reason", default="", help="Reason for --approve/--reject, told to the planner")
+    parser.add_argument("--thread-id", help="Checkpoint thread of the run")
+    parser.add_argument("--resume", action="store_true", help="Resume the checkpointed run of --thread-id")
+    parser.add_argument("--refresh", action="store_true", help="Re-index the workspace before the run")
+    parser.add_argument("--max-llm-calls", type=int, help="Stop the run after this many LLM calls")
+    parser.add_argument("--warm", action="store_true", help="Only index the workspace and build the graph")
+    parser.add_argument("--status", action="store_true", help="Print the server status")
+    parser.add_argument("--shutdown", action="store_true", help="Stop the server")
+    parser.add_argument("--json", action="store_true", help="Print the raw NDJSON events")
+    args = parser.parse_args()
+
+    try:
+        if args.status or args.shutdown:
+            print(json.dumps(call(args.server, "GET", "/status", token=args.token) if args.status
+                             else call(args.server, "POST", "/shutdown", {}, args.token), indent=2))
+            return
+        # The same options select the same cached graph for /warm and /run
+        options = {
+            "model": args.model,
+            "workspace_dir": os.path.realpath(args.workspace),
+            "refresh": args.refresh,
+            "role_models": {"code_analysis": args.analysis_model, "code_editor": args.editor_model},
+            "escalate": args.escalate,
+            "fanout": args.fanout or None,
+        }
+        if args.warm:
+            print(json.dumps(call(args.server, "POST", "/warm", options, args.token)))
+            return
+        if args.approve or args.reject:
+            if not args.thread_id:
+                parser.error("--approve and --reject need the --thread-id of the run")
+            call(args.server, "POST", "/approve", {"thread_id": args.thread_id, "approved": args.approve,
+                                                   "reason": args.reason, "reviewer": os.getenv("USER", "reviewer")},
+                 args.token)
+            args.resume = True
+        if not args.question and not args.resume:
+            parser.error("a --question (or --resume) is required")
+
+        run = {
+            **options,
+            "question": args.question,
+            "auto_approve": args.auto_approve,
+            "thread_id": args.thread_id,
+            "resume": args.resume,
+            "prefetch": not args.no_prefetch,
+        }
+        if args.approval == "policy":
+            run["approval"] = {"mode": "policy", "max_lines": args.approve_max_lines,
+                               "allowed_paths": args.approve_paths, "fallback": args.approval_fallback}
+        elif args.approval:
+            run["approval"] = args.approval
+        elif args.approve or args.reject:
+            # The resumed run reads the decision from the queue
+            run["approval"] = "queue"
+        if args.max_llm_calls is not None:
+            run["budget"] = {"max_llm_calls": args.max_llm_calls or None}
+        failed = False
+        for event in stream_run(args.server, run, args.token):
+            failed = failed or event["event"] == "error"
+            if args.json:
+                print(json.dumps(event), flush=True)
+            else:
+                print_event(event)
+                sys.stdout.flush()
+        sys.exit(1 if failed else 0)
+    except (ConnectionError, FileNotFoundError) as e:
+        sys.exit(f"Can't reach the CodeHawk server at {args.server} ({e}); start it with python -m code_agent.server")
+    except RuntimeError as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Conversation compaction to keep prompt size bounded as the message history grows."""
+import hashlib
+from typing import Dict, List, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+# Prefix marking tool outputs that were already replaced by a stub
+STUB_PREFIX = "[Elided"
+
+
+def message_text(message: BaseMessage) -> str:
+    """Flatten message content (string or list of content blocks) into text."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    parts = []
+    for item in content:
+        if isinstance(item, dict):
+            parts.append(str(item.get("text") or item.get("input") or ""))
+        else:
+            parts.append(str(item))
+    return "\n".join(parts)
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """Cheap token estimate (about four characters per token) including tool call arguments."""
+    size = len(message_text(message))
+    if isinstance(message, AIMessage):
+        size += sum(len(str(call.get("args", ""))) for call in message.tool_calls)
+    return size // 4 + 4
+
+
+class ConversationCompactor:
+    """Replaces old tool outputs with short stubs once the history exceeds a token threshold.
+
+    The most recent `keep_recent_turns` AI turns, and the tool results that follow
+    them, are kept verbatim. Compacted tool messages keep their id and tool_call_id,
+    so every tool call still has its result and the add_messages reducer replaces
+    the stored message in place.
+    """
+
+    def __init__(self, max_tokens: int = 50_000, keep_recent_turns: int = 6, min_chars: int = 400):
+        self.max_tokens = max_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.min_chars = min_chars
+        self.tokens_saved = 0
+        self.messages_compacted = 0
+        self._stubs: Dict[str, str] = {}
+
+    def stub_for(self, message: ToolMessage) -> str:
+        """Short description of a tool output, cached by content."""
+        text = message_text(message)
+        key = hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()
+        if key not in self._stubs:
+            lines = text.splitlines()
+            first_line = lines[0].strip()[:120] if lines else ""
+            self._stubs[key] = (
+                f"{STUB_PREFIX} {message.name or 'tool'} output from an earlier turn: "
+                f"{len(lines)} lines, {len(text)} chars, starting with: {first_line!r}. "
+                f"Call the tool again if you need the full output.]"
+            )
+        return self._stubs[key]
+
+    def compact(self, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+        """Return stubbed replacements for old tool outputs, oldest first, until the history fits.
+
+        Returns an empty list when the history is already under the threshold.
+        """
+        total = sum(estimate_tokens(message) for message in messages)
+        if total <= self.max_tokens:
+            return []
+
+        # Everything from the start of the Nth most recent AI turn onwards is kept verbatim
+        boundary = len(messages)
+        turns = 0
+        for i in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[i], AIMessage):
+                turns += 1
+                boundary = i
+                if turns >= self.keep_recent_turns:
+                    break
+
+        replacements = []
+        for message in messages[:boundary]:
+            if total <= self.max_tokens:
+                break
+            if not isinstance(message, ToolMessage) or message.id is None:
+                continue
+            text = message_text(message)
+            if len(text) < self.min_chars or text.startswith(STUB_PREFIX):
+                continue
+
+            replacement = message.model_copy(update={"content": self.stub_for(message)})
+            saved = estimate_tokens(message) - estimate_tokens(replacement)
+            total -= saved
+            self.tokens_saved += saved
+            self.messages_compacted += 1
+            replacements.append(replacement)
+        return replacements
+
+    def apply(self, messages: Sequence[BaseMessage], replacements: Sequence[BaseMessage]) -> List[BaseMessage]:
+        """Return `messages` with the replacements swapped in by id."""
+        by_id = {message.id: message for message in replacements}
+        return [by_id.get(message.id, message) for message in messages]
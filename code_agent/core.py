@@ -1,44 +1,117 @@
-from typing import Annotated, Literal, Sequence, List, Set, Dict, Optional
+from typing import Annotated, Callable, Literal, Sequence, List, Set, Dict, Optional
 from typing_extensions import TypedDict
-from langchain.schema.language_model import BaseLanguageModel
-from langchain.agents import AgentExecutor
+from langchain_core.language_models import BaseLanguageModel
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END, START
 from langgraph.graph.message import add_messages
 from code_agent.config import PLANNER_PROMPT, CODE_ANALYZER_PROMPT, EDITING_AGENT_PROMPT
 from code_agent.tools import *
 from pathlib import Path
 import os
-import networkx as nx
+import operator
+import threading
 from collections import Counter
 from .code_walker import find_src_files, filter_important_files
 from .progress import Spinner
-from .repo_mapper import get_ranked_tags, Tag
+from .repo_mapper import get_ranked_tags, get_tags, Tag
 from .tree_context import to_tree
+from .file_index import FileIndex
+from .line_index import get_line_index
+from .structure import get_directory_node, create_file_entry
+from .compaction import ConversationCompactor
+from .actions import extract_next_action
+from .governor import RunGovernor
+from .prompt_cache import (
+    supports_prompt_caching, cached_system_message, cached_tool_schemas, mark_conversation_prefix
+)
 
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
     sender: str
+    next_action: Optional[str]
+    continue_calls: Annotated[int, operator.add]
+
+def create_agent_node(agent, name, compactor: Optional[ConversationCompactor] = None,
+                      governor: Optional[RunGovernor] = None):
+    """Wrap an agent as a graph node.
+
+    With a `compactor`, old tool outputs are replaced by stubs before the call once
+    the history grows past its threshold. The stubs are returned with the node's
+    output, so they also replace the stored messages.
+
+    A `next_action` tool call in the response is moved into the state's
+    `next_action`. Calls made because the router sent the agent back to itself
+    ("continue") are counted in `continue_calls`. With a `governor`, every response
+    is checked against the run's budgets and loop limits, and the governor's usage
+    is stored in the state's `budget`, so a resumed run keeps counting from it.
+
+    A graph shared between runs (see server.py) is built without them; each run
+    passes its own as "compactor" and "governor" in the config's configurable.
+    """
+    def run_parts(config):
+        configurable = (config or {}).get("configurable", {})
+        return configurable.get("compactor", compactor), configurable.get("governor", governor)
+
+    def prepare(state, compactor):
+        replacements = []
+        if compactor is not None:
+            replacements = compactor.compact(state["messages"])
+            if replacements:
+                state = {**state, "messages": compactor.apply(state["messages"], replacements)}
 
-def create_agent_node(agent, name):
-    def agent_node(state):
         # If last message is AI message, add a placeholder human message
+        continued = False
         if isinstance(state["messages"][-1], AIMessage):
+            continued = state.get("sender") == name
             state["messages"].append(HumanMessage(content="Placeholder message"))
+        return state, replacements, continued
 
-        result = agent.invoke(state)
-
+    def finish(result, replacements, continued, governor):
         if not isinstance(result, dict):
-            result = {"messages": [result], "sender": name}
-
+            message, action = extract_next_action(result)
+            messages = [message]
+            if governor is not None:
+                messages, action = governor.govern(name, message, action)
+            result = {
+                "messages": replacements + messages,
+                "sender": name,
+                "next_action": action,
+                "continue_calls": int(continued),
+            }
+            if governor is not None:
+                result["budget"] = governor.report()
         return result
 
-    return agent_node
+    def agent_node(state, config):
+        compactor, governor = run_parts(config)
+        state, replacements, continued = prepare(state, compactor)
+        return finish(agent.invoke(state), replacements, continued, governor)
+
+    async def aagent_node(state, config):
+        compactor, governor = run_parts(config)
+        state, replacements, continued = prepare(state, compactor)
+        return finish(await agent.ainvoke(state), replacements, continued, governor)
+
+    # The graph picks the sync or async path depending on stream() or astream()
+    return RunnableLambda(agent_node, afunc=aagent_node, name=name)
+
+def create_agent(system_prompt: str, tools: list = None, llm: BaseLanguageModel = None, prompt_caching: bool = True):
+    """Create an agent with given prompt and tools
+
+    With `prompt_caching`, models that support cache-control breakpoints get them on
+    the system prompt, the tool definitions and the conversation prefix.
+    """
+    if prompt_caching and supports_prompt_caching(llm):
+        prompt = ChatPromptTemplate.from_messages([
+            cached_system_message(system_prompt),
+            MessagesPlaceholder(variable_name="messages"),
+        ])
+        model = llm.bind_tools(cached_tool_schemas(tools)) if tools else llm
+        return prompt | RunnableLambda(mark_conversation_prefix) | model
 
-def create_agent(system_prompt: str, tools: list = None, llm: BaseLanguageModel = None):
-    """Create an agent with given prompt and tools"""
     prompt = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
         MessagesPlaceholder(variable_name="messages"),
@@ -49,30 +122,6 @@ def create_agent(system_prompt: str, tools: list = None, llm: BaseLanguageModel
     else:
         return prompt | llm
 
-def feedback(state):
-    """Gets feedback from the human user on whether to accept the proposed code changes."""
-    messages = state["messages"]
-
-    # Find the code content message
-    proposed_changes = "No code changes found"
-    for message in reversed(messages):
-        if isinstance(message, AIMessage):
-            import re
-            code_match = re.search(r'```(?:python)?\n(.*?)```', message.content, re.DOTALL)
-            if code_match:
-                proposed_changes = code_match.group(1).strip()
-                break
-    
-    print("\nProposed code changes:")
-    print(proposed_changes)
-    print("\nDo you approve these changes? (yes/no):")
-    
-    user_input = input().lower().strip()
-    return {
-        "messages": [HumanMessage(content=f"User feedback: {user_input}")], 
-        "sender": "user"
-    }
-
 def route_feedback(state) -> Literal["code_editor", "planner"]:
     """Routes to either code_editor or planner based on user feedback"""
     messages = state["messages"]
@@ -81,18 +130,166 @@ def route_feedback(state) -> Literal["code_editor", "planner"]:
     if not isinstance(last_message, HumanMessage):
         return "planner"
         
-    feedback = last_message.content.lower()
-    if "yes" in feedback:
-        return "code_editor" 
+    # Written by approval.feedback_message: "User feedback: yes" or "User feedback: no. <reason>"
+    answer = last_message.content.lower().split("user feedback:", 1)[-1].strip()
+    if answer.startswith("yes"):
+        return "code_editor"
     else:
         return "planner"
 
-class CodeStructureAnalyzer:
-    """Main class for analyzing code structure and generating repository maps."""
+class RepoIndex:
+    """Index of a repository built from one walk and one read per file.
+
+    Owns the file listing, the `ast` structure, the tree-sitter tags and the
+    per-file outlines. Both parsers are fed from the same decoded contents.
+
+    Once built the index is shared by every run on the workspace, so files added
+    by `update_file` are recorded under `lock`; readers of the listing go through
+    `repo_tree` and `file_paths`, which take it too.
+    """
     
-    def __init__(self, root_path: str, max_map_tokens: int = 1024):
-        self.root_path = Path(root_path)
+    def __init__(self, root_path: str, max_map_tokens: int = 1024, with_tags: bool = True):
+        self.root_path = Path(root_path).resolve()
         self.max_map_tokens = max_map_tokens
+        self.with_tags = with_tags
+        self.structure: Dict = {}
+        self.files: List[str] = []
+        self.tags: Dict[str, List[Tag]] = {}
+        self.outlines: Dict[str, str] = {}
+        self.file_index = FileIndex(str(self.root_path))
+        self._tree_entries: Set[str] = set()
+        self._repo_tree: Optional[str] = None
+        self.lock = threading.RLock()
+
+    def build(self, on_listed: Optional[Callable[["RepoIndex"], None]] = None) -> "RepoIndex":
+        """Walk the repository once, reading and parsing every file a single time.
+
+        `on_listed` is called with the index as soon as the file listing (the repo
+        tree and the file index) is complete, before any file is parsed.
+        """
+        root_path = str(self.root_path)
+        directories = []
+        for root, _, files in os.walk(root_path):
+            rel_root = os.path.relpath(root, root_path)
+            # get_repo_tree hides dot directories and dot files, the structure keeps them
+            hidden = any(part.startswith('.') for part in Path(rel_root).parts)
+            if not hidden and rel_root != '.':
+                self._tree_entries.add(rel_root)
+
+            for file_name in files:
+                file_path = os.path.join(root, file_name)
+                self.files.append(file_path)
+                self.file_index.add(file_path)
+                if not hidden and not file_name.startswith('.'):
+                    self._tree_entries.add(os.path.join(rel_root, file_name))
+            directories.append((root, files))
+
+        if on_listed is not None:
+            on_listed(self)
+
+        for root, files in directories:
+            curr_struct = get_directory_node(self.structure, root_path, root)
+            for file_name in files:
+                curr_struct[file_name] = self._index_file(os.path.join(root, file_name))
+        return self
+
+    def _index_file(self, file_path: str) -> Dict:
+        """Read a file once and feed its contents to both the ast and tree-sitter parsers."""
+        rel_fname = os.path.relpath(file_path, self.root_path)
+        content = None
+        if file_path.endswith(".py"):
+            try:
+                content = get_line_index(file_path).read_text()
+            except (OSError, ValueError) as e:
+                print(f"Error in file {file_path}: {e}")
+                return {"classes": [], "functions": [], "text": ""}
+
+        if self.with_tags:
+            try:
+                self.tags[file_path] = get_tags(file_path, rel_fname, content)
+            except Exception as e:
+                print(f"Skipping tags for {file_path}: {e}")
+
+        return create_file_entry(file_path, content)
+
+    def update_file(self, file_path: str) -> None:
+        """Re-index a single file after it was created or edited."""
+        file_path = os.path.normpath(os.path.join(str(self.root_path), file_path))
+        root_path = str(self.root_path)
+        rel_fname = os.path.relpath(file_path, root_path)
+        if rel_fname.startswith(os.pardir) or not os.path.isfile(file_path):
+            return
+
+        # Parsed before taking the lock, only the bookkeeping happens under it
+        file_entry = self._index_file(file_path)
+        with self.lock:
+            if self.file_index.to_relative(file_path) not in self.file_index.paths:
+                self.files.append(file_path)
+                self.file_index.add(file_path)
+                parts = Path(rel_fname).parts
+                if not any(part.startswith('.') for part in parts):
+                    for i in range(1, len(parts)):
+                        self._tree_entries.add(os.path.join(*parts[:i]))
+                    entry = rel_fname if len(parts) > 1 else os.path.join('.', rel_fname)
+                    self._tree_entries.add(entry)
+                    self._repo_tree = None
+
+            curr_struct = get_directory_node(self.structure, root_path, os.path.dirname(file_path))
+            curr_struct[os.path.basename(file_path)] = file_entry
+            self.outlines.pop(self.file_index.to_relative(file_path), None)
+
+    def repo_tree(self) -> str:
+        """The repository tree, in the same format as the get_repo_tree tool."""
+        with self.lock:
+            if self._repo_tree is None:
+                self._repo_tree = '\n'.join(sorted(self._tree_entries))
+            return self._repo_tree
+
+    def file_paths(self) -> List[str]:
+        """A snapshot of the absolute paths of the repository's files."""
+        with self.lock:
+            return list(self.files)
+
+    def file_entry(self, relative_file_path: str) -> Optional[Dict]:
+        """Look up the structure entry of a file by its path relative to the repository root."""
+        parts = [part for part in relative_file_path.replace("\\", "/").split("/") if part not in ("", ".")]
+        if not parts:
+            return None
+        if parts[0] == self.root_path.name and parts[0] in self.structure and len(parts) > 1:
+            parts = parts[1:]
+        # Files at the root live under the repository name, sub directories at the top level
+        current_level = self.structure.get(self.root_path.name, {}) if len(parts) == 1 else self.structure
+        for part in parts:
+            if part not in current_level:
+                return None
+            current_level = current_level[part]
+        return current_level
+
+    def outline(self, relative_file_path: str) -> Optional[str]:
+        """The class and function outline of a file, formatted once and cached."""
+        key = self.file_index.to_relative(relative_file_path)
+        if key not in self.outlines:
+            entry = self.file_entry(key)
+            if entry is None:
+                return None
+            self.outlines[key] = format_class_and_function_info(entry)
+        return self.outlines[key]
+
+    def ranked_tags(
+        self,
+        chat_fnames: List[str],
+        other_fnames: List[str],
+        mentioned_fnames: Optional[Set[str]] = None,
+        mentioned_idents: Optional[Set[str]] = None,
+    ) -> List[Tag]:
+        """Rank tags using the tags collected while indexing instead of re-reading files."""
+        return get_ranked_tags(
+            chat_fnames,
+            other_fnames,
+            mentioned_fnames or set(),
+            mentioned_idents or set(),
+            tags_by_file=self.tags,
+        )
         
     def analyze_files(self, target_files: List[str]) -> Dict:
         """Analyze specified files and create a structure map."""
@@ -101,8 +298,18 @@ class CodeStructureAnalyzer:
         
         for fname in target_files:
             if Path(fname).is_dir():
-                chat_fnames += find_src_files(fname)
+                dir_path = Path(fname).resolve()
+                if dir_path == self.root_path or self.root_path in dir_path.parents:
+                    # Reuse the listing instead of walking the directory again
+                    prefix = str(dir_path) + os.sep
+                    chat_fnames += [f for f in self.files if f.startswith(prefix)]
+                else:
+                    chat_fnames += find_src_files(fname)
             else:
                 chat_fnames.append(fname)
                 
-        return chat_fnames, other_fnames
\ No newline at end of file
+        return chat_fnames, other_fnames
+
+
+# Kept for callers written against the original analyzer
+CodeStructureAnalyzer = RepoIndex
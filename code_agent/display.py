@@ -0,0 +1,291 @@
+"""Console display of agent runs.
+
+`StepRenderer` prints each completed graph step at one of three verbosities:
+"quiet" prints nothing but the end-of-run statistics, "summary" (the default)
+prints the agents' messages, the tools they call and a head and tail of each tool
+result, and "full" prints the tool results whole. Tool output is printed as plain
+`Text`, never parsed for markup or highlighted, and printing is batched to at most
+one console write per `min_interval`, so a run that reads megabytes of files
+doesn't spend its time in the terminal.
+
+With `stream_tokens`, run_agent streams the graph in "messages" mode next to the
+usual "updates" and `TokenStreamDisplay` renders the agents' partial responses as
+they arrive in a rich Live region. `TokenTimer` records the time to first token
+of every agent LLM call for the end-of-run metrics.
+"""
+import statistics
+import threading
+import time
+from typing import Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from rich.console import Console, Group
+from rich.live import Live
+from rich.text import Text
+
+from .actions import ACTION_KEYWORDS
+from .compaction import STUB_PREFIX, message_text
+
+AGENT_NODES = ("planner", "code_analysis", "code_editor")
+VERBOSITIES = ("quiet", "summary", "full")
+
+
+def chunk_text(chunk: BaseMessage) -> str:
+    """Text of a streamed chunk, without tool call argument deltas."""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content
+                   if isinstance(block, dict) and block.get("type") in ("text", "text_delta"))
+
+
+def size_label(text: str) -> str:
+    lines = text.count("\n") + 1
+    return f"{lines} line{'s' if lines != 1 else ''}, {len(text.encode('utf-8'))} bytes"
+
+
+def truncate(text: str, head_lines: int, tail_lines: int, max_chars: int) -> str:
+    """The first `head_lines` and last `tail_lines` lines of `text`, at most about `max_chars` long.
+
+    What is left out is replaced by a line giving its size, so a truncated output
+    still tells how much there was.
+    """
+    lines = text.split("\n")
+    if len(lines) > head_lines + tail_lines + 1:
+        tail = lines[len(lines) - tail_lines:] if tail_lines else []
+        omitted = "\n".join(lines[head_lines:len(lines) - tail_lines])
+        text = "\n".join(lines[:head_lines] + [f"... {size_label(omitted)} omitted ..."] + tail)
+    if len(text) > max_chars:
+        # A few very long lines, e.g. minified code or a JSON dump
+        half = max_chars // 2
+        omitted = text[half:len(text) - half]
+        text = f"{text[:half]}\n... {len(omitted.encode('utf-8'))} bytes omitted ...\n{text[len(text) - half:]}"
+    return text
+
+
+class TokenTimer(BaseCallbackHandler):
+    """Time to first token of every LLM call made by an agent node.
+
+    A call that isn't streamed counts its whole latency, as its first token is its
+    whole response.
+    """
+
+    # Timing needs the callbacks as they happen, not from an executor in async runs
+    run_inline = True
+
+    def __init__(self, nodes=AGENT_NODES):
+        self.nodes = set(nodes)
+        self.ttft: List[float] = []
+        self.tokens = 0
+        self._started: Dict = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs) -> None:
+        if (metadata or {}).get("langgraph_node") in self.nodes:
+            with self._lock:
+                self._started[run_id] = time.perf_counter()
+
+    def first_token(self, run_id) -> None:
+        with self._lock:
+            began = self._started.pop(run_id, None)
+            if began is not None:
+                self.ttft.append(time.perf_counter() - began)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs) -> None:
+        self.tokens += 1
+        self.first_token(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        self.first_token(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        with self._lock:
+            self._started.pop(run_id, None)
+
+    def report(self) -> Dict:
+        if not self.ttft:
+            return {"calls": 0}
+        return {
+            "calls": len(self.ttft),
+            "mean_s": round(statistics.mean(self.ttft), 3),
+            "median_s": round(statistics.median(self.ttft), 3),
+            "max_s": round(max(self.ttft), 3),
+            "streamed_tokens": self.tokens,
+        }
+
+    def summary(self) -> str:
+        report = self.report()
+        if not report["calls"]:
+            return "no LLM calls"
+        return (f"time to first token {report['mean_s']:.2f} s mean, {report['median_s']:.2f} s median, "
+                f"{report['max_s']:.2f} s max over {report['calls']} calls")
+
+
+class StepRenderer:
+    """Prints completed graph steps at a verbosity, batching the console writes.
+
+    Output is queued and written at most once per `min_interval` seconds; a timer
+    writes what is still queued when no further step arrives. `close` writes the
+    rest at the end of the run.
+    """
+
+    def __init__(self, console: Console, colors: Dict[str, str], verbosity: str = "summary",
+                 head_lines: int = 20, tail_lines: int = 5, max_chars: int = 4000, min_interval: float = 0.1):
+        if verbosity not in VERBOSITIES:
+            raise ValueError(f"Unknown verbosity {verbosity!r}, expected one of {', '.join(VERBOSITIES)}")
+        self.console = console
+        self.colors = colors
+        self.verbosity = verbosity
+        self.head_lines = head_lines
+        self.tail_lines = tail_lines
+        self.max_chars = max_chars
+        self.min_interval = min_interval
+        self._pending: List[Text] = []
+        self._last_write = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def emit(self, text: str, style: str = "") -> None:
+        with self._lock:
+            self._pending.append(Text(text, style=style))
+            wait = self.min_interval - (time.monotonic() - self._last_write)
+            if wait <= 0:
+                self._write()
+            elif self._timer is None:
+                self._timer = threading.Timer(wait, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write()
+
+    def _write(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            self.console.print(Group(*self._pending), highlight=False)
+            self._pending = []
+        self._last_write = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
+
+    def tool_body(self, content: str) -> str:
+        if self.verbosity == "full":
+            return content
+        return truncate(content, self.head_lines, self.tail_lines, self.max_chars)
+
+    def render_ai(self, label: str, message: AIMessage, style: str, show_text: bool = True) -> None:
+        text = message_text(message).strip() if show_text else ""
+        lines = text.split("\n")
+        action = next((line for line in lines if line in ACTION_KEYWORDS.values()), None)
+        if action:
+            self.emit(f"\n[{label} - ACTION]: {action}", style)
+            text = "\n".join(line for line in lines if line != action).strip()
+        if text:
+            self.emit(f"\n[{label}]: {text}", style)
+        for call in message.tool_calls:
+            self.emit(f"\n[{label} - USING TOOL]: {call['name']}", style)
+
+    def render_tool(self, label: str, message: ToolMessage, style: str) -> None:
+        content = str(message.content).strip()
+        if not content or content == "null":
+            self.emit(f"\n[{label} - TOOL COMPLETED]: {message.name}", style)
+            return
+        if content.startswith("```") and content.endswith("```"):
+            content = content[3:-3].strip()
+        self.emit(f"\n[{label} - TOOL RESULT]: {message.name} ({size_label(content)})", style)
+        self.emit(self.tool_body(content), "dim" if self.verbosity == "summary" else style)
+
+    def render_step(self, step: Dict) -> Optional[str]:
+        """Print one completed graph step and return the last AI message content in it."""
+        final_message = None
+        for node, update in step.items():
+            if not isinstance(update, dict):
+                continue
+            for message in update.get("messages", []):
+                if isinstance(message, AIMessage):
+                    final_message = message.content
+            if self.verbosity != "quiet" and node in self.colors:
+                self.render_update(node, update)
+        return final_message
+
+    def render_update(self, node: str, update: Dict) -> None:
+        style = self.colors[node]
+        for message in update.get("messages", []):
+            if isinstance(message, AIMessage):
+                self.render_ai(node.upper(), message, style)
+            elif isinstance(message, ToolMessage) and not str(message.content).startswith(STUB_PREFIX):
+                # Stubs are old tool outputs replaced by compaction, shown when they first arrived
+                self.render_tool(node.upper(), message, style)
+            elif isinstance(message, HumanMessage):
+                # The approval decision
+                self.emit(f"\n[{node.upper()}]: {message.content}", style)
+
+
+class TokenStreamDisplay(StepRenderer):
+    """Renders streamed agent output incrementally and completed steps like StepRenderer.
+
+    `on_token` receives the (chunk, metadata) pairs of the graph's "messages" stream,
+    `render_step` the node updates. A response whose text was streamed isn't printed
+    again; its tool calls and action are.
+    """
+
+    def __init__(self, console: Console, colors: Dict[str, str], **kwargs):
+        super().__init__(console, colors, **kwargs)
+        self.live: Optional[Live] = None
+        self.text: Optional[Text] = None
+        self.current = None
+        self.streamed_nodes = set()
+
+    def on_token(self, chunk: BaseMessage, metadata: Dict) -> None:
+        node = metadata.get("langgraph_node")
+        if node not in AGENT_NODES or self.verbosity == "quiet":
+            return
+        text = chunk_text(chunk)
+        if not text:
+            return
+        if (node, chunk.id) != self.current:
+            self.end_stream()
+            self.flush()
+            self.current = (node, chunk.id)
+            self.console.line()
+            self.text = Text(f"[{node.upper()}]: ", style=self.colors.get(node, ""))
+            # Live redraws at most refresh_per_second, however fast the tokens come
+            self.live = Live(self.text, console=self.console, refresh_per_second=12, transient=False)
+            self.live.start()
+        self.streamed_nodes.add(node)
+        self.text.append(text)
+
+    def end_stream(self) -> None:
+        """Finish the response being streamed, leaving its text on the screen."""
+        if self.live is not None:
+            self.live.stop()
+            self.live = None
+            if not self.console.is_terminal:
+                # Off a terminal Live prints the final text once, without ending its line
+                self.console.line()
+        self.current = None
+
+    def close(self) -> None:
+        self.end_stream()
+        super().close()
+
+    def render_step(self, step: Dict) -> Optional[str]:
+        self.end_stream()
+        return super().render_step(step)
+
+    def render_update(self, node: str, update: Dict) -> None:
+        if node not in self.streamed_nodes:
+            super().render_update(node, update)
+            return
+        self.streamed_nodes.discard(node)
+        style = self.colors[node]
+        for message in update.get("messages", []):
+            if isinstance(message, AIMessage):
+                self.render_ai(node.upper(), message, style, show_text=False)
+        if update.get("next_action"):
+            self.emit(f"[{node.upper()} - ACTION]: {update['next_action']}", style)
@@ -0,0 +1,247 @@
+"""Structured JSONL event log of agent runs, written by a background thread.
+
+Each streamed graph step becomes one compact JSON record. Message bodies are
+written once: a message whose content was already logged carries a
+`content_ref` to the hash of the earlier body instead of the text. Records are
+queued (a bounded queue, so a slow disk applies back-pressure instead of growing
+memory) and written by one writer thread per file, which flushes when the queue
+drains, every `flush_interval` seconds and at interpreter exit.
+
+Record kinds: "run_start", "step" and "run_end", all tagged with the run id, so
+concurrent runs can share a file. The reader below replays or summarizes a log:
+
+    python -m code_agent.event_log runs.jsonl            # one summary line per run
+    python -m code_agent.event_log runs.jsonl --replay RUN_ID
+"""
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+_STOP = object()
+
+
+def content_hash(content: Any) -> str:
+    text = content if isinstance(content, str) else json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()[:16]
+
+
+class EventLog:
+    """Background JSONL writer for one file. Use get_event_log to share it between runs."""
+
+    def __init__(self, path: str, max_queue: int = 1024, flush_interval: float = 0.5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._seen_bodies = set()
+        self._file = open(path, "a", encoding="utf-8")
+        self._closed = False
+        self._thread = threading.Thread(target=self._write_loop, name="codehawk-event-log", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: Dict) -> None:
+        """Queue a record, blocking while the queue is full."""
+        if self._closed:
+            raise ValueError(f"Event log {self.path} is closed")
+        self._queue.put(record)
+
+    def close(self) -> None:
+        """Write everything queued so far and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _write_loop(self) -> None:
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._file.flush()
+                continue
+            if record is _STOP:
+                break
+            self._file.write(json.dumps(self.serialize(record), default=str, separators=(",", ":")) + "\n")
+            if self._queue.empty():
+                self._file.flush()
+        self._file.close()
+
+    def serialize(self, record: Dict) -> Dict:
+        """Turn the messages of a step record into deduplicated message records."""
+        if record.get("event") != "step":
+            return record
+        return {**record, "step": serialize_step(record["step"], self.message_record)}
+
+    def message_record(self, message: BaseMessage) -> Dict:
+        entry = message_fields(message)
+        digest = content_hash(message.content)
+        if digest in self._seen_bodies:
+            entry["content_ref"] = digest
+        else:
+            self._seen_bodies.add(digest)
+            entry["content"] = message.content
+            entry["hash"] = digest
+        return entry
+
+
+def message_fields(message: BaseMessage) -> Dict:
+    """JSON fields of a message other than its content."""
+    entry = {"id": message.id, "type": message.type}
+    for field in ("name", "tool_call_id"):
+        if getattr(message, field, None):
+            entry[field] = getattr(message, field)
+    if getattr(message, "tool_calls", None):
+        entry["tool_calls"] = [{"name": call["name"], "args": call["args"], "id": call.get("id")}
+                               for call in message.tool_calls]
+    if getattr(message, "usage_metadata", None):
+        entry["usage"] = dict(message.usage_metadata)
+    return entry
+
+
+def serialize_step(step: Dict, message_record: Callable[[BaseMessage], Dict]) -> Dict:
+    """JSON form of a streamed graph step, each message turned into a dict by `message_record`."""
+    updates = {}
+    for node, update in step.items():
+        if not isinstance(update, dict):
+            updates[node] = update
+            continue
+        entry = {key: value for key, value in update.items() if key != "messages"}
+        entry["messages"] = [message_record(message) for message in update.get("messages", [])]
+        updates[node] = entry
+    return updates
+
+
+_logs: Dict[str, EventLog] = {}
+_logs_lock = threading.Lock()
+
+
+def get_event_log(path: str) -> EventLog:
+    """The shared writer for `path`, created on first use."""
+    path = os.path.abspath(path)
+    with _logs_lock:
+        if path not in _logs:
+            _logs[path] = EventLog(path)
+        return _logs[path]
+
+
+@atexit.register
+def close_all() -> None:
+    with _logs_lock:
+        logs = list(_logs.values())
+        _logs.clear()
+    for log in logs:
+        log.close()
+
+
+class RunLog:
+    """Records of one run in a shared event log."""
+
+    def __init__(self, path: str, run_id: Optional[str] = None):
+        self.log = get_event_log(path)
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+
+    def event(self, kind: str, **fields) -> None:
+        self.log.emit({"ts": round(time.time(), 3), "run": self.run_id, "event": kind, **fields})
+
+    def step(self, step: Dict) -> None:
+        self.event("step", step=step)
+
+
+def read_events(path: str) -> Iterator[Dict]:
+    """Yield the records of an event log with every `content_ref` resolved to its content."""
+    bodies = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of a log cut short by a crash
+                continue
+            for update in record.get("step", {}).values():
+                if not isinstance(update, dict):
+                    continue
+                for message in update.get("messages", []):
+                    if "hash" in message:
+                        bodies[message["hash"]] = message["content"]
+                    elif "content_ref" in message:
+                        message["content"] = bodies.get(message["content_ref"])
+            yield record
+
+
+def summarize_runs(events: Iterator[Dict]) -> List[Dict]:
+    """One summary per run: steps per node, tool calls, tokens and the end-of-run result."""
+    runs: Dict[str, Dict] = {}
+    for record in events:
+        run = runs.setdefault(record["run"], {
+            "run": record["run"], "question": None, "started": record["ts"], "ended": None,
+            "steps": 0, "nodes": Counter(), "tools": Counter(), "prompt_tokens": 0,
+            "completion_tokens": 0, "result": None,
+        })
+        if record["event"] == "run_start":
+            run["question"] = record.get("question")
+        elif record["event"] == "run_end":
+            run["ended"] = record["ts"]
+            run["result"] = record.get("result")
+        elif record["event"] == "step":
+            run["steps"] += 1
+            for node, update in record["step"].items():
+                run["nodes"][node] += 1
+                for message in (update or {}).get("messages", []):
+                    for call in message.get("tool_calls", []):
+                        run["tools"][call["name"]] += 1
+                    usage = message.get("usage") or {}
+                    run["prompt_tokens"] += usage.get("input_tokens", 0)
+                    run["completion_tokens"] += usage.get("output_tokens", 0)
+    return list(runs.values())
+
+
+def replay(events: Iterator[Dict], run_id: str) -> None:
+    """Print the messages of one run in order."""
+    for record in events:
+        if record["run"] != run_id:
+            continue
+        if record["event"] != "step":
+            print(f"== {record['event']} {json.dumps({k: v for k, v in record.items() if k not in ('run', 'event')}, default=str)}")
+            continue
+        for node, update in record["step"].items():
+            for message in (update or {}).get("messages", []):
+                print(f"--- {node} [{message['type']}{' ' + message['name'] if message.get('name') else ''}]")
+                if message.get("content"):
+                    print(message["content"])
+                for call in message.get("tool_calls", []):
+                    print(f"-> {call['name']}({json.dumps(call['args'], default=str)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize or replay a JSONL event log of agent runs.")
+    parser.add_argument("log", help="Event log written with run_agent(log_file=...)")
+    parser.add_argument("--replay", metavar="RUN_ID", help="Print the messages of this run")
+    args = parser.parse_args()
+
+    if args.replay:
+        replay(read_events(args.log), args.replay)
+        return
+    for run in summarize_runs(read_events(args.log)):
+        duration = f"{run['ended'] - run['started']:.1f}s" if run["ended"] else "unfinished"
+        tools = ", ".join(f"{name} x{count}" for name, count in run["tools"].most_common())
+        print(f"{run['run']}  {duration:>10}  {run['steps']:>3} steps  "
+              f"tokens {run['prompt_tokens']}/{run['completion_tokens']}  {(run['question'] or '')[:60]!r}")
+        print(f"    nodes: {dict(run['nodes'])}")
+        if tools:
+            print(f"    tools: {tools}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Local fake chat model for benchmarks and offline runs of the agent graph."""
+import asyncio
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    """Replays a fixed script of AI messages, with a simulated response latency.
+
+    The response is chosen by the number of AI messages already in the prompt, so a
+    single instance can serve many concurrent conversations deterministically. The
+    script wraps around when a conversation outlives it. Streamed responses arrive
+    word by word, the first after half the latency and the rest over the other half.
+    """
+
+    responses: List[AIMessage]
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        # The script already contains the tool calls, the schemas are not needed
+        return self
+
+    def next_response(self, messages: List[BaseMessage]) -> AIMessage:
+        turn = sum(isinstance(message, AIMessage) for message in messages)
+        response = self.responses[turn % len(self.responses)]
+        return response.model_copy(deep=True)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self.next_response(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self.next_response(messages))])
+
+    def stream_chunks(self, messages: List[BaseMessage]) -> List[AIMessageChunk]:
+        response = self.next_response(messages)
+        pieces = re.findall(r"\S+\s*|\s+", response.content) if isinstance(response.content, str) else [response.content]
+        chunks = [AIMessageChunk(content=piece, id=response.id) for piece in pieces]
+        tool_call_chunks = [{"name": call["name"], "args": json.dumps(call["args"]), "id": call.get("id"), "index": i}
+                            for i, call in enumerate(response.tool_calls)]
+        if tool_call_chunks or not chunks:
+            chunks.append(AIMessageChunk(content="", id=response.id, tool_call_chunks=tool_call_chunks))
+        return chunks
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        chunks = self.stream_chunks(messages)
+        for i, chunk in enumerate(chunks):
+            if self.latency:
+                time.sleep(self.latency / 2 if i == 0 else self.latency / 2 / len(chunks))
+            if run_manager and isinstance(chunk.content, str):
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        chunks = self.stream_chunks(messages)
+        for i, chunk in enumerate(chunks):
+            if self.latency:
+                await asyncio.sleep(self.latency / 2 if i == 0 else self.latency / 2 / len(chunks))
+            if run_manager and isinstance(chunk.content, str):
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+
+def default_script() -> List[AIMessage]:
+    """A short planner -> analyzer -> planner run that ends with "PATCH COMPLETED"."""
+    return [
+        AIMessage(content="Looking at the repository layout.",
+                  tool_calls=[{"name": "get_repo_tree", "args": {}, "id": "call_tree"}]),
+        AIMessage(content="ANALYZE CODE\nproblem_statement: benchmark run"),
+        AIMessage(content="The code looks fine.\nANALYSIS COMPLETE"),
+        AIMessage(content="Nothing to change.\nPATCH COMPLETED"),
+    ]
@@ -0,0 +1,390 @@
+"""Fan-out code analysis: one analyzer sub-run per candidate file, run in parallel.
+
+The code_analysis agent examines candidate files one LLM turn at a time, so its
+runtime grows with the number of files. With fan-out, the planner's "ANALYZE CODE"
+goes to a node that picks the problem's candidate files, gives each file a
+single-turn analyzer of its own with a trimmed context (the file's outline and the
+definitions most related to the problem, within `file_tokens`), runs them at most
+`concurrency` at a time and merges their findings into one analysis message for
+the planner. The analysis then takes about as long as its slowest file.
+
+Candidates come from the repository index ("index"): files the problem names, then
+files whose definitions or path match its identifiers. With "llm" they are the
+files the get_relevant_files tool suggests. Without candidates, or when the
+analyzer is called by another agent than the planner, the regular code analysis
+agent runs.
+"""
+import asyncio
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from .actions import ACTION_KEYWORDS
+from .compaction import message_text
+from .governor import GOVERNOR_PREFIX
+from .line_index import get_line_index
+from .shared_context import get_repo_index, resolve_path
+
+FANOUT_DEFAULTS = {
+    "max_files": 5,
+    "concurrency": 4,
+    "file_tokens": 6000,
+    "candidates": "index",
+}
+CANDIDATE_SOURCES = ("index", "llm")
+
+# About four characters per token, as estimated in compaction.py
+CHARS_PER_TOKEN = 4
+NOT_RELEVANT = "NOT RELEVANT"
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}")
+FILE_NAME = re.compile(r"(?<![\w/.-])(?:[\w.-]+/)*[\w-]+\.\w+")
+CODE_BLOCK = re.compile(r"```[\w+-]*\n(.*?)```", re.DOTALL)
+WORD_PARTS = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+# Identifiers too common in problem statements to point at a file
+STOP_WORDS = {
+    "the", "and", "for", "not", "with", "this", "that", "when", "from", "should", "would", "could",
+    "have", "has", "but", "are", "was", "were", "its", "into", "use", "using", "used", "can", "get",
+    "set", "add", "all", "any", "new", "file", "files", "code", "error", "errors", "issue", "problem",
+    "fix", "bug", "test", "tests", "repo", "path", "none", "true", "false", "self", "return", "def",
+    "class", "import", "statement", "problem_statement", "analyze", "which", "there", "does",
+}
+
+
+def fanout_options(fanout) -> Optional[Dict]:
+    """Options of the fan-out mode from True, a number of files or a dict, or None when disabled."""
+    if fanout is None or fanout is False:
+        return None
+    if fanout is True:
+        fanout = {}
+    elif isinstance(fanout, int):
+        if fanout <= 0:
+            return None
+        fanout = {"max_files": fanout}
+    unknown = set(fanout) - set(FANOUT_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown fan-out options: {', '.join(sorted(unknown))}")
+    options = {**FANOUT_DEFAULTS, **{key: value for key, value in fanout.items() if value is not None}}
+    if options["candidates"] not in CANDIDATE_SOURCES:
+        raise ValueError(f"Unknown candidate source {options['candidates']!r}, "
+                         f"expected one of {', '.join(CANDIDATE_SOURCES)}")
+    for key in ("max_files", "concurrency", "file_tokens"):
+        if options[key] < 1:
+            raise ValueError(f"Fan-out {key} must be at least 1")
+    return options
+
+
+def problem_statement(messages: Sequence[BaseMessage]) -> str:
+    """The problem to analyze: the user's request and what the planner asked of the analyzer."""
+    request = next((message_text(m) for m in messages if isinstance(m, HumanMessage)), "")
+    # run_agent appends the workspace to the question
+    request = request.rsplit("repo_path=", 1)[0].strip()
+    planner = message_text(messages[-1]) if messages and isinstance(messages[-1], AIMessage) else ""
+    planner = "\n".join(line for line in planner.split("\n") if line.strip() not in ACTION_KEYWORDS.values())
+    return "\n\n".join(part for part in (request, planner.strip()) if part)
+
+
+def word_parts(identifier: str) -> List[str]:
+    """Lower case words of a snake_case or CamelCase identifier."""
+    return [part.lower() for chunk in identifier.split("_") for part in WORD_PARTS.findall(chunk)]
+
+
+def name_key(identifier: str) -> str:
+    """An identifier in snake_case, so `ParseConfig` and `parse_config` match."""
+    return "_".join(word_parts(identifier))
+
+
+def query_terms(text: str) -> Tuple[set, set]:
+    """Identifiers of a problem, as name keys, and the words they are made of, without common English words."""
+    identifiers = {name_key(name) for name in IDENTIFIER.findall(text) if name.lower() not in STOP_WORDS}
+    words = {word for name in identifiers for word in name.split("_")
+             if len(word) > 2 and word not in STOP_WORDS}
+    return identifiers, words
+
+
+def definitions(index, relative_path: str) -> List[Dict]:
+    """The classes, methods and functions of a file, from its structure entry."""
+    entry = index.file_entry(relative_path) or {}
+    found = []
+    for cls in entry.get("classes", []):
+        found.append(cls)
+        found.extend(cls.get("methods", []))
+    found.extend(entry.get("functions", []))
+    return found
+
+
+def named_files(index, text: str) -> List[str]:
+    """Workspace files the text names by path or unambiguous file name."""
+    files = []
+    for candidate in FILE_NAME.findall(CODE_BLOCK.sub("", text)):
+        matches = index.file_index.lookup(candidate)
+        best = [path for kind, path in matches if kind == matches[0][0]] if matches else []
+        if len(best) == 1 and best[0] not in files:
+            files.append(best[0])
+    return files
+
+
+def rank_candidates(index, problem: str, max_files: int) -> List[Tuple[str, List[str]]]:
+    """Up to `max_files` (path, reasons) pairs of the files most likely involved in the problem.
+
+    Files the problem names come first, then files scored on the classes and
+    functions they define (from the structure and the tags) that the problem
+    mentions, and on the words of their path.
+    """
+    ranked = [(path, ["named in the problem"]) for path in named_files(index, problem)][:max_files]
+    identifiers, words = query_terms(problem)
+    if len(ranked) >= max_files or not (identifiers or words):
+        return ranked
+
+    named = {path for path, _ in ranked}
+    scored = []
+    for full_path in index.file_paths():
+        path = index.file_index.to_relative(full_path)
+        if path in named or any(part.startswith(".") for part in path.split("/")):
+            continue
+        score = 0
+        reasons = []
+        names = {name_key(item["name"]): item["name"] for item in definitions(index, path)}
+        names.update((name_key(tag.name), tag.name) for tag in index.tags.get(full_path, []) if tag.kind == "def")
+        defined = sorted(names[key] for key in names.keys() & identifiers)
+        if defined:
+            score += 3 * len(defined)
+            reasons.append(f"defines {', '.join(defined[:5])}")
+        path_words = {word for part in path.rsplit(".", 1)[0].split("/") for word in word_parts(part)}
+        matched = sorted(path_words & words)
+        if matched:
+            score += len(matched)
+            reasons.append(f"path matches {', '.join(matched)}")
+        if score:
+            scored.append((-score, len(path), path, reasons))
+    scored.sort()
+    ranked += [(path, reasons) for _, _, path, reasons in scored[:max_files - len(ranked)]]
+    return ranked
+
+
+def suggested_files(index, problem: str, max_files: int) -> List[Tuple[str, List[str]]]:
+    """The files the get_relevant_files tool suggests, that exist in the workspace."""
+    from .tools import get_relevant_files
+
+    answer = get_relevant_files.invoke({"problem_statement": problem})
+    blocks = CODE_BLOCK.findall(str(answer)) or [str(answer)]
+    files = []
+    for line in blocks[0].splitlines():
+        path = index.file_index.to_relative(line.strip().strip("`"))
+        if path in index.file_index.paths and path not in files:
+            files.append(path)
+    return [(path, ["suggested by get_relevant_files"]) for path in files[:max_files]]
+
+
+def numbered(lines: Sequence[str], start: int) -> str:
+    return "\n".join(f"{number:2d}: {line.rstrip()}" for number, line in enumerate(lines, start=start))
+
+
+def file_context(index, path: str, problem: str, file_tokens: int) -> str:
+    """The context of one file's analyzer: its outline and as much of its code as fits `file_tokens`.
+
+    A file that fits is given whole. Otherwise the definitions whose names the
+    problem mentions come first, then the start of the file, so the budget goes
+    to the code most likely involved.
+    """
+    budget = file_tokens * CHARS_PER_TOKEN
+    line_index = get_line_index(resolve_path(path))
+    # A long outline gets at most half of the budget
+    outline = truncate(index.outline(path) or "", budget // 2)
+    header = f"File: {path} ({line_index.line_count} lines)"
+    if outline:
+        header += f"\n\nOutline:\n{outline}"
+    if len(header) + len(line_index.data) <= budget:
+        text = numbered(line_index.get_lines(1, line_index.line_count), 1)
+        if len(header) + len(text) <= budget:
+            return f"{header}\n\nContent:\n{text}"
+
+    identifiers, words = query_terms(problem)
+
+    def relevance(item):
+        return (name_key(item["name"]) not in identifiers, -len(set(word_parts(item["name"])) & words),
+                item["start_line"])
+
+    spans = []
+    used = len(header)
+    for item in sorted(definitions(index, path), key=relevance):
+        if relevance(item)[:2] == (True, 0):
+            break
+        if any(start <= item["start_line"] and item["end_line"] <= end for start, end in spans):
+            # A method of a class already included
+            continue
+        start, end = line_index.byte_range(item["start_line"], item["end_line"])
+        size = end - start
+        if used + size > budget:
+            continue
+        spans.append((item["start_line"], item["end_line"]))
+        used += size
+    if not spans:
+        # Nothing matches the problem, the start of the file then
+        last = line_index.line_of_offset(min(budget - used, len(line_index.data)) - 1)
+        spans.append((1, max(1, last - 1)))
+
+    # A class taken after one of its methods covers it, overlapping spans are merged
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    body = "\n...\n".join(numbered(line_index.get_lines(start, end), start) for start, end in merged)
+    return f"{header}\n\nContent (trimmed to the parts related to the problem):\n{body}"
+
+
+def truncate(text: str, max_chars: int) -> str:
+    text = text.strip()
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars)
+    if cut <= 0:
+        cut = max_chars
+    omitted = text[cut:].count("\n") + 1
+    return f"{text[:cut]}\n... {omitted} more lines"
+
+
+def file_request(problem: str, context: str) -> Dict:
+    return {"messages": [HumanMessage(content=f"Problem statement:\n{problem}\n\n{context}")]}
+
+
+def findings_text(message: AIMessage) -> str:
+    lines = message_text(message).strip().split("\n")
+    return "\n".join(line for line in lines if line.strip() not in ACTION_KEYWORDS.values()).strip()
+
+
+def merge_findings(results: List[Tuple[str, List[str], str]]) -> AIMessage:
+    """One analysis message for the planner from the per-file findings."""
+    sections = [f"Analyzed {len(results)} candidate files in parallel."]
+    others = []
+    for path, reasons, text in results:
+        if not text or text.upper().startswith(NOT_RELEVANT):
+            others.append(path)
+        else:
+            sections.append(f"### {path} ({'; '.join(reasons)})\n{text}")
+    if others:
+        sections.append(f"Not involved: {', '.join(others)}")
+    sections.append(ACTION_KEYWORDS["analysis_complete"])
+    return AIMessage(content="\n\n".join(sections))
+
+
+def fanout_node(analyzer, analysis_node, options: Dict, governor=None) -> RunnableLambda:
+    """Graph node replacing code_analysis: fans the planner's analysis requests out over candidate files.
+
+    `analyzer` is the single-turn per-file agent, `analysis_node` the regular code
+    analysis node used when fan-out doesn't apply. Every sub-run counts as an LLM
+    call of the run's governor, which can also come from the config's configurable;
+    its usage is stored in the state's `budget`, as the agent nodes do. No more files
+    are analyzed than LLM calls are left in the budget, and the run stops when they
+    use it up.
+
+    A sub-run that fails (a rate limit, a timeout, an unusable response) is reported
+    to the planner as "analysis failed" for its file, the other findings are kept.
+    When every sub-run fails the regular analysis runs instead.
+    """
+    def plan(state, config):
+        """The candidate files and their analyzer inputs, or None to run the regular analysis."""
+        configurable = (config or {}).get("configurable", {})
+        run_governor = configurable.get("governor", governor)
+        if state.get("sender") != "planner":
+            return None, run_governor
+        max_files = options["max_files"]
+        if run_governor is not None:
+            if run_governor.over_budget(0):
+                return None, run_governor
+            calls_left = run_governor.calls_left()
+            if calls_left is not None:
+                max_files = min(max_files, calls_left)
+        if max_files < 1:
+            return None, run_governor
+        index = get_repo_index()
+        if index is None:
+            return None, run_governor
+        problem = problem_statement(state["messages"])
+        if options["candidates"] == "llm":
+            candidates = suggested_files(index, problem, max_files)
+        else:
+            candidates = rank_candidates(index, problem, max_files)
+        jobs = []
+        for path, reasons in candidates:
+            try:
+                context = file_context(index, path, problem, options["file_tokens"])
+            except (OSError, ValueError):
+                continue
+            jobs.append((path, reasons, file_request(problem, context)))
+        return jobs or None, run_governor
+
+    def finish(jobs, responses, run_governor):
+        """The node's update from the sub-runs' responses or exceptions, None when all of them failed."""
+        if all(isinstance(response, Exception) for response in responses):
+            return None
+        results = []
+        for (path, reasons, _), response in zip(jobs, responses):
+            if isinstance(response, Exception):
+                results.append((path, reasons, f"analysis failed: {type(response).__name__}: {response}"))
+                continue
+            if run_governor is not None:
+                run_governor.count_call(response)
+            results.append((path, reasons, findings_text(response)))
+        update = {
+            "messages": [merge_findings(results)],
+            "sender": "code_analysis",
+            "next_action": "analysis_complete",
+            "continue_calls": 0,
+        }
+        if run_governor is not None:
+            reason = run_governor.over_budget(0)
+            if reason:
+                # The sub-runs used the budget up, the planner gets no further call
+                run_governor.stop_reason = reason
+                update["messages"].append(HumanMessage(content=f"{GOVERNOR_PREFIX} {reason}; stopping the run."))
+                update["next_action"] = "stop"
+            update["budget"] = run_governor.report()
+        return update
+
+    # Sub-runs don't stream to the display or share the node's callbacks
+    sub_config = {"callbacks": [], "run_name": "file_analysis"}
+
+    def invoke(state, config):
+        jobs, run_governor = plan(state, config)
+        if jobs is None:
+            return analysis_node.invoke(state, config)
+        with ThreadPoolExecutor(max_workers=min(options["concurrency"], len(jobs)),
+                                thread_name_prefix="fanout") as pool:
+            # Each sub-run keeps the run's context (its workspace and configurable)
+            futures = [pool.submit(contextvars.copy_context().run, analyzer.invoke, request, sub_config)
+                       for _, _, request in jobs]
+            responses = []
+            for future in futures:
+                try:
+                    responses.append(future.result())
+                except Exception as e:
+                    responses.append(e)
+        update = finish(jobs, responses, run_governor)
+        return update if update is not None else analysis_node.invoke(state, config)
+
+    async def ainvoke(state, config):
+        jobs, run_governor = await asyncio.to_thread(contextvars.copy_context().run, plan, state, config)
+        if jobs is None:
+            return await analysis_node.ainvoke(state, config)
+        limit = asyncio.Semaphore(options["concurrency"])
+
+        async def analyze(request):
+            async with limit:
+                return await analyzer.ainvoke(request, sub_config)
+
+        responses = await asyncio.gather(*(analyze(request) for _, _, request in jobs), return_exceptions=True)
+        for response in responses:
+            # Only the sub-runs' errors are reported, a cancellation still cancels the node
+            if isinstance(response, BaseException) and not isinstance(response, Exception):
+                raise response
+        update = finish(jobs, responses, run_governor)
+        return update if update is not None else await analysis_node.ainvoke(state, config)
+
+    return RunnableLambda(invoke, afunc=ainvoke, name="code_analysis")
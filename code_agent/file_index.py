@@ -0,0 +1,141 @@
+"""Basename, suffix and glob index over the workspace file listing."""
+import os
+import fnmatch
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .code_walker import find_src_files
+
+# Match kinds, in ranking order
+EXACT = 0
+PATH_SUFFIX = 1
+CASE_INSENSITIVE = 2
+GLOB = 3
+
+GLOB_CHARS = set("*?[")
+
+
+def normalize_path(path: str) -> str:
+    """Normalize a path to the forward-slash relative form used as index keys."""
+    path = os.path.normpath(path).replace("\\", "/")
+    return "" if path == "." else path
+
+
+class FileIndex:
+    """Hash index from basenames (and extensions) to the workspace paths carrying them.
+
+    Exact basename and path suffix lookups are a single dictionary probe, so their
+    cost does not depend on the size of the repository. Lookups and changes are
+    serialized, as runs sharing the workspace add files while others look them up.
+    """
+
+    def __init__(self, root_path: str, paths: Iterable[str] = ()):
+        self.root_path = os.path.abspath(root_path)
+        self.by_name: Dict[str, List[str]] = defaultdict(list)
+        self.by_folded_name: Dict[str, List[str]] = defaultdict(list)
+        self.by_extension: Dict[str, List[str]] = defaultdict(list)
+        self.paths = set()
+        self._lock = threading.RLock()
+        for path in paths:
+            self.add(path)
+
+    @classmethod
+    def from_directory(cls, root_path: str) -> "FileIndex":
+        """Build the index from a single walk of the workspace."""
+        root_path = os.path.abspath(root_path)
+        listing = (os.path.relpath(path, root_path) for path in find_src_files(root_path))
+        return cls(root_path, listing)
+
+    def to_relative(self, path: str) -> str:
+        """Convert an absolute or workspace-relative path into an index key."""
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.root_path)
+        return normalize_path(path)
+
+    def add(self, path: str) -> None:
+        """Add a file to the index. Adding a path twice is a no-op."""
+        rel_path = self.to_relative(path)
+        with self._lock:
+            if not rel_path or rel_path in self.paths:
+                return
+            self.paths.add(rel_path)
+            name = rel_path.rsplit("/", 1)[-1]
+            self.by_name[name].append(rel_path)
+            self.by_folded_name[name.casefold()].append(rel_path)
+            self.by_extension[os.path.splitext(name)[1]].append(rel_path)
+
+    def remove(self, path: str) -> None:
+        """Drop a file from the index if it is present."""
+        rel_path = self.to_relative(path)
+        with self._lock:
+            if rel_path not in self.paths:
+                return
+            self.paths.discard(rel_path)
+            name = rel_path.rsplit("/", 1)[-1]
+            for table, key in (
+                (self.by_name, name),
+                (self.by_folded_name, name.casefold()),
+                (self.by_extension, os.path.splitext(name)[1]),
+            ):
+                table[key].remove(rel_path)
+                if not table[key]:
+                    del table[key]
+
+    def _glob_candidates(self, pattern: str) -> List[str]:
+        """Return the paths matching a glob pattern. Called with the lock held."""
+        if "/" in pattern:
+            return [path for path in self.paths if fnmatch.fnmatchcase(path, pattern)
+                    or fnmatch.fnmatchcase(path, "*/" + pattern)]
+
+        stem, extension = os.path.splitext(pattern)
+        if extension and not GLOB_CHARS.intersection(extension):
+            # "*.py" style patterns only need to look at one extension bucket
+            candidates = self.by_extension.get(extension, [])
+            return [path for path in candidates
+                    if fnmatch.fnmatchcase(path.rsplit("/", 1)[-1], pattern)]
+
+        matches = []
+        for name, paths in self.by_name.items():
+            if fnmatch.fnmatchcase(name, pattern):
+                matches.extend(paths)
+        return matches
+
+    def lookup(self, query: str, dir_path: Optional[str] = None) -> List[Tuple[int, str]]:
+        """Find files matching `query`, ranked best first.
+
+        `query` can be an exact basename, a trailing path such as "agent/core.py",
+        or a glob pattern such as "test_*.py". Returns (match kind, path) pairs.
+        """
+        query = query.strip().replace("\\", "/")
+        if not query:
+            return []
+
+        matches = {}
+
+        def record(kind: int, paths: Iterable[str]) -> None:
+            for path in paths:
+                if path not in matches or kind < matches[path]:
+                    matches[path] = kind
+
+        with self._lock:
+            if GLOB_CHARS.intersection(query):
+                record(GLOB, self._glob_candidates(query))
+            elif "/" in query:
+                suffix = normalize_path(query).lstrip("/")
+                name = suffix.rsplit("/", 1)[-1]
+                record(PATH_SUFFIX, [path for path in self.by_name.get(name, [])
+                                     if path == suffix or path.endswith("/" + suffix)])
+            else:
+                record(EXACT, self.by_name.get(query, []))
+                record(CASE_INSENSITIVE, self.by_folded_name.get(query.casefold(), []))
+
+        if dir_path:
+            prefix = self.to_relative(dir_path)
+            if prefix:
+                matches = {path: kind for path, kind in matches.items()
+                           if path.startswith(prefix + "/")}
+
+        # Best match kind first, then the shallowest path
+        ranked = sorted(matches.items(), key=lambda item: (item[1], item[0].count("/"), item[0]))
+        return [(kind, path) for path, kind in ranked]
@@ -0,0 +1,208 @@
+"""Per-run budgets and loop detection for the agent graph.
+
+The governor reviews every AI response as the agent node returns it. When a
+budget runs out the run is stopped; when an agent repeats itself (the same tool
+calls, or the same text without tool calls, `max_repeats` times in a row) control
+goes back to the planner, or the run stops if the planner is the one repeating. The verdict
+is delivered through the state's `next_action`, so the routers need no changes
+beyond the "replan" and "stop" routes.
+"""
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from .actions import ACTION_KEYWORDS
+from .compaction import estimate_tokens, message_text
+
+# Default limits, overridable per run with a budget dict (see RunGovernor)
+DEFAULT_BUDGET = {
+    "max_llm_calls": 60,
+    "max_tokens": None,
+    "max_tool_calls": 120,
+    "max_wall_time": None,
+    "max_repeats": 3,
+    "max_interventions": 2,
+}
+
+GOVERNOR_PREFIX = "[Run governor]"
+
+
+def without_tool_calls(message: AIMessage) -> AIMessage:
+    """Copy of `message` whose tool calls are dropped, so no tool result is expected for them."""
+    content = message.content
+    if isinstance(content, list):
+        content = [block for block in content if not (isinstance(block, dict) and block.get("type") == "tool_use")]
+    additional_kwargs = {k: v for k, v in message.additional_kwargs.items() if k != "tool_calls"}
+    return message.model_copy(update={
+        "content": content or "(tool calls cancelled)",
+        "tool_calls": [],
+        "invalid_tool_calls": [],
+        "additional_kwargs": additional_kwargs,
+    })
+
+
+class RunGovernor:
+    """Tracks one run's LLM calls, tokens, tool calls and wall time against its budget.
+
+    Limits set to None are not enforced. Tokens come from the responses' usage
+    metadata, or an estimate of the completion when a provider doesn't report them.
+    After `max_interventions` loop interventions the next one stops the run.
+    """
+
+    def __init__(self, **budget):
+        unknown = set(budget) - set(DEFAULT_BUDGET)
+        if unknown:
+            raise ValueError(f"Unknown budget limits: {', '.join(sorted(unknown))}")
+        self.budget = {**DEFAULT_BUDGET, **budget}
+        self.started = time.monotonic()
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.tool_calls = 0
+        self.interventions = 0
+        self.stop_reason: Optional[str] = None
+        self.last_intervention: Optional[str] = None
+        # The last agent to respond, its last response's signature and how many times in a row it gave it
+        self._streak: Optional[Tuple[str, str]] = None
+        self._streak_length = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def over_budget(self, new_tool_calls: int) -> Optional[str]:
+        """Why the run must stop before another LLM call or the `new_tool_calls`, or None.
+
+        Calls and tokens are already spent, so reaching their limit is enough; the
+        tool calls and wall time may use their limit up.
+        """
+        limits = self.budget
+        checks = [
+            ("max_llm_calls", self.llm_calls, "LLM calls", True),
+            ("max_tokens", self.prompt_tokens + self.completion_tokens, "tokens", True),
+            ("max_tool_calls", self.tool_calls + new_tool_calls, "tool calls", False),
+            ("max_wall_time", self.elapsed, "seconds of wall time", False),
+        ]
+        for key, used, unit, spent in checks:
+            if limits[key] is not None and (used >= limits[key] if spent else used > limits[key]):
+                return f"budget exhausted: {used:.0f} {unit} used, limit {limits[key]}"
+        return None
+
+    def calls_left(self) -> Optional[int]:
+        """LLM calls the budget still allows, None when they aren't limited."""
+        if self.budget["max_llm_calls"] is None:
+            return None
+        return max(0, self.budget["max_llm_calls"] - self.llm_calls)
+
+    def repeated(self, agent_name: str, message: AIMessage) -> Optional[str]:
+        """Record the response, returning a reason when the agent gave it `max_repeats` times in a row.
+
+        Only consecutive responses of the same agent count: the streak restarts with a
+        different response or when another agent responded in between, so reopening
+        a file in a later edit cycle isn't a loop. Texts made only of action keywords
+        are what `extract_next_action` writes for a bare `next_action` call, identical
+        by construction, and never count.
+        """
+        limit = self.budget["max_repeats"]
+        if limit is None:
+            return None
+        if message.tool_calls:
+            signature = "; ".join(f"{call['name']}({json.dumps(call['args'], sort_keys=True, default=str)})"
+                                  for call in message.tool_calls)
+            reason = f"loop detected: {signature} called {limit} times in a row"
+        else:
+            signature = message_text(message).strip()
+            reason = f"loop detected: the same response repeated {limit} times in a row ({signature[:80]!r})"
+            if all(line.strip() in ACTION_KEYWORDS.values() for line in signature.split("\n") if line.strip()):
+                self._streak, self._streak_length = None, 0
+                return None
+        if self._streak == (agent_name, signature):
+            self._streak_length += 1
+        else:
+            self._streak, self._streak_length = (agent_name, signature), 1
+        if self._streak_length < limit:
+            return None
+        self._streak, self._streak_length = None, 0
+        return reason
+
+    def count_call(self, message: AIMessage) -> None:
+        """Account for the call and tokens of one response, also of one that is discarded."""
+        self.llm_calls += 1
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            self.prompt_tokens += usage.get("input_tokens", 0)
+            self.completion_tokens += usage.get("output_tokens", 0)
+        else:
+            self.completion_tokens += estimate_tokens(message)
+
+    def review(self, agent_name: str, message: AIMessage) -> Optional[str]:
+        """Account for one AI response. Returns "replan", "stop" or None to let the run continue."""
+        self.count_call(message)
+        reason = self.over_budget(len(message.tool_calls))
+        if reason:
+            self.stop_reason = reason
+            return "stop"
+        reason = self.repeated(agent_name, message)
+        if reason:
+            self.interventions += 1
+            if agent_name == "planner" or self.interventions > self.budget["max_interventions"]:
+                self.stop_reason = reason
+                return "stop"
+            self.last_intervention = reason
+            return "replan"
+        self.tool_calls += len(message.tool_calls)
+        return None
+
+    def govern(self, agent_name: str, message: AIMessage, action: Optional[str]) -> Tuple[List, Optional[str]]:
+        """Review a response and return the messages to store and the next action.
+
+        When the governor intervenes the response's tool calls are cancelled and a
+        note with the reason follows it, for the planner and the final log.
+        """
+        verdict = self.review(agent_name, message)
+        if verdict is None:
+            return [message], action
+        reason = self.stop_reason if verdict == "stop" else self.last_intervention
+        what = "stopping the run" if verdict == "stop" else "returning control to the planner"
+        note = HumanMessage(content=f"{GOVERNOR_PREFIX} {reason}; {what}.")
+        return [without_tool_calls(message), note], verdict
+
+    def restore(self, usage: Optional[Dict]) -> None:
+        """Continue counting from the `report` of an earlier part of the run, e.g. one checkpointed before a resume."""
+        if not usage:
+            return
+        for key in ("llm_calls", "prompt_tokens", "completion_tokens", "tool_calls", "interventions"):
+            setattr(self, key, usage.get(key) or 0)
+        self.started -= usage.get("wall_time_s") or 0
+
+    def recursion_limit(self, default: int = 100) -> int:
+        """Graph recursion limit that leaves room for the LLM call budget (about one tool step per call)."""
+        if self.budget["max_llm_calls"] is None:
+            return default
+        return max(default, 2 * self.budget["max_llm_calls"] + 10)
+
+    def report(self) -> Dict:
+        return {
+            "llm_calls": self.llm_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tool_calls": self.tool_calls,
+            "wall_time_s": round(self.elapsed, 2),
+            "interventions": self.interventions,
+            "stop_reason": self.stop_reason,
+        }
+
+    def summary(self) -> str:
+        def limit(key):
+            return "" if self.budget[key] is None else f"/{self.budget[key]}"
+
+        text = (f"{self.llm_calls}{limit('max_llm_calls')} LLM calls, "
+                f"{self.prompt_tokens + self.completion_tokens}{limit('max_tokens')} tokens "
+                f"({self.prompt_tokens} prompt, {self.completion_tokens} completion), "
+                f"{self.tool_calls}{limit('max_tool_calls')} tool calls, "
+                f"{self.elapsed:.1f}{limit('max_wall_time')} s, {self.interventions} loop interventions")
+        if self.stop_reason:
+            text += f"; stopped: {self.stop_reason}"
+        return text
@@ -0,0 +1,194 @@
+"""Memory-mapped line-offset index for random access to file lines."""
+import os
+import mmap
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import List, Optional
+
+# Number of files whose index (and mapping) is kept open at once
+MAX_CACHED_INDEXES = 128
+# Number of search terms whose matching lines are remembered per file
+MAX_REMEMBERED_TERMS = 256
+
+
+class LineIndex:
+    """Maps a file once and records where every line starts.
+
+    Lines are numbered from 1. Any line range can be sliced straight out of the
+    mapping without reading or splitting the rest of the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        stat = os.stat(self.path)
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self._map: Optional[mmap.mmap] = None
+        if self.size:
+            with open(self.path, "rb") as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # offsets[i] is the byte offset where line i + 1 starts, the last entry is EOF
+        self.offsets = array("q", [0])
+        data = self.data
+        find = data.find
+        pos = find(b"\n")
+        while pos != -1:
+            self.offsets.append(pos + 1)
+            pos = find(b"\n", pos + 1)
+        if self.offsets[-1] != self.size:
+            self.offsets.append(self.size)
+        # Lines found per search term, valid as long as this index (the file is unchanged)
+        self._found: "OrderedDict[tuple, List[int]]" = OrderedDict()
+        self._found_lock = threading.Lock()
+
+    @property
+    def data(self):
+        """The raw file contents as a buffer."""
+        return self._map if self._map is not None else b""
+
+    @property
+    def line_count(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def newline(self) -> bytes:
+        """The file's line ending, as its first line ends: b"\r\n" or b"\n"."""
+        if self.line_count and self.data[self.offsets[1] - 2:self.offsets[1]] == b"\r\n":
+            return b"\r\n"
+        return b"\n"
+
+    def is_stale(self) -> bool:
+        """Check whether the file changed on disk since it was indexed."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return True
+        return stat.st_mtime_ns != self.mtime_ns or stat.st_size != self.size
+
+    def byte_range(self, start_line: int, end_line: int) -> tuple:
+        """Return the (start, end) byte offsets spanning lines start_line..end_line inclusive."""
+        start_line = max(1, start_line)
+        end_line = min(end_line, self.line_count)
+        if start_line > end_line:
+            return (0, 0)
+        return (self.offsets[start_line - 1], self.offsets[end_line])
+
+    def get_bytes(self, start_line: int, end_line: int) -> bytes:
+        """Return the raw bytes of lines start_line..end_line inclusive, line endings included."""
+        start, end = self.byte_range(start_line, end_line)
+        return self.data[start:end]
+
+    def get_lines(self, start_line: int, end_line: int, encoding: str = "utf-8",
+                  errors: str = "replace") -> List[str]:
+        """Return lines start_line..end_line inclusive, without line endings."""
+        chunk = self.get_bytes(start_line, end_line)
+        if not chunk:
+            return []
+        if chunk.endswith(b"\n"):
+            chunk = chunk[:-1]
+        return [line.rstrip("\r") for line in chunk.decode(encoding, errors).split("\n")]
+
+    def get_text(self, start_line: int, end_line: int, encoding: str = "utf-8",
+                 errors: str = "replace") -> str:
+        """Return lines start_line..end_line inclusive joined by newlines."""
+        return "\n".join(self.get_lines(start_line, end_line, encoding, errors))
+
+    def get_line(self, line_number: int) -> str:
+        """Return a single line without its line ending."""
+        lines = self.get_lines(line_number, line_number)
+        return lines[0] if lines else ""
+
+    def read_text(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        """Decode the whole file."""
+        return bytes(self.data).decode(encoding, errors)
+
+    def line_of_offset(self, offset: int) -> int:
+        """Return the 1-based line number containing the given byte offset."""
+        return bisect_right(self.offsets, offset)
+
+    def find_lines(self, term: str, encoding: str = "utf-8") -> List[int]:
+        """Return the line numbers of every line containing `term`, remembered per term."""
+        key = (term, encoding)
+        with self._found_lock:
+            found = self._found.get(key)
+        if found is None:
+            found = self._scan(term, encoding)
+            with self._found_lock:
+                self._found[key] = found
+                while len(self._found) > MAX_REMEMBERED_TERMS:
+                    self._found.popitem(last=False)
+        return list(found)
+
+    def _scan(self, term: str, encoding: str) -> List[int]:
+        needle = term.encode(encoding)
+        if not needle:
+            return []
+        data = self.data
+        lines = []
+        pos = data.find(needle)
+        while pos != -1:
+            line_number = self.line_of_offset(pos)
+            lines.append(line_number)
+            # Continue from the start of the next line, one hit per line is enough
+            pos = data.find(needle, self.offsets[line_number])
+        return lines
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+_cache: "OrderedDict[str, LineIndex]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def cached_line_index(path: str) -> Optional[LineIndex]:
+    """The cached index of the absolute `path` if it is still current, dropping a stale one."""
+    with _cache_lock:
+        index = _cache.get(path)
+        if index is not None and not index.is_stale():
+            _cache.move_to_end(path)
+            return index
+        if index is not None:
+            # Callers still holding the stale index keep reading their mapping of the old file,
+            # it closes once the last of them lets go
+            del _cache[path]
+        return None
+
+
+def get_line_index(path: str) -> LineIndex:
+    """Return the cached index for `path`, rebuilding it if the file's mtime or size changed."""
+    path = os.path.abspath(path)
+    index = cached_line_index(path)
+    if index is not None:
+        return index
+
+    # Built outside the lock, so indexing a big file doesn't hold up the lookups of other files
+    index = LineIndex(path)
+    with _cache_lock:
+        current = _cache.get(path)
+        if current is not None and (current.mtime_ns, current.size) == (index.mtime_ns, index.size):
+            # Another thread indexed the same version of the file meanwhile
+            _cache.move_to_end(path)
+            return current
+        _cache[path] = index
+        while len(_cache) > MAX_CACHED_INDEXES:
+            # Evicted mappings close once the last caller holding them lets go
+            _cache.popitem(last=False)
+        return index
+
+
+def invalidate(path: str) -> None:
+    """Drop the cached index for `path`, e.g. before the file is rewritten.
+
+    The index isn't closed: other threads (parallel tool calls, the prefetcher,
+    fan-out analyzers) may still be reading it. Its mapping closes once the last
+    of them lets go.
+    """
+    path = os.path.abspath(path)
+    with _cache_lock:
+        _cache.pop(path, None)
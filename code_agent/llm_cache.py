@@ -0,0 +1,209 @@
+"""Record/replay cache of LLM responses for deterministic offline runs and benchmarks.
+
+`RecordReplayChatModel` wraps a chat model. Every request (the normalized messages,
+the bound tools and the model parameters) is hashed, and the response is stored in
+a content-addressed directory under that hash:
+
+    <cache_dir>/<first two hex digits>/<sha256>.json
+
+Modes:
+    record          always call the model and store the response, overwriting old entries
+    replay          only answer from the store; a request that was never recorded raises LLMCacheMiss
+    record-on-miss  answer from the store, calling the model and storing the response on a miss
+
+The workspace root is replaced by a placeholder in the hashed request, so a run
+recorded in one checkout replays in another copy of the same repository.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+from code_agent.shared_context import current_workspace
+
+CACHE_MODES = ("record", "replay", "record-on-miss")
+DEFAULT_CACHE_DIR = ".llm_cache"
+WORKSPACE_PLACEHOLDER = "<workspace>"
+
+
+class LLMCacheMiss(KeyError):
+    """A request was not found in the store while replaying."""
+
+
+def normalize_content(content) -> Any:
+    """Message content without provider hints such as cache-control breakpoints."""
+    if isinstance(content, str):
+        return content
+    blocks = []
+    for block in content:
+        if isinstance(block, dict):
+            blocks.append({k: v for k, v in block.items() if k != "cache_control"})
+        else:
+            blocks.append(block)
+    # A single text block is the same request as the plain string
+    if len(blocks) == 1 and isinstance(blocks[0], dict) and blocks[0].get("type") == "text":
+        return blocks[0].get("text", "")
+    return blocks
+
+
+def normalize_message(message: BaseMessage) -> Dict:
+    """The parts of a message the model sees. Message ids are assigned locally and left out."""
+    entry = {"type": message.type, "content": normalize_content(message.content)}
+    if isinstance(message, AIMessage) and message.tool_calls:
+        entry["tool_calls"] = [
+            {"name": call["name"], "args": call["args"], "id": call.get("id")} for call in message.tool_calls
+        ]
+    tool_call_id = getattr(message, "tool_call_id", None)
+    if tool_call_id:
+        entry["tool_call_id"] = tool_call_id
+    if getattr(message, "name", None):
+        entry["name"] = message.name
+    return entry
+
+
+def normalize_tool(tool) -> Dict:
+    """Tool definition in one format, whether it was bound as a tool or an Anthropic-format dict."""
+    if isinstance(tool, dict) and "input_schema" in tool:
+        return {"name": tool["name"], "description": tool.get("description", ""), "parameters": tool["input_schema"]}
+    function = convert_to_openai_tool(tool)["function"]
+    return {"name": function["name"], "description": function.get("description", ""),
+            "parameters": function["parameters"]}
+
+
+def request_key(request: Dict) -> str:
+    """SHA-256 of the request, with the active workspace root replaced by a placeholder."""
+    text = json.dumps(request, sort_keys=True, default=str)
+    root = str(current_workspace().root_path)
+    if len(root) > 1:
+        text = text.replace(json.dumps(root)[1:-1], WORKSPACE_PLACEHOLDER)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def model_params(model: BaseChatModel) -> Dict:
+    """Parameters of a chat model that change its responses, without credentials."""
+    return {k: v for k, v in model._identifying_params.items()
+            if isinstance(v, (str, int, float, bool)) and "key" not in k.lower()}
+
+
+class ResponseStore:
+    """Content-addressed directory of recorded responses. Writes are atomic."""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = os.path.abspath(cache_dir)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        try:
+            with open(self.path_for(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return messages_from_dict([entry["response"]])[0]
+
+    def put(self, key: str, request: Dict, response: AIMessage) -> None:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {"request": request, "response": message_to_dict(response)}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, default=str)
+        os.replace(tmp_path, path)
+
+
+class RecordReplayChatModel(BaseChatModel):
+    """Chat model that records the responses of `inner` and replays them.
+
+    `model_id` names the wrapped model in the request key; it defaults to the
+    model's identifying parameters. `inner` may be None in replay mode when
+    `model_id` is given, so no provider client (or API key) is needed.
+    """
+
+    inner: Optional[Any] = None
+    model_id: str = ""
+    mode: str = "record-on-miss"
+    cache_dir: str = DEFAULT_CACHE_DIR
+    tool_schemas: List[Dict] = []
+    supports_cache_control: bool = False
+    stats: Dict[str, int] = {}
+    _store: ResponseStore = PrivateAttr()
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.mode not in CACHE_MODES:
+            raise ValueError(f"Unsupported LLM cache mode: {self.mode} (expected one of {', '.join(CACHE_MODES)})")
+        if self.inner is None and self.mode != "replay":
+            raise ValueError(f"LLM cache mode '{self.mode}' needs a model to record from")
+        if not self.model_id:
+            if self.inner is None:
+                raise ValueError("Replaying without a model needs a model_id")
+            self.model_id = json.dumps(model_params(self.inner), sort_keys=True)
+        # Copies made by bind_tools share the counts, the store and the lock
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+        self._store = ResponseStore(self.cache_dir)
+
+    @property
+    def _llm_type(self) -> str:
+        return "record-replay"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        bound = self.inner.bind_tools(tools, **kwargs) if self.inner is not None else None
+        return self.model_copy(update={"inner": bound, "tool_schemas": [normalize_tool(t) for t in tools]})
+
+    def build_request(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict) -> Dict:
+        return {
+            "messages": [normalize_message(message) for message in messages],
+            "tools": self.tool_schemas,
+            "model": self.model_id,
+            "stop": stop,
+            "kwargs": kwargs,
+        }
+
+    def lookup(self, key: str) -> Optional[AIMessage]:
+        if self.mode == "record":
+            return None
+        response = self._store.get(key)
+        with self._lock:
+            self.stats["hits" if response is not None else "misses"] += 1
+        if response is None and self.mode == "replay":
+            raise LLMCacheMiss(f"No recorded response for request {key} in {self._store.cache_dir}")
+        return response
+
+    def store(self, key: str, request: Dict, response: AIMessage) -> None:
+        self._store.put(key, request, response)
+        with self._lock:
+            self.stats["recorded"] += 1
+
+    @staticmethod
+    def to_result(response: AIMessage) -> ChatResult:
+        # A fresh id for every call, replayed messages must not replace each other in the state
+        return ChatResult(generations=[ChatGeneration(message=response.model_copy(update={"id": None}))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        request = self.build_request(messages, stop, kwargs)
+        key = request_key(request)
+        response = self.lookup(key)
+        if response is None:
+            response = self.inner.invoke(messages, stop=stop, **kwargs)
+            self.store(key, request, response)
+        return self.to_result(response)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        request = self.build_request(messages, stop, kwargs)
+        key = request_key(request)
+        response = self.lookup(key)
+        if response is None:
+            response = await self.inner.ainvoke(messages, stop=stop, **kwargs)
+            self.store(key, request, response)
+        return self.to_result(response)
@@ -1,69 +1,205 @@
 import os
+import asyncio
+import operator
 from time import sleep
 from rich.console import Console
 from rich.text import Text
-from typing import Optional
-from imports import *
-from langchain_anthropic import ChatAnthropic
-from langgraph.graph import StateGraph
+from typing import Annotated, Dict, Iterable, List, Optional, Sequence, Union
+from contextlib import ExitStack
+from typing_extensions import TypedDict
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
+from langgraph.prebuilt import ToolNode
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.types import Command
 from code_agent.config import GOOGLE_API_KEY, GROQ_API_KEY, ANTHROPIC_API_KEY
 from code_agent.core import (
-    create_agent, create_agent_node, 
-    feedback as user_feedback, route_feedback
+    create_agent, create_agent_node, route_feedback
 )
 from code_agent.routing import (
     router, code_analyzer_router, code_editor_router
 )
 from code_agent.tools import *
-from code_agent.structure import create_structure
-from code_agent.shared_context import set_structure
-from IPython.display import Image, display
+from code_agent.shared_context import use_workspace
+from code_agent.compaction import ConversationCompactor
+from code_agent.prompt_cache import PromptCacheStats, supports_prompt_caching
+from code_agent.llm_cache import RecordReplayChatModel, DEFAULT_CACHE_DIR
+from code_agent.governor import RunGovernor
+from code_agent.tiering import ROLES, RoleStats, model_label, role_agent
+from code_agent.tracing import Tracer
+from code_agent.approval import ApprovalBackend, approval_node, make_approver, pending_request
+from code_agent.fanout import fanout_node, fanout_options
+from code_agent.prefetch import Prefetcher
+from code_agent.display import StepRenderer, TokenStreamDisplay, TokenTimer
+from code_agent.event_log import RunLog
+from code_agent.checkpoint import DEFAULT_CHECKPOINT_DB, new_thread_id, open_checkpointer
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from code_agent.actions import next_action_tool, PLANNER_ACTIONS, ANALYZER_ACTIONS, EDITOR_ACTIONS
 from langchain_core.runnables import RunnableConfig
+from langchain_core.language_models import BaseChatModel
 
 
 from code_agent.config import (
-    PLANNER_PROMPT, EDITING_AGENT_PROMPT, CODE_ANALYZER_PROMPT
+    PLANNER_PROMPT, EDITING_AGENT_PROMPT, CODE_ANALYZER_PROMPT, FILE_ANALYZER_PROMPT
 )
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
     sender: str
+    next_action: Optional[str]
+    continue_calls: Annotated[int, operator.add]
+    # The run governor's usage as of the last agent response, restored on resume
+    budget: Optional[Dict]
 
-def build_agent_graph(model: str = "claude", temperature: float = 0):
-    """Build and return the agent graph with specified model"""
-    
-    # Initialize the LLM
+def create_llm(
+    model: Union[str, BaseChatModel] = "claude",
+    temperature: float = 0,
+    llm_cache_mode: Optional[str] = None,
+    llm_cache_dir: str = DEFAULT_CACHE_DIR
+) -> BaseChatModel:
+    """Create the chat model for a model name, or pass through an already constructed model.
+
+    With `llm_cache_mode` ("record", "replay" or "record-on-miss") the model is wrapped in
+    a RecordReplayChatModel storing responses in `llm_cache_dir`. Replaying a model given
+    by name doesn't create the provider client.
+    """
+    if llm_cache_mode:
+        if isinstance(model, str):
+            inner = None if llm_cache_mode == "replay" else create_llm(model, temperature)
+            model_id = f"{model}:temperature={temperature}"
+        else:
+            inner, model_id = model, ""
+        return RecordReplayChatModel(
+            inner=inner,
+            model_id=model_id,
+            mode=llm_cache_mode,
+            cache_dir=llm_cache_dir,
+            supports_cache_control=inner is not None and supports_prompt_caching(inner),
+        )
+    if isinstance(model, BaseChatModel):
+        return model
+    # Only the selected provider's SDK is imported
     if model == "claude":
-        llm = ChatAnthropic(
+        from langchain_anthropic import ChatAnthropic
+        return ChatAnthropic(
             model='claude-3-sonnet-20240229',
             temperature=temperature,
             api_key=ANTHROPIC_API_KEY
         )
+    elif model == "haiku":
+        from langchain_anthropic import ChatAnthropic
+        return ChatAnthropic(
+            model='claude-3-haiku-20240307',
+            temperature=temperature,
+            api_key=ANTHROPIC_API_KEY
+        )
     elif model == "gemini":
-        llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-001", temperature=0, api_key=GOOGLE_API_KEY)
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model="gemini-2.0-flash-001", temperature=0, api_key=GOOGLE_API_KEY)
     elif model == 'llama':
-        llm = ChatOpenAI(model='llama3-70b-8192',  base_url="https://api.groq.com/openai/v1", api_key=GROQ_API_KEY, temperature=temperature)
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model='llama3-70b-8192',  base_url="https://api.groq.com/openai/v1", api_key=GROQ_API_KEY, temperature=temperature)
     else:
         raise ValueError(f"Unsupported model: {model}")
 
+def build_agent_graph(
+    model: Union[str, BaseChatModel] = "claude",
+    temperature: float = 0,
+    auto_approve: bool = False,
+    compactor: Optional[ConversationCompactor] = None,
+    prompt_caching: bool = True,
+    llm_cache_mode: Optional[str] = None,
+    llm_cache_dir: str = DEFAULT_CACHE_DIR,
+    governor: Optional[RunGovernor] = None,
+    tracer: Optional[Tracer] = None,
+    checkpointer: Optional[BaseCheckpointSaver] = None,
+    role_models: Optional[Dict[str, Union[str, BaseChatModel]]] = None,
+    escalate: bool = False,
+    role_stats: Optional[RoleStats] = None,
+    approver: Optional[ApprovalBackend] = None,
+    fanout: Union[None, bool, int, Dict] = None
+):
+    """Build and return the agent graph with specified model
+
+    `model` is a model name or a chat model instance (e.g. a local fake model).
+    Proposed changes are decided by `approver` (see approval.py), by default the user
+    on the terminal, or AutoApprove with `auto_approve`. Runs whose approver can
+    interrupt the graph need a `checkpointer`.
+    With a `compactor`, each agent compacts old tool outputs before calling the LLM.
+    With `prompt_caching`, providers that support it get cache-control breakpoints.
+    With `llm_cache_mode`, LLM responses are recorded to and replayed from `llm_cache_dir`.
+    With a `governor`, every response is checked against the run's budgets and loop limits.
+    With a `tracer`, every node and tool call is recorded as a span.
+    With a `checkpointer`, the state is saved after every step, per thread_id in the config.
+    `role_models` gives a role ("planner", "code_analysis" or "code_editor") its own model
+    instead of `model`; with `escalate`, an unusable response of a role model is retried
+    on `model`. Calls, latency and tokens per role are recorded in `role_stats`.
+    With `fanout` (True, a number of files or options, see fanout.py), the planner's
+    analysis requests run one analyzer per candidate file in parallel.
+    """
+    fanout = fanout_options(fanout)
+    unknown_roles = set(role_models or {}) - set(ROLES)
+    if unknown_roles:
+        raise ValueError(f"Unknown agent roles: {', '.join(sorted(unknown_roles))}")
+
+    # Initialize the LLMs, one client per distinct model
+    llm = create_llm(model, temperature, llm_cache_mode, llm_cache_dir)
+    role_llms = {}
+    clients = {}
+    for role, role_model in (role_models or {}).items():
+        if role_model is None or role_model == model:
+            continue
+        key = role_model if isinstance(role_model, str) else id(role_model)
+        if key not in clients:
+            clients[key] = create_llm(role_model, temperature, llm_cache_mode, llm_cache_dir)
+        role_llms[role] = clients[key]
+
     # Create tool nodes with bound structure
     planner_tools = [get_repo_tree]  
     editor_tools = [get_repo_tree, list_files, open_file, edit_file, find_file, search_file, create_file, search_dir]
     analysis_tools = [get_class_and_function_info, get_repo_tree, get_relevant_files, open_file, get_class_info, get_function_info]
 
-    planner_tool_node = ToolNode(planner_tools)
-    editor_tool_node = ToolNode(editor_tools)
-    analysis_tool_node = ToolNode(analysis_tools)
+    # Async runs call the tools through wrappers that offload file I/O to a thread pool
+    def tool_node(tools):
+        tools = to_async_tools(tools)
+        return ToolNode(tracer.trace_tools(tools) if tracer else tools)
 
-    # Create agents
-    planner_agent = create_agent(PLANNER_PROMPT, planner_tools, llm)
-    editor_agent = create_agent(EDITING_AGENT_PROMPT, editor_tools, llm) 
-    analysis_agent = create_agent(CODE_ANALYZER_PROMPT, analysis_tools, llm)
+    planner_tool_node = tool_node(planner_tools)
+    editor_tool_node = tool_node(editor_tools)
+    analysis_tool_node = tool_node(analysis_tools)
+
+    # Create agents, each also bound the next_action tool its node strips from the response
+    def agent_for(role, prompt, tools):
+        if role not in role_llms:
+            return role_agent(role, create_agent(prompt, tools, llm, prompt_caching), model_label(model),
+                              stats=role_stats)
+        fallback = create_agent(prompt, tools, llm, prompt_caching) if escalate else None
+        return role_agent(role, create_agent(prompt, tools, role_llms[role], prompt_caching),
+                          model_label(role_models[role]), fallback, model_label(model), tools, role_stats, governor)
+
+    planner_agent = agent_for("planner", PLANNER_PROMPT, planner_tools + [next_action_tool(PLANNER_ACTIONS)])
+    editor_agent = agent_for("code_editor", EDITING_AGENT_PROMPT, editor_tools + [next_action_tool(EDITOR_ACTIONS)])
+    analysis_agent = agent_for("code_analysis", CODE_ANALYZER_PROMPT, analysis_tools + [next_action_tool(ANALYZER_ACTIONS)])
 
     # Create agent nodes
-    planner_node = create_agent_node(planner_agent, "planner")
-    editor_node = create_agent_node(editor_agent, "code_editor")
-    analysis_node = create_agent_node(analysis_agent, "code_analysis")
+    planner_node = create_agent_node(planner_agent, "planner", compactor, governor)
+    editor_node = create_agent_node(editor_agent, "code_editor", compactor, governor)
+    analysis_node = create_agent_node(analysis_agent, "code_analysis", compactor, governor)
+    if fanout is not None:
+        # Single-turn analyzers of one file each, without tools, on the analysis role's model
+        analysis_model = role_models["code_analysis"] if "code_analysis" in role_llms else model
+        file_analyzer = role_agent("code_analysis", create_agent(FILE_ANALYZER_PROMPT, None, role_llms.get("code_analysis", llm),
+                                                                 prompt_caching),
+                                   model_label(analysis_model), stats=role_stats)
+        analysis_node = fanout_node(file_analyzer, analysis_node, fanout, governor)
+
+    feedback_node = approval_node(make_approver(approver, auto_approve))
+    if tracer:
+        planner_node = tracer.trace_node("planner", planner_node)
+        editor_node = tracer.trace_node("code_editor", editor_node)
+        analysis_node = tracer.trace_node("code_analysis", analysis_node)
+        feedback_node = tracer.trace_node("HIL", feedback_node)
 
     # Build the graph
     graph_builder = StateGraph(AgentState)
@@ -72,7 +208,7 @@ def build_agent_graph(model: str = "claude", temperature: float = 0):
     graph_builder.add_node("planner", planner_node)
     graph_builder.add_node("code_editor", editor_node)
     graph_builder.add_node("code_analysis", analysis_node)
-    graph_builder.add_node("HIL", user_feedback)
+    graph_builder.add_node("HIL", feedback_node)
     graph_builder.add_node("planner_tool", planner_tool_node)
     graph_builder.add_node("code_edit_tool", editor_tool_node)
     graph_builder.add_node("code_analysis_tool", analysis_tool_node)
@@ -109,6 +245,7 @@ def build_agent_graph(model: str = "claude", temperature: float = 0):
         {
             "continue": "code_analysis",
             "done": "planner",
+            "__end__": END,
             "edit_file": "code_editor",  
             "code_analysis_tool": "code_analysis_tool",
         }
@@ -120,6 +257,7 @@ def build_agent_graph(model: str = "claude", temperature: float = 0):
         {
             "continue": "code_editor",
             "done": "planner",
+            "__end__": END,
             "code_edit_tool": "code_edit_tool",
         }
     )
@@ -138,7 +276,7 @@ def build_agent_graph(model: str = "claude", temperature: float = 0):
             }
         )
 
-    return graph_builder.compile()
+    return graph_builder.compile(checkpointer=checkpointer)
 
 console = Console()
 COLORS = {
@@ -152,82 +290,438 @@ COLORS = {
 }
 
 
+def initial_state(question: str, workspace_dir: str, checkpointer, thread_id: str, snapshot=None) -> Optional[Dict]:
+    """Graph input of a run: the question, or None to continue the checkpointed state in `snapshot`."""
+    if snapshot is not None:
+        if not snapshot.values:
+            raise ValueError(f"No checkpoint to resume for thread {thread_id}")
+        pending = ", ".join(snapshot.next) or "nothing, the run already finished"
+        console.print(f"\n[CHECKPOINT]: resuming thread {thread_id}, next: {pending}", style="dim")
+        return None
+    if checkpointer is not None:
+        console.print(f"\n[CHECKPOINT]: thread {thread_id} (resume with --resume --thread-id {thread_id})", style="dim")
+    return {
+        "messages": [HumanMessage(content=question+'repo_path={}'.format(workspace_dir))],
+        "sender": "user"
+    }
+
+
+def stream_modes(display: Optional[TokenStreamDisplay]):
+    """Stream modes of a run: node updates, plus the LLM tokens when they are displayed."""
+    return ["updates", "messages"] if display is not None else "updates"
+
+
+def graph_update(item, display: Optional[TokenStreamDisplay]) -> Optional[Dict]:
+    """The node update in a streamed item, or None for a token (passed to the display) or an interrupt."""
+    if display is not None:
+        mode, item = item
+        if mode == "messages":
+            display.on_token(*item)
+            return None
+    # An interrupt is reported as an update of its own, it is handled once the stream ends
+    return None if "__interrupt__" in item else item
+
+
+def count_continue_calls(step: Dict) -> int:
+    """LLM calls in a streamed graph step that were made by routing an agent back to itself."""
+    return sum(update.get("continue_calls", 0) for update in step.values() if isinstance(update, dict))
+
+
+def last_ai_message(step: Dict) -> Optional[str]:
+    """Content of the last AI message in a streamed graph step, if it has one."""
+    final_message = None
+    for update in step.values():
+        if isinstance(update, dict):
+            for message in update.get("messages", []):
+                if isinstance(message, AIMessage):
+                    final_message = message.content
+    return final_message
+
+
+class RunSession:
+    """The objects and bookkeeping of one agent run, shared by run_agent, arun_agent and the server.
+
+    Entering the session opens the run's workspace and checkpointer. The session
+    holds the run's approver, compactor, governor, tracer, role statistics, token
+    timer, prefetcher and renderer, and the config that hands them to the graph.
+    The caller drives the graph with stream or astream, passes every streamed item
+    to `record` and decides the approvals the graph interrupts for; `finish`
+    reports the run and returns its result.
+
+    With `shared_graph` the run drives a graph shared between runs (see server.py):
+    the graph's `checkpointer` is the caller's, no checkpoints are kept when it is
+    None, and the steps aren't printed.
+    """
+
+    def __init__(
+        self,
+        question: str,
+        workspace_dir: Optional[str] = None,
+        model: Union[str, BaseChatModel] = "claude",
+        log_file: Optional[str] = None,
+        auto_approve: bool = False,
+        compaction_threshold: Optional[int] = 50_000,
+        keep_recent_turns: int = 6,
+        budget: Optional[Dict] = None,
+        trace_file: Optional[str] = None,
+        checkpoint_db: Optional[str] = None,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+        thread_id: Optional[str] = None,
+        resume: bool = False,
+        stream_tokens: bool = False,
+        verbosity: str = "summary",
+        approval: Union[None, str, Dict, ApprovalBackend] = None,
+        prefetch: bool = True,
+        shared_graph: bool = False
+    ):
+        self.question = question
+        self.workspace_dir = os.path.realpath(workspace_dir or os.getcwd())
+        self.model = model
+        self.resume = resume
+        self.approver = make_approver(approval, auto_approve)
+        if not shared_graph and (thread_id or resume or self.approver.persistent) and not checkpoint_db:
+            checkpoint_db = DEFAULT_CHECKPOINT_DB
+        self.checkpoint_db = checkpoint_db
+        self.checkpointer = checkpointer
+        self.shared_graph = shared_graph
+        self.thread_id = thread_id or new_thread_id()
+        self.log_file = log_file
+        self.compaction = (compaction_threshold, keep_recent_turns)
+        self.budget = budget
+        self.trace_file = trace_file
+        self.prefetch = prefetch
+        self.display_options = (stream_tokens, verbosity)
+        self.num_steps = 0
+        self.continue_calls = 0
+        self.final_message = None
+        self.pending_approval = None
+        self._resources = ExitStack()
+
+    def __enter__(self) -> "RunSession":
+        try:
+            self._start()
+        except BaseException:
+            self._resources.close()
+            raise
+        return self
+
+    def _start(self) -> None:
+        # Tools resolve paths against this run's workspace, the process CWD is never changed,
+        # so several runs can share the process and the workspace's warm index
+        self.workspace = self._resources.enter_context(use_workspace(self.workspace_dir))
+        if not self.shared_graph:
+            self.checkpointer = self._resources.enter_context(open_checkpointer(self.checkpoint_db))
+        # Indexing runs in the background while the graph compiles and the planner's first
+        # request is in flight; tools wait for the part of the index they need
+        self.workspace.start_repo_index()
+
+        threshold, keep_recent_turns = self.compaction
+        self.compactor = ConversationCompactor(threshold, keep_recent_turns) if threshold is not None else None
+        self.governor = RunGovernor(**(self.budget or {}))
+        self.tracer = Tracer(self.trace_file) if self.trace_file else None
+        # The tracer, the prefetcher and the renderer are closed on leaving the session also when
+        # the run fails; finish closes them earlier, for its report
+        if self.tracer is not None:
+            self._resources.callback(self.tracer.close)
+        self.role_stats = RoleStats()
+        self.cache_stats = PromptCacheStats()
+        self.token_timer = TokenTimer()
+        self.prefetcher = Prefetcher(self.workspace) if self.prefetch else None
+        if self.prefetcher is not None:
+            self._resources.callback(self.prefetcher.close)
+        stream_tokens, verbosity = self.display_options
+        render = not self.shared_graph
+        self.display = TokenStreamDisplay(console, COLORS, verbosity=verbosity) if stream_tokens and render else None
+        self.renderer = (self.display or StepRenderer(console, COLORS, verbosity=verbosity)) if render else None
+        if self.renderer is not None:
+            self._resources.callback(self.renderer.close)
+        self.stream_mode = stream_modes(self.display)
+        # A graph shared between runs (see server.py) takes the per-run objects from the configurable
+        self.config = RunnableConfig(
+            recursion_limit=self.governor.recursion_limit(),
+            configurable={"thread_id": self.thread_id, "compactor": self.compactor, "governor": self.governor,
+                          "role_stats": self.role_stats, "approver": self.approver},
+            callbacks=[self.token_timer] + ([self.prefetcher] if self.prefetcher else []),
+        )
+        self.run_log = RunLog(self.log_file) if self.log_file else None
+        if self.run_log:
+            self.run_log.event("run_start", question=self.question, model=str(self.model), workspace=self.workspace_dir,
+                               thread_id=self.thread_id, resume=self.resume)
+
+    def __exit__(self, *exc_info) -> None:
+        self._resources.close()
+
+    def build_graph(self, model: Union[str, BaseChatModel] = "claude", temperature: float = 0, **options):
+        """The run's own graph, built with its per-run objects (see build_agent_graph for `options`)."""
+        # An interrupted approval resumes from a checkpoint, kept in memory when none is saved
+        checkpointer = self.checkpointer or (MemorySaver() if self.approver.interrupts else None)
+        return build_agent_graph(model, temperature, compactor=self.compactor, governor=self.governor,
+                                 tracer=self.tracer, checkpointer=checkpointer, role_stats=self.role_stats,
+                                 approver=self.approver, **options)
+
+    def initial_state(self, snapshot=None) -> Optional[Dict]:
+        """Graph input of the run, None when resuming the checkpointed state in `snapshot`.
+
+        A resumed run's budget continues from the usage checkpointed with the state.
+        """
+        state = initial_state(self.question, self.workspace_dir, self.checkpointer, self.thread_id, snapshot)
+        if snapshot is not None:
+            self.governor.restore(snapshot.values.get("budget"))
+        return state
+
+    def record(self, item) -> Optional[Dict]:
+        """Account for a streamed item, returning it when it is a node update."""
+        step = graph_update(item, self.display)
+        if step is None:
+            return None
+        self.num_steps += 1
+        if self.run_log:
+            self.run_log.step(step)
+        self.cache_stats.record_step(step)
+        self.continue_calls += count_continue_calls(step)
+        final_message = self.renderer.render_step(step) if self.renderer else last_ai_message(step)
+        self.final_message = final_message or self.final_message
+        return step
+
+    def approval_request(self, snapshot) -> Optional[Dict]:
+        """The approval the stopped graph in `snapshot` waits for, None when it finished."""
+        request = pending_request(snapshot)
+        if request is not None and self.renderer:
+            self.renderer.close()
+        return request
+
+    def resume_with(self, request: Dict, answer: Optional[Dict]) -> Optional[Command]:
+        """Graph input continuing with the approver's answer, None when it is left pending."""
+        if answer is None:
+            self.pending_approval = request
+            return None
+        return Command(resume=answer)
+
+    def finish(self) -> Dict:
+        """Report the end-of-run statistics and build the run's result."""
+        if self.renderer:
+            self.renderer.close()
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        if self.tracer is not None:
+            self.tracer.close()
+            console.print(self.tracer.summary_table())
+        governor, role_stats, token_timer = self.governor, self.role_stats, self.token_timer
+        prefetcher = self.prefetcher
+        console.print(f"\n[BUDGET]: {governor.summary()}", style="bold red" if governor.stop_reason else "dim")
+        if role_stats.roles:
+            console.print(f"\n[MODELS]: {role_stats.summary()}", style="dim")
+        if token_timer.ttft:
+            console.print(f"\n[LATENCY]: {token_timer.summary()}", style="dim")
+        if prefetcher is not None and prefetcher.responses:
+            console.print(f"\n[PREFETCH]: {prefetcher.summary()}", style="dim")
+        if self.continue_calls:
+            console.print(f"\n[ROUTING]: {self.continue_calls} LLM calls spent on \"continue\" loops", style="dim")
+        compactor = self.compactor
+        tokens_saved = compactor.tokens_saved if compactor else 0
+        if compactor and compactor.messages_compacted:
+            console.print(
+                f"\n[COMPACTION]: {compactor.messages_compacted} old tool outputs stubbed, "
+                f"~{tokens_saved} tokens saved", style="dim"
+            )
+        cache_stats = self.cache_stats
+        if cache_stats.calls:
+            console.print(f"\n[PROMPT CACHE]: {cache_stats.summary()}", style="dim")
+        if self.pending_approval is not None:
+            console.print(f"\n[APPROVAL]: waiting for {self.pending_approval['backend']}, continue with "
+                          f"--resume --thread-id {self.thread_id} once decided", style="bold yellow")
+        result = {
+            "steps": self.num_steps,
+            "final_message": self.final_message,
+            "tokens_saved": tokens_saved,
+            "continue_calls": self.continue_calls,
+            "budget": governor.report(),
+            "roles": role_stats.report(),
+            "ttft": token_timer.report(),
+            "prefetch": prefetcher.report() if prefetcher is not None else {},
+            "pending_approval": self.pending_approval,
+            "prompt_cache": {"hits": cache_stats.hits, "misses": cache_stats.misses,
+                             "tokens_read": cache_stats.tokens_read, "tokens_written": cache_stats.tokens_written},
+            "thread_id": self.thread_id,
+        }
+        if self.run_log is not None:
+            self.run_log.event("run_end", result=result)
+        return result
+
+
 def run_agent(
     question: str,
-    model: str = "claude",
+    model: Union[str, BaseChatModel] = "claude",
     temperature: float = 0,
     log_file: Optional[str] = None,
-    workspace_dir: Optional[str] = None
+    workspace_dir: Optional[str] = None,
+    auto_approve: bool = False,
+    compaction_threshold: Optional[int] = 50_000,
+    keep_recent_turns: int = 6,
+    prompt_caching: bool = True,
+    llm_cache_mode: Optional[str] = None,
+    llm_cache_dir: str = DEFAULT_CACHE_DIR,
+    budget: Optional[Dict] = None,
+    trace_file: Optional[str] = None,
+    checkpoint_db: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    resume: bool = False,
+    role_models: Optional[Dict[str, Union[str, BaseChatModel]]] = None,
+    escalate: bool = False,
+    stream_tokens: bool = False,
+    verbosity: str = "summary",
+    approval: Union[None, str, Dict, ApprovalBackend] = None,
+    fanout: Union[None, bool, int, Dict] = None,
+    prefetch: bool = True
 ):
     """Run the code agent on a given question
     
     Args:
         question: The question or task for the agent
-        model: LLM model to use ("claude", "gemini", or "groq")
+        model: LLM model to use ("claude", "gemini", or "groq"), or a chat model instance
         temperature: Temperature parameter for the LLM
-        log_file: Optional path to log file
+        log_file: Optional path of a JSONL event log (see event_log.py), shared by concurrent runs
         workspace_dir: Optional path to workspace directory. Defaults to current directory
+        auto_approve: Accept proposed changes without prompting, for unattended runs
+        compaction_threshold: Estimated prompt tokens above which old tool outputs are
+            replaced by stubs. None disables compaction
+        keep_recent_turns: Number of most recent AI turns never compacted
+        prompt_caching: Use provider prompt caching where supported
+        llm_cache_mode: "record", "replay" or "record-on-miss" to record LLM responses
+            to `llm_cache_dir` and replay them on later runs. None calls the model directly
+        llm_cache_dir: Directory of the recorded LLM responses
+        budget: Per-run limits overriding governor.DEFAULT_BUDGET (max_llm_calls, max_tokens,
+            max_tool_calls, max_wall_time, max_repeats, max_interventions); None disables a limit
+        trace_file: Append a JSONL span per node and tool call to this file and print the
+            slowest nodes and tools at the end of the run
+        checkpoint_db: SQLite file the graph state is saved to after every step. Defaults to
+            DEFAULT_CHECKPOINT_DB when a thread_id or resume is given, otherwise no checkpoints
+        thread_id: Checkpoint thread of the run; a new one is generated when not given
+        resume: Continue the checkpointed run of `thread_id` instead of starting with `question`
+        role_models: Models of single roles ("planner", "code_analysis", "code_editor"),
+            e.g. a small fast model for analysis and editing; other roles use `model`
+        escalate: Retry a role model's invalid tool calls and stalls on `model`
+        stream_tokens: Print the agents' responses token by token as they are generated
+        verbosity: "quiet" to print only the end-of-run statistics, "summary" to print the
+            agents' messages and the head and tail of each tool result, "full" to print
+            the tool results whole
+        approval: Approval backend of proposed changes, or its mode ("interactive",
+            "auto", "policy", "queue") or options dict (see approval.make_approver).
+            Defaults to "auto" with `auto_approve`, otherwise "interactive". A queued
+            request left unanswered ends the run with `pending_approval` set; it
+            continues with `resume` once decided
+        fanout: Analyze the planner's requests with one analyzer per candidate file, run in
+            parallel: True, the maximum number of files, or a dict of fanout.FANOUT_DEFAULTS
+            options (max_files, concurrency, file_tokens, candidates). None analyzes one
+            LLM turn at a time
+        prefetch: Warm the caches of the files and identifiers each response mentions in
+            the background, for the tool calls that follow (see prefetch.py)
+
+    Returns:
+        dict with the number of graph steps, the last AI message of the run, the
+        estimated tokens saved by compaction, the number of LLM calls spent on
+        "continue" loops, the budget usage, the calls, latency and tokens per role,
+        the prompt cache statistics, the time to first token of the LLM calls, the
+        prefetch statistics, the approval request still waiting for a decision and the
+        checkpoint thread id
     """
-    
-    workspace_dir = workspace_dir or os.getcwd()
-    original_cwd = os.getcwd()
-    os.chdir(workspace_dir)
-    
-    try:
-        structure = create_structure(workspace_dir)
-        set_structure(structure)
-        graph = build_agent_graph(model, temperature)
-        
-        state = {
-            "messages": [HumanMessage(content=question+'repo_path={}'.format(workspace_dir))],
-            "sender": "user"
-        }
-        config=RunnableConfig(recursion_limit=100)
-        for step in graph.stream(state, config=config):
-            if log_file:
-                with open(log_file, 'a') as f:
-                    f.write(f"{step}\n---\n")
-
-            for key, value in step.items():
-                if key in COLORS:
-                    if isinstance(value, dict) and "messages" in value:
-                        for message in value["messages"]:
-                            if isinstance(message, AIMessage):
-                                # Handle different types of AI message content
-                                if isinstance(message.content, list):
-                                    # Handle structured content (list of dicts)
-                                    for item in message.content:
-                                        if isinstance(item, dict):
-                                            if 'text' in item:
-                                                console.print(f"\n[{key.upper()}]: {item['text']}\n", style=COLORS[key])
-                                            elif 'type' == 'tool_use':
-                                                tool_name = item.get('name', 'Unknown Tool')
-                                                console.print(f"\n[{key.upper()} - USING TOOL]: [bold]{tool_name}[/bold]\n", style=COLORS[key])
-                                else:
-                                    # Clean and format the content text
-                                    lines = message.content.split('\n')
-                                    action = next((line for line in lines if line in ["ANALYZE CODE", "ASK USER", "EDIT FILE", "PATCH COMPLETED", "FILE OPENED", "EDITING COMPLETED"]), None)
-                                    
-                                    if action:
-                                        console.print(f"\n[{key.upper()} - ACTION]: [bold]{action}[/bold]", style=COLORS[key])
-                                        content = '\n'.join(line for line in lines if line != action).strip()
-                                        if content:
-                                            console.print(f"\n{content}\n", style=COLORS[key])
-                                    else:
-                                        console.print(f"\n[{key.upper()}]: {message.content}\n", style=COLORS[key])
-                                        
-                            elif isinstance(message, ToolMessage):
-                                # Format tool responses nicely
-                                tool_name = message.name
-                                if message.content and message.content.strip() != 'null':
-                                    console.print(f"\n[{key.upper()} - TOOL RESULT]: [bold]{tool_name}[/bold]", style=COLORS[key])
-                                    # Clean up tool output
-                                    content = message.content.strip()
-                                    if content.startswith('```') and content.endswith('```'):
-                                        content = content[3:-3].strip()
-                                    console.print(content + "\n", style=COLORS[key])
-                                else:
-                                    console.print(f"\n[{key.upper()} - TOOL COMPLETED]: [bold]{tool_name}[/bold]\n", style=COLORS[key])
-
-    finally:
-        os.chdir(original_cwd)
+    session = RunSession(question, workspace_dir, model=model, log_file=log_file, auto_approve=auto_approve,
+                         compaction_threshold=compaction_threshold, keep_recent_turns=keep_recent_turns,
+                         budget=budget, trace_file=trace_file, checkpoint_db=checkpoint_db, thread_id=thread_id,
+                         resume=resume, stream_tokens=stream_tokens, verbosity=verbosity, approval=approval,
+                         prefetch=prefetch)
+    with session:
+        graph = session.build_graph(model, temperature, prompt_caching=prompt_caching, llm_cache_mode=llm_cache_mode,
+                                    llm_cache_dir=llm_cache_dir, role_models=role_models, escalate=escalate,
+                                    fanout=fanout)
+        config = session.config
+        state = session.initial_state(graph.get_state(config) if resume else None)
+        while True:
+            for item in graph.stream(state, config=config, stream_mode=session.stream_mode):
+                session.record(item)
+
+            # The graph stopped: finished, or interrupted for an approval decided out here
+            request = session.approval_request(graph.get_state(config)) if session.approver.interrupts else None
+            if request is None:
+                break
+            state = session.resume_with(request, session.approver.resolve(request, session.thread_id))
+            if state is None:
+                break
+        return session.finish()
+
+
+async def arun_agent(
+    question: str,
+    model: Union[str, BaseChatModel] = "claude",
+    temperature: float = 0,
+    log_file: Optional[str] = None,
+    workspace_dir: Optional[str] = None,
+    auto_approve: bool = False,
+    compaction_threshold: Optional[int] = 50_000,
+    keep_recent_turns: int = 6,
+    prompt_caching: bool = True,
+    llm_cache_mode: Optional[str] = None,
+    llm_cache_dir: str = DEFAULT_CACHE_DIR,
+    budget: Optional[Dict] = None,
+    trace_file: Optional[str] = None,
+    checkpoint_db: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    resume: bool = False,
+    role_models: Optional[Dict[str, Union[str, BaseChatModel]]] = None,
+    escalate: bool = False,
+    stream_tokens: bool = False,
+    verbosity: str = "summary",
+    approval: Union[None, str, Dict, ApprovalBackend] = None,
+    fanout: Union[None, bool, int, Dict] = None,
+    prefetch: bool = True
+):
+    """Coroutine version of run_agent, driving the graph with astream.
+
+    LLM calls use the clients' async APIs and tool calls run on a thread pool, so
+    many runs can share one event loop. Takes the same arguments as run_agent.
+    """
+    session = RunSession(question, workspace_dir, model=model, log_file=log_file, auto_approve=auto_approve,
+                         compaction_threshold=compaction_threshold, keep_recent_turns=keep_recent_turns,
+                         budget=budget, trace_file=trace_file, checkpoint_db=checkpoint_db, thread_id=thread_id,
+                         resume=resume, stream_tokens=stream_tokens, verbosity=verbosity, approval=approval,
+                         prefetch=prefetch)
+    # The contextvar the session sets is private to this task, concurrent runs don't see it
+    with session:
+        graph = session.build_graph(model, temperature, prompt_caching=prompt_caching, llm_cache_mode=llm_cache_mode,
+                                    llm_cache_dir=llm_cache_dir, role_models=role_models, escalate=escalate,
+                                    fanout=fanout)
+        config = session.config
+        state = session.initial_state(await graph.aget_state(config) if resume else None)
+        while True:
+            async for item in graph.astream(state, config=config, stream_mode=session.stream_mode):
+                session.record(item)
+
+            # The graph stopped: finished, or interrupted for an approval decided out here
+            request = session.approval_request(await graph.aget_state(config)) if session.approver.interrupts else None
+            if request is None:
+                break
+            answer = await asyncio.to_thread(session.approver.resolve, request, session.thread_id)
+            state = session.resume_with(request, answer)
+            if state is None:
+                break
+        return session.finish()
+
+
+async def arun_agents(runs: Iterable[Dict], concurrency: int = 8, **kwargs) -> List:
+    """Run many agent sessions concurrently in the current event loop.
+
+    Args:
+        runs: Keyword arguments for arun_agent, one dict per session (at least "question")
+        concurrency: Maximum number of sessions in flight at once
+        **kwargs: Defaults applied to every session
+
+    Returns:
+        The result of every session in order, or the exception it raised
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(run: Dict):
+        async with semaphore:
+            return await arun_agent(**{**kwargs, **run})
+
+    return await asyncio.gather(*(run_one(run) for run in runs), return_exceptions=True)
@@ -0,0 +1,229 @@
+"""Speculative prefetch of the files and symbols named in the agents' responses.
+
+The planner and the analyzer name the files and identifiers the next steps will
+almost certainly open. `Prefetcher` is a callback handler that reads every LLM
+response of a run as it arrives and, on a small thread pool, warms what the
+following tool calls need while the graph routes, checkpoints, waits for an
+approval or calls the next model:
+
+- the line index of each named file, i.e. its mapping and line offsets, which
+  open_file and search_file read from;
+- the file's outline, as returned by get_class_and_function_info;
+- the lines referencing each named identifier, in the named files and in the
+  files defining it, as returned by search_file.
+
+Files are found by path or unambiguous file name through the file index, the
+files defining an identifier through the repository structure and tags. What the
+prefetcher keeps resident is capped at `max_bytes` of file content: past the cap,
+the oldest prefetched files no tool has used yet leave the line index cache.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage
+
+from .compaction import message_text
+from .fanout import definitions, named_files
+from .line_index import get_line_index, invalidate
+from .shared_context import WorkspaceContext
+
+# Tool arguments naming a file
+FILE_ARGUMENTS = ("relative_file_path", "file_path", "filename")
+
+# snake_case, camelCase and CamelCase names, dotted names and calls; plain words aren't identifiers
+IDENTIFIER = re.compile(
+    r"`([A-Za-z_][\w.]*)`"
+    r"|\b([A-Za-z_]\w*_\w+|[a-z]+[A-Z]\w*|[A-Z][a-z0-9]+[A-Z]\w*)\b"
+    r"|\b([A-Za-z_]\w{2,})\("
+)
+
+
+def mentioned_identifiers(text: str, limit: int) -> List[str]:
+    """Up to `limit` code identifiers in `text`, in order of appearance."""
+    names = []
+    for match in IDENTIFIER.finditer(text):
+        for name in (match.group(1) or match.group(2) or match.group(3)).split("."):
+            if len(name) > 2 and not name.startswith("__") and name not in names:
+                names.append(name)
+    return names[:limit]
+
+
+def response_text(message: AIMessage) -> str:
+    """The text of a response and the string arguments of its tool calls."""
+    parts = [message_text(message)]
+    for call in message.tool_calls:
+        parts.extend(str(value) for value in call.get("args", {}).values() if isinstance(value, str))
+    return "\n".join(parts)
+
+
+class Prefetcher(BaseCallbackHandler):
+    """Warms the caches of the files and symbols each LLM response mentions, in the background.
+
+    At most `max_files` files and `max_identifiers` identifiers are taken from one
+    response, files larger than `max_file_bytes` are skipped, and at most
+    `max_bytes` of prefetched content no tool has used yet is kept cached.
+    """
+
+    # The response is handed to the pool right away, even from an async run
+    run_inline = True
+
+    def __init__(self, workspace: WorkspaceContext, workers: int = 2, max_files: int = 8,
+                 max_identifiers: int = 16, max_bytes: int = 64 * 1024 * 1024, max_file_bytes: int = 8 * 1024 * 1024):
+        self.workspace = workspace
+        self.max_files = max_files
+        self.max_identifiers = max_identifiers
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="codehawk-prefetch")
+        self.responses = 0
+        self.files = 0
+        self.bytes = 0
+        self.references = 0
+        self.evicted = 0
+        self.skipped = 0
+        self.file_tool_calls = 0
+        self.served = 0
+        self._warmed: Set[str] = set()
+        # Prefetched files no tool has used yet, oldest first, with their sizes
+        self._resident: "OrderedDict[str, int]" = OrderedDict()
+        self._resident_bytes = 0
+        self._symbols: Optional[Dict[str, List[str]]] = None
+        self._symbols_lock = threading.Lock()
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        messages = [generation.message for generations in response.generations for generation in generations
+                    if isinstance(getattr(generation, "message", None), AIMessage)]
+        for message in messages:
+            with self._lock:
+                self.responses += 1
+            self.submit(self.prefetch, response_text(message))
+
+    def on_tool_start(self, serialized, input_str, *, inputs=None, **kwargs) -> None:
+        paths = [value for key, value in (inputs or {}).items() if key in FILE_ARGUMENTS and isinstance(value, str)]
+        if not paths:
+            return
+        path = self.workspace.resolve(paths[0])
+        with self._lock:
+            self.file_tool_calls += 1
+            if path in self._warmed:
+                self.served += 1
+            # From now on the file is the run's working set, not a speculation
+            self._resident_bytes -= self._resident.pop(path, 0)
+
+    def submit(self, task, *args) -> None:
+        with self._lock:
+            if not self._closed:
+                self.pool.submit(task, *args)
+
+    def prefetch(self, text: str) -> None:
+        """Find the files and identifiers a response mentions and queue the warming of each file."""
+        listing = self.workspace.wait_repo_index(listing_only=True)
+        if listing is None:
+            return
+        identifiers = mentioned_identifiers(text, self.max_identifiers)
+        files = named_files(listing, text)
+        index = self.workspace.wait_repo_index() if identifiers else None
+        if index is not None:
+            symbols = self.symbols(index)
+            for name in identifiers:
+                defining = symbols.get(name, [])
+                # A name defined all over the repository doesn't point at a file
+                if len(defining) <= self.max_files:
+                    files.extend(path for path in defining if path not in files)
+        for path in files[:self.max_files]:
+            self.submit(self.warm, path, identifiers)
+
+    def symbols(self, index) -> Dict[str, List[str]]:
+        """The files defining each class and function name of the repository, built once per run."""
+        with self._symbols_lock:
+            if self._symbols is None:
+                symbols: Dict[str, List[str]] = {}
+                for full_path in index.file_paths():
+                    path = index.file_index.to_relative(full_path)
+                    names = {item["name"] for item in definitions(index, path)}
+                    names.update(tag.name for tag in index.tags.get(full_path, []) if tag.kind == "def")
+                    for name in names:
+                        symbols.setdefault(name, []).append(path)
+                self._symbols = symbols
+            return self._symbols
+
+    def warm(self, path: str, identifiers: List[str]) -> None:
+        """Load a file's line index, outline and the lines referencing the identifiers."""
+        full_path = self.workspace.resolve(path)
+        try:
+            size = os.path.getsize(full_path)
+        except OSError:
+            return
+        if size > self.max_file_bytes or size > self.max_bytes:
+            with self._lock:
+                self.skipped += 1
+            return
+        try:
+            line_index = get_line_index(full_path)
+        except (OSError, ValueError):
+            return
+        self.make_room(full_path, size)
+        index = self.workspace.repo_index
+        if index is not None:
+            index.outline(path)
+        references = 0
+        for name in identifiers:
+            line_index.find_lines(name)
+            references += 1
+        with self._lock:
+            if full_path not in self._warmed:
+                self._warmed.add(full_path)
+                self.files += 1
+                self.bytes += size
+            self.references += references
+
+    def make_room(self, full_path: str, size: int) -> None:
+        """Account for a file about to be prefetched, evicting the oldest unused ones past the cap."""
+        with self._lock:
+            self._resident_bytes -= self._resident.pop(full_path, 0)
+            evicted = []
+            while self._resident and self._resident_bytes + size > self.max_bytes:
+                oldest, oldest_size = self._resident.popitem(last=False)
+                self._resident_bytes -= oldest_size
+                self._warmed.discard(oldest)
+                evicted.append(oldest)
+            self._resident[full_path] = size
+            self._resident_bytes += size
+            self.evicted += len(evicted)
+        for oldest in evicted:
+            invalidate(oldest)
+
+    def close(self) -> None:
+        """Stop prefetching; queued work is dropped, work in progress finishes in the background."""
+        with self._lock:
+            self._closed = True
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def report(self) -> Dict:
+        return {
+            "responses": self.responses,
+            "files": self.files,
+            "bytes": self.bytes,
+            "references": self.references,
+            "evicted": self.evicted,
+            "skipped": self.skipped,
+            "file_tool_calls": self.file_tool_calls,
+            "served": self.served,
+        }
+
+    def summary(self) -> str:
+        text = (f"{self.files} files ({self.bytes / 1024:.0f} KB) and {self.references} references warmed "
+                f"from {self.responses} responses; {self.served} of {self.file_tool_calls} file tool calls "
+                f"served from prefetched files")
+        if self.evicted:
+            text += f", {self.evicted} evicted at the {self.max_bytes // (1024 * 1024)} MB cap"
+        if self.skipped:
+            text += f", {self.skipped} too large to prefetch"
+        return text
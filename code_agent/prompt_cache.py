@@ -0,0 +1,113 @@
+"""Provider prompt caching for the stable parts of every agent call.
+
+Each agent call resends the same system prompt and tool schemas, followed by a
+conversation that only grows at the end. For providers that support cache-control
+breakpoints (Anthropic), breakpoints are placed after the system prompt, after the
+tool definitions and at the end of the conversation prefix, so those tokens are
+read from the provider's cache on later calls. Other providers get the plain
+prompt; their automatic cache hits still show up in the statistics.
+"""
+from typing import Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def supports_prompt_caching(llm) -> bool:
+    """Check whether a chat model accepts cache-control breakpoints.
+
+    Other models can opt in by setting a truthy `supports_cache_control` attribute.
+    """
+    return type(llm).__name__ == "ChatAnthropic" or bool(getattr(llm, "supports_cache_control", False))
+
+
+def cached_system_message(system_prompt: str) -> SystemMessage:
+    """System message with a breakpoint at its end."""
+    return SystemMessage(content=[{"type": "text", "text": system_prompt, "cache_control": CACHE_CONTROL}])
+
+
+def cached_tool_schemas(tools: list) -> List[Dict]:
+    """Tool definitions in Anthropic format, with a breakpoint after the last one."""
+    schemas = []
+    for tool in tools:
+        function = convert_to_openai_tool(tool)["function"]
+        schemas.append({
+            "name": function["name"],
+            "description": function.get("description", ""),
+            "input_schema": function["parameters"],
+        })
+    if schemas:
+        schemas[-1]["cache_control"] = CACHE_CONTROL
+    return schemas
+
+
+def with_breakpoint(message: BaseMessage) -> Optional[BaseMessage]:
+    """Copy of `message` with a breakpoint on its last text block, or None if it has no text to mark."""
+    content = message.content
+    if isinstance(content, str):
+        if not content.strip():
+            return None
+        blocks = [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+    else:
+        if not content or not isinstance(content[-1], dict) or content[-1].get("type") != "text" \
+                or not content[-1].get("text"):
+            return None
+        blocks = list(content[:-1]) + [{**content[-1], "cache_control": CACHE_CONTROL}]
+    return message.model_copy(update={"content": blocks})
+
+
+def mark_conversation_prefix(prompt_value) -> List[BaseMessage]:
+    """Place a breakpoint at the end of the conversation prefix shared with the next call.
+
+    Everything up to the message before the newest one was already sent on the
+    previous call. The stored messages are never modified.
+    """
+    messages = list(prompt_value.to_messages())
+    for i in range(len(messages) - 2, 0, -1):
+        marked = with_breakpoint(messages[i])
+        if marked is not None:
+            messages[i] = marked
+            break
+    return messages
+
+
+class PromptCacheStats:
+    """Cache hit/miss counts collected from the usage metadata of AI responses."""
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.tokens_read = 0
+        self.tokens_written = 0
+        self._seen = set()
+
+    def record(self, message: AIMessage) -> None:
+        usage = getattr(message, "usage_metadata", None)
+        if not usage or message.id in self._seen:
+            return
+        self._seen.add(message.id)
+        details = usage.get("input_token_details") or {}
+        read = details.get("cache_read") or 0
+        written = details.get("cache_creation") or 0
+        self.calls += 1
+        self.tokens_read += read
+        self.tokens_written += written
+        if read:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def record_step(self, step: Dict) -> None:
+        """Record every AI message in a streamed graph step."""
+        for value in step.values():
+            if isinstance(value, dict):
+                for message in value.get("messages", []):
+                    if isinstance(message, AIMessage):
+                        self.record(message)
+
+    def summary(self) -> str:
+        return (f"prompt cache: {self.hits} hits, {self.misses} misses over {self.calls} calls, "
+                f"{self.tokens_read} tokens read from cache, {self.tokens_written} written")
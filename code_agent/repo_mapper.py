@@ -1,18 +1,14 @@
 from collections import defaultdict, namedtuple, Counter
 import math
-import networkx as nx
 from typing import List, Set, Dict, Tuple, Optional
 from pathlib import Path
-from pygments.token import Token
-from pygments.lexers import guess_lexer_for_filename
-from grep_ast import TreeContext, filename_to_lang
-from tree_sitter_languages import get_language, get_parser
 from code_agent.tree_context import to_tree
 from code_agent.code_walker import filter_important_files, is_important
 
 import os
 
 from .progress import Spinner
+from .shared_context import current_workspace
 
 Tag = namedtuple("Tag", "rel_fname fname line name kind")
 
@@ -20,16 +16,26 @@ def get_scm_fname(lang):
     # Load the tags queries
     try:
         # base_path = Path(__file__).parent
-        base_path = Path(os.getcwd())
+        base_path = Path(current_workspace().root_path)
         return base_path.joinpath("queries", f"tree-sitter-{lang}-tags.scm")
     except KeyError:
         return
 
-def get_tags_raw(fname, rel_fname):
+def get_tags_raw(fname, rel_fname, code=None):
+        # tree-sitter, grep_ast and pygments are only loaded once a file is tagged
+        from grep_ast import filename_to_lang
+        from tree_sitter_languages import get_language, get_parser
+
         lang = filename_to_lang(fname)
         if not lang:
             return
 
+        # Without a tags query there is nothing to extract, so skip loading the parser
+        query_scm = get_scm_fname(lang)
+        if not query_scm.exists():
+            return
+        query_scm = query_scm.read_text()
+
         try:
             language = get_language(lang)
             parser = get_parser(lang)
@@ -37,14 +43,10 @@ def get_tags_raw(fname, rel_fname):
             print(f"Skipping file {fname}: {err}")
             return
 
-        query_scm = get_scm_fname(lang)
-        if not query_scm.exists():
-            return
-        query_scm = query_scm.read_text()
-
-        # Read source code
-        with open(fname, 'r', encoding="utf-8") as f:
-            code = f.read()
+        # Read source code, unless the caller already has it
+        if code is None:
+            with open(fname, 'r', encoding="utf-8") as f:
+                code = f.read()
         if not code:
             return
         tree = parser.parse(bytes(code, "utf-8"))
@@ -85,6 +87,9 @@ def get_tags_raw(fname, rel_fname):
         # Some tags files only provide defs (cpp, for example)
         # Use pygments to backfill refs
 
+        from pygments.lexers import guess_lexer_for_filename
+        from pygments.token import Token
+
         try:
             lexer = guess_lexer_for_filename(fname, code)
         except Exception:  # On Windows, bad ref to time.clock which is deprecated?
@@ -104,9 +109,9 @@ def get_tags_raw(fname, rel_fname):
                 line=-1,
             )
 
-def get_tags(fname, rel_fname):
+def get_tags(fname, rel_fname, code=None):
         """Get tags for a single file"""
-        data = list(get_tags_raw(fname, rel_fname))
+        data = list(get_tags_raw(fname, rel_fname, code))
 
         return data
 
@@ -122,7 +127,8 @@ def get_ranked_tags(
     other_fnames: List[str],
     mentioned_fnames: Set[str],
     mentioned_idents: Set[str],
-    progress: Optional[callable] = None
+    progress: Optional[callable] = None,
+    tags_by_file: Optional[Dict[str, List[Tag]]] = None
 ) -> List[Tag]:
     """
     Rank tags based on their importance in the codebase.
@@ -133,10 +139,13 @@ def get_ranked_tags(
         mentioned_fnames: Set of filenames mentioned in the conversation
         mentioned_idents: Set of identifiers mentioned in the conversation
         progress: Optional callback for progress updates
+        tags_by_file: Optional precomputed tags keyed by filename, e.g. from a RepoIndex
     
     Returns:
         List of ranked tags
     """
+    import networkx as nx
+
     defines = defaultdict(set)
     references = defaultdict(list)
     definitions = defaultdict(set)
@@ -166,7 +175,10 @@ def get_ranked_tags(
         if rel_fname in mentioned_fnames:
             personalization[rel_fname] = personalize
 
-        tags = list(get_tags(fname, rel_fname))
+        if tags_by_file is not None and fname in tags_by_file:
+            tags = [tag._replace(rel_fname=rel_fname) for tag in tags_by_file[fname]]
+        else:
+            tags = list(get_tags(fname, rel_fname))
         if tags is None:
             continue
 
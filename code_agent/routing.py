@@ -2,6 +2,18 @@ from typing import Literal
 from langchain_core.messages import AIMessage
 from langgraph.graph import END
 
+# Structured next actions (see actions.py) -> router outputs, checked before the keywords
+# "replan" and "stop" are set by the run governor
+PLANNER_ROUTES = {
+    "analyze_code": "analyze_code",
+    "ask_user": "ask_user",
+    "edit_file": "edit_file",
+    "patch_completed": "__end__",
+    "stop": "__end__",
+}
+ANALYZER_ROUTES = {"analysis_complete": "done", "edit_file": "edit_file", "replan": "done", "stop": "__end__"}
+EDITOR_ROUTES = {"file_opened": "continue", "editing_completed": "done", "replan": "done", "stop": "__end__"}
+
 def router(state) -> Literal[
         "code_edit_tool",
         "code_analysis_tool",
@@ -22,6 +34,8 @@ def router(state) -> Literal[
 
     if last_ai_message.tool_calls:
         return "planner_tool"
+    if state.get("next_action") in PLANNER_ROUTES:
+        return PLANNER_ROUTES[state["next_action"]]
     if "ANALYZE CODE" in last_ai_message.content:
         return "analyze_code"
     if "ASK USER" in last_ai_message.content:
@@ -43,6 +57,8 @@ def code_analyzer_router(state):
 
     if last_ai_message.tool_calls:
         return "code_analysis_tool"
+    if state.get("next_action") in ANALYZER_ROUTES:
+        return ANALYZER_ROUTES[state["next_action"]]
     if "ANALYSIS COMPLETE" in last_ai_message.content:
         return "done"
     if "EDIT FILE" in last_ai_message.content:
@@ -60,6 +76,8 @@ def code_editor_router(state):
 
     if last_ai_message.tool_calls:
         return "code_edit_tool"
+    if state.get("next_action") in EDITOR_ROUTES:
+        return EDITOR_ROUTES[state["next_action"]]
     if "FILE OPENED" in last_ai_message.content:
         return "continue"
     if "EDITING COMPLETED" in last_ai_message.content:
@@ -0,0 +1,397 @@
+"""Long-lived local server that keeps indexes, compiled graphs and LLM clients warm.
+
+Each CLI run pays for the imports, the repository index, a new LLM client and
+the graph compilation before the first request goes out. The server pays them
+once: workspaces stay in the process-wide registry with their structure, tag and
+file indexes, and compiled graphs (with their LLM clients and connection pools)
+are cached per model and options. Runs get their own governor, compactor and
+role statistics through the config, so one graph serves every run.
+
+    python -m code_agent.server [--port 8765 | --socket /tmp/codehawk.sock] [--checkpoint-db FILE]
+    python -m code_agent.client -q "Fix the failing test" -w path/to/repo --auto-approve
+
+Every request needs the server's token as "Authorization: Bearer <token>". The
+token is generated at startup and written, readable only by the owner, next to
+the socket or to ~/.codehawk/server-<port>.token (see client.token_path), where
+the client finds it. Requests with an Origin header, i.e. from a web page, are
+refused, and POST bodies must be sent as application/json, so a page can't drive
+the server with a simple cross-origin request.
+
+Endpoints, all JSON:
+
+    POST /run       run a question; the response streams one NDJSON event per line
+                    ("run_start", "step", "run_end" or "error")
+    POST /warm      start indexing {"workspace_dir": ...} and build the graph ahead of a question
+    POST /approve   decide the queued approval of {"thread_id": ..., "approved": ..., "reason": ...}
+    GET  /status    cached graphs, workspaces and request counts
+    POST /shutdown  stop the server
+
+The server can't prompt, so a run asks for `auto_approve` or sends an "approval"
+policy (see approval.make_approver) whose undecided proposals go to the approval
+queue. A run waiting on the queue ends with "pending_approval" in its result, and
+continues with "resume" once POST /approve (or a reviewer writing to the queue
+directory) decided.
+Changes made outside of the agent are not seen by a warm index until a request
+passes `"refresh": true`.
+"""
+import argparse
+import hmac
+import json
+import os
+import secrets
+import socketserver
+import threading
+import time
+from contextlib import ExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+from langchain_core.messages import BaseMessage
+
+from code_agent import main as agent_main
+from code_agent.approval import DEFAULT_QUEUE_DIR, make_approver, write_decision
+from code_agent.checkpoint import new_thread_id, open_checkpointer
+from code_agent.client import token_path
+from code_agent.event_log import message_fields, serialize_step
+from code_agent.llm_cache import DEFAULT_CACHE_DIR
+from code_agent.shared_context import drop_workspace, get_workspace, list_workspaces
+from code_agent.tiering import ROLES
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Request fields that select a compiled graph, with their defaults
+GRAPH_OPTIONS = {
+    "model": "claude",
+    "temperature": 0,
+    "prompt_caching": True,
+    "llm_cache_mode": None,
+    "llm_cache_dir": DEFAULT_CACHE_DIR,
+    "role_models": None,
+    "escalate": False,
+    "fanout": None,
+}
+
+
+def message_record(message: BaseMessage) -> Dict:
+    return {**message_fields(message), "content": message.content}
+
+
+class AgentServer:
+    """State shared by the server's requests: compiled graphs, LLM clients and the checkpointer."""
+
+    def __init__(self, checkpoint_db: Optional[str] = None, approval_queue: str = DEFAULT_QUEUE_DIR):
+        self.approval_queue = approval_queue
+        self.graphs: Dict[str, Tuple[Dict, object]] = {}
+        self.started = time.monotonic()
+        self.requests = 0
+        self.active_runs = 0
+        self._lock = threading.Lock()
+        self._resources = ExitStack()
+        self.checkpointer = self._resources.enter_context(open_checkpointer(checkpoint_db))
+
+    def close(self) -> None:
+        self._resources.close()
+
+    def graph_for(self, request: Dict) -> Tuple[object, bool]:
+        """The compiled graph for the request's model and options, and whether it was cached."""
+        options = {key: request.get(key, default) for key, default in GRAPH_OPTIONS.items()}
+        options["role_models"] = {role: model for role, model in (options["role_models"] or {}).items() if model} or None
+        key = json.dumps(options, sort_keys=True)
+        with self._lock:
+            if key in self.graphs:
+                return self.graphs[key][1], True
+            # Built under the lock, so concurrent first requests share one client
+            graph = agent_main.build_agent_graph(
+                options["model"], options["temperature"], auto_approve=True,
+                prompt_caching=options["prompt_caching"], llm_cache_mode=options["llm_cache_mode"],
+                llm_cache_dir=options["llm_cache_dir"], checkpointer=self.checkpointer,
+                role_models=options["role_models"], escalate=options["escalate"], fanout=options["fanout"],
+            )
+            self.graphs[key] = (options, graph)
+            return graph, False
+
+    def warm(self, request: Dict) -> Dict:
+        """Start indexing a workspace and build its graph ahead of the first question."""
+        workspace_dir = os.path.realpath(request.get("workspace_dir") or os.getcwd())
+        if request.get("refresh"):
+            drop_workspace(workspace_dir)
+        get_workspace(workspace_dir).start_repo_index()
+        _, cached = self.graph_for(request)
+        return {"workspace": workspace_dir, "graph_cached": cached}
+
+    def approval_options(self, options) -> Dict:
+        """A run's approval options, with the server's queue directory for queued decisions."""
+        if isinstance(options, str):
+            options = {"mode": options}
+        options = dict(options)
+        if options.get("mode", "interactive") == "interactive":
+            raise ValueError("The server can't prompt for approval, send \"auto_approve\": true or an "
+                             "\"approval\" policy whose fallback is the queue")
+        if options["mode"] == "queue":
+            options.setdefault("queue_dir", self.approval_queue)
+            # A request handler never waits on a reviewer
+            options["wait"] = 0
+        if options.get("fallback"):
+            options["fallback"] = self.approval_options(options["fallback"])
+        return options
+
+    def approver_for(self, request: Dict):
+        options = request.get("approval") or ("auto" if request.get("auto_approve") else "interactive")
+        approver = make_approver(self.approval_options(options))
+        if approver.persistent and self.checkpointer is None:
+            raise ValueError("Queued approvals need a server started with --checkpoint-db")
+        return approver
+
+    def validate(self, request: Dict) -> None:
+        self.approver_for(request)
+        if not request.get("question") and not request.get("resume"):
+            raise ValueError("A run needs a \"question\"")
+        if request.get("resume") and (self.checkpointer is None or not request.get("thread_id")):
+            raise ValueError("Resuming needs a server started with --checkpoint-db and a \"thread_id\"")
+        if not isinstance(request.get("model", "claude"), str):
+            raise ValueError("\"model\" must be a model name")
+        unknown_roles = set(request.get("role_models") or {}) - set(ROLES)
+        if unknown_roles:
+            raise ValueError(f"Unknown agent roles: {', '.join(sorted(unknown_roles))}")
+
+    def run(self, request: Dict, emit: Callable[[Dict], None]) -> Dict:
+        """Run one question on a cached graph, emitting an event per streamed step."""
+        received = time.perf_counter()
+        workspace_dir = os.path.realpath(request.get("workspace_dir") or os.getcwd())
+        thread_id = request.get("thread_id") or new_thread_id()
+        resume = bool(request.get("resume"))
+        if request.get("refresh"):
+            drop_workspace(workspace_dir)
+
+        with self._lock:
+            self.requests += 1
+            self.active_runs += 1
+        try:
+            index_warm = get_workspace(workspace_dir).repo_index is not None
+            threshold = request.get("compaction_threshold", 50_000)
+            session = agent_main.RunSession(
+                request.get("question") or "", workspace_dir, model=request.get("model", "claude"),
+                compaction_threshold=threshold or None, keep_recent_turns=request.get("keep_recent_turns", 6),
+                budget=request.get("budget"), checkpointer=self.checkpointer, thread_id=thread_id, resume=resume,
+                approval=self.approver_for(request), prefetch=request.get("prefetch", True), shared_graph=True,
+            )
+            with session:
+                graph, graph_cached = self.graph_for(request)
+                config = session.config
+                state = session.initial_state(graph.get_state(config) if resume else None)
+                emit({"event": "run_start", "thread_id": thread_id, "workspace": workspace_dir,
+                      "graph_cached": graph_cached, "index_warm": index_warm,
+                      "setup_ms": round((time.perf_counter() - received) * 1000, 1)})
+
+                while True:
+                    for item in graph.stream(state, config=config, stream_mode=session.stream_mode):
+                        step = session.record(item)
+                        if step is not None:
+                            emit({"event": "step", "step": serialize_step(step, message_record)})
+
+                    if not session.approver.interrupts:
+                        break
+                    approval = session.approval_request(graph.get_state(config))
+                    if approval is None:
+                        break
+                    state = session.resume_with(approval, session.approver.resolve(approval, thread_id))
+                    if state is None:
+                        break
+
+                result = session.finish()
+                result["wall_s"] = round(time.perf_counter() - received, 3)
+                emit({"event": "run_end", "result": result})
+                return result
+        finally:
+            with self._lock:
+                self.active_runs -= 1
+
+    def status(self) -> Dict:
+        with self._lock:
+            graphs = [options for options, _ in self.graphs.values()]
+            return {
+                "pid": os.getpid(),
+                "uptime_s": round(time.monotonic() - self.started, 1),
+                "requests": self.requests,
+                "active_runs": self.active_runs,
+                "graphs": graphs,
+                "workspaces": {context.root_path: context.repo_index is not None for context in list_workspaces()},
+                "checkpointing": self.checkpointer is not None,
+            }
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end of the AgentServer in `self.server.agent`."""
+
+    server_version = "CodeHawk"
+    # HTTP/1.0: a streamed response ends when the connection closes
+    protocol_version = "HTTP/1.0"
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return str(self.client_address[0]) if self.client_address else "local"
+
+    def log_message(self, format, *args) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_json(self, status: int, body: Dict) -> None:
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def read_json(self, data: bytes) -> Dict:
+        body = json.loads(data or b"{}")
+        if not isinstance(body, dict):
+            raise ValueError("The request body must be a JSON object")
+        return body
+
+    def authorized(self, json_body: bool = False) -> bool:
+        """Check the request comes from a client holding the token rather than a web page, refusing it if not."""
+        if "Origin" in self.headers:
+            self.send_json(403, {"error": "Cross-origin requests are not accepted"})
+            return False
+        if not hmac.compare_digest(self.headers.get("Authorization", "").encode("utf-8"),
+                                   f"Bearer {self.server.token}".encode("utf-8")):
+            self.send_json(401, {"error": "Missing or wrong server token"})
+            return False
+        if json_body and self.headers.get_content_type() != "application/json":
+            self.send_json(415, {"error": "The request body must be sent as application/json"})
+            return False
+        return True
+
+    def do_GET(self) -> None:
+        if not self.authorized():
+            return
+        if self.path == "/status":
+            self.send_json(200, self.server.agent.status())
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_POST(self) -> None:
+        # Read before answering, a refused client may still be sending it
+        data = self.read_body()
+        if not self.authorized(json_body=True):
+            return
+        agent = self.server.agent
+        try:
+            request = self.read_json(data)
+            if self.path == "/run":
+                agent.validate(request)
+            elif self.path == "/warm":
+                self.send_json(200, agent.warm(request))
+                return
+            elif self.path == "/approve":
+                if not request.get("thread_id"):
+                    raise ValueError("An approval needs the \"thread_id\" of the run")
+                self.send_json(200, write_decision(request["thread_id"], bool(request.get("approved")),
+                                                   request.get("reason") or "", request.get("reviewer") or "reviewer",
+                                                   request.get("queue_dir") or agent.approval_queue))
+                return
+            elif self.path == "/shutdown":
+                self.send_json(200, {"stopping": True})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+            else:
+                self.send_json(404, {"error": f"Unknown endpoint {self.path}"})
+                return
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+
+        def emit(event: Dict) -> None:
+            self.wfile.write((json.dumps(event, default=str) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            agent.run(request, emit)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away, the rest of the run is abandoned
+            return
+        except Exception as e:
+            emit({"event": "error", "error": f"{type(e).__name__}: {e}"})
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def write_token(path: str) -> str:
+    """Generate a server token and write it to `path`, readable only by the owner."""
+    token = secrets.token_urlsafe(32)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def serve(agent: AgentServer, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+          socket_path: Optional[str] = None, quiet: bool = False, token_file: Optional[str] = None) -> None:
+    """Serve `agent` on localhost or a Unix socket until /shutdown or Ctrl-C.
+
+    The token is written to `token_file`, by default where the client looks for it.
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        httpd = ThreadingUnixHTTPServer(socket_path, RequestHandler)
+        address = f"unix:{socket_path}"
+    else:
+        httpd = ThreadingHTTPServer((host, port), RequestHandler)
+        httpd.daemon_threads = True
+        address = f"{host}:{httpd.server_address[1]}"
+    token_file = token_file or token_path(address)
+    httpd.agent = agent
+    httpd.quiet = quiet
+    httpd.token = write_token(token_file)
+    print(f"CodeHawk server listening on {address}, token in {token_file}", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        agent.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+        if os.path.exists(token_file):
+            os.unlink(token_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve agent runs from a warm process.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to listen on (localhost only by default)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="Listen on this Unix socket instead of a TCP port")
+    parser.add_argument("--token-file", help="Where to write the token clients authenticate with "
+                                             "(next to the socket or ~/.codehawk/server-PORT.token by default)")
+    parser.add_argument("--checkpoint-db", help="SQLite file runs are checkpointed to, enabling resume")
+    parser.add_argument("--approval-queue", default=DEFAULT_QUEUE_DIR, help="Directory of the queued approvals")
+    parser.add_argument("--warm", action="append", default=[], metavar="WORKSPACE",
+                        help="Start indexing this workspace at startup (repeatable)")
+    parser.add_argument("--quiet", action="store_true", help="Don't log requests or print run summaries")
+    args = parser.parse_args()
+
+    agent_main.console.quiet = args.quiet
+    agent = AgentServer(args.checkpoint_db, args.approval_queue)
+    for workspace_dir in args.warm:
+        get_workspace(workspace_dir).start_repo_index()
+    serve(agent, args.host, args.port, args.socket, args.quiet, args.token_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,202 @@
-"""Module for storing shared context between different parts of the application."""
+"""Module for storing shared context between different parts of the application.
 
-from typing import Dict, Optional
+Every workspace gets one `WorkspaceContext` in a process-wide registry, so runs on
+the same repository share a warm index. The context of the current run is carried
+in a contextvar, which lets tools resolve paths against their own workspace
+without changing the process working directory.
 
-# Global structure variable that will be set by run_agent
-structure: Optional[Dict] = None
+A run starts the repository index on a background thread and goes on compiling
+the graph and calling the planner; the accessors below wait for the part of the
+index they need. The file listing (repo tree and file index) is ready after the
+directory walk, the structure and tags once every file is parsed.
+"""
+
+import os
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Union
+
+from .file_index import FileIndex
+
+if TYPE_CHECKING:
+    from .core import RepoIndex
+
+
+class WorkspaceContext:
+    """State shared by all runs (and their tools) working on one workspace."""
+
+    def __init__(self, root_path: str):
+        self.root_path = os.path.realpath(root_path)
+        self.repo_index: Optional["RepoIndex"] = None
+        self.structure: Optional[Dict] = None
+        self.file_index: Optional[FileIndex] = None
+        self.listing_ready: Optional[Future] = None
+        self.index_ready: Optional[Future] = None
+        self.lock = threading.RLock()
+
+    def resolve(self, path: Optional[str] = None) -> str:
+        """Resolve a path given by an agent against the workspace root."""
+        if not path:
+            return self.root_path
+        path = os.path.expanduser(path)
+        if os.path.isabs(path):
+            return os.path.normpath(path)
+        return os.path.normpath(os.path.join(self.root_path, path))
+
+    def start_repo_index(self) -> Future:
+        """Start building the repository index on a background thread, unless it was already started.
+
+        Returns a future of the index. The build's listing phase resolves
+        `listing_ready` earlier, with the partly built index.
+        """
+        with self.lock:
+            if self.index_ready is None:
+                self.listing_ready, self.index_ready = Future(), Future()
+                if self.repo_index is not None:
+                    self.listing_ready.set_result(self.repo_index)
+                    self.index_ready.set_result(self.repo_index)
+                else:
+                    threading.Thread(target=self._build_repo_index, args=(self.listing_ready, self.index_ready),
+                                     name="codehawk-index", daemon=True).start()
+            return self.index_ready
+
+    def _build_repo_index(self, listing_ready: Future, index_ready: Future) -> None:
+        from .core import RepoIndex
+
+        def listed(repo_index: "RepoIndex") -> None:
+            with self.lock:
+                self.file_index = repo_index.file_index
+            listing_ready.set_result(repo_index)
+
+        try:
+            # Tag queries are looked up in the current workspace
+            with use_workspace(self):
+                repo_index = RepoIndex(self.root_path).build(on_listed=listed)
+        except BaseException as e:
+            with self.lock:
+                # Waiting callers get the error, the next start builds again
+                self.listing_ready = self.index_ready = None
+            if not listing_ready.done():
+                listing_ready.set_exception(e)
+            index_ready.set_exception(e)
+            return
+        with self.lock:
+            self.repo_index = repo_index
+            self.file_index = repo_index.file_index
+        index_ready.set_result(repo_index)
+
+    def ensure_repo_index(self) -> "RepoIndex":
+        """Return the workspace's repository index, building it on first use."""
+        return self.start_repo_index().result()
+
+    def wait_repo_index(self, listing_only: bool = False) -> Optional["RepoIndex"]:
+        """The repository index, waiting for a build in progress; None when none was started.
+
+        With `listing_only` only the listing phase is waited for: the index's
+        repo tree and file index are complete, its structure and tags may not be.
+        """
+        with self.lock:
+            future = self.listing_ready if listing_only else self.index_ready
+        if future is None:
+            return self.repo_index
+        return future.result()
+
+    def set_repo_index(self, new_repo_index: "RepoIndex") -> None:
+        with self.lock:
+            self.repo_index = new_repo_index
+            self.file_index = new_repo_index.file_index
+            if self.index_ready is None or self.index_ready.done():
+                self.listing_ready, self.index_ready = Future(), Future()
+                self.listing_ready.set_result(new_repo_index)
+                self.index_ready.set_result(new_repo_index)
+
+
+_registry: Dict[str, WorkspaceContext] = {}
+_registry_lock = threading.Lock()
+_current: ContextVar[Optional[WorkspaceContext]] = ContextVar("workspace_context", default=None)
+
+
+def get_workspace(root_path: str) -> WorkspaceContext:
+    """Get the registered context for a workspace, creating it if needed."""
+    key = os.path.realpath(root_path)
+    with _registry_lock:
+        context = _registry.get(key)
+        if context is None:
+            context = _registry[key] = WorkspaceContext(key)
+        return context
+
+
+def list_workspaces() -> List[WorkspaceContext]:
+    """The registered workspace contexts."""
+    with _registry_lock:
+        return list(_registry.values())
+
+
+def drop_workspace(root_path: str) -> None:
+    """Forget a workspace and its indexes."""
+    with _registry_lock:
+        _registry.pop(os.path.realpath(root_path), None)
+
+
+@contextmanager
+def use_workspace(workspace: Union[str, WorkspaceContext]) -> Iterator[WorkspaceContext]:
+    """Make `workspace` the current context for this thread or task until the block exits."""
+    context = workspace if isinstance(workspace, WorkspaceContext) else get_workspace(workspace)
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+
+
+def current_workspace() -> WorkspaceContext:
+    """The context of the current run, falling back to the working directory outside of a run."""
+    context = _current.get()
+    if context is None:
+        context = get_workspace(os.getcwd())
+    return context
+
+
+def resolve_path(path: Optional[str] = None) -> str:
+    """Resolve a path against the current run's workspace."""
+    return current_workspace().resolve(path)
+
+
+def set_repo_index(new_repo_index: "RepoIndex") -> None:
+    """Set the repository index of the current workspace, which also provides the structure and file index."""
+    current_workspace().set_repo_index(new_repo_index)
+
+def get_repo_index() -> Optional["RepoIndex"]:
+    """Get a reference to the current workspace's repository index, waiting for a build in progress."""
+    return current_workspace().wait_repo_index()
+
+def get_repo_listing() -> Optional["RepoIndex"]:
+    """The current workspace's repository index once its repo tree and file index are complete."""
+    return current_workspace().wait_repo_index(listing_only=True)
 
 def set_structure(new_structure: Dict) -> None:
-    """Set the global structure variable."""
-    global structure
-    structure = new_structure
+    """Set the structure of the current workspace."""
+    current_workspace().structure = new_structure
 
 def get_structure() -> Optional[Dict]:
     """Get the current structure."""
-    return structure
\ No newline at end of file
+    context = current_workspace()
+    repo_index = context.wait_repo_index()
+    if repo_index is not None:
+        return repo_index.structure
+    return context.structure
+
+def set_file_index(new_file_index: FileIndex) -> None:
+    """Set the file index of the current workspace."""
+    current_workspace().file_index = new_file_index
+
+def get_file_index() -> FileIndex:
+    """Get the current workspace's file index, building one if needed."""
+    context = current_workspace()
+    context.wait_repo_index(listing_only=True)
+    with context.lock:
+        if context.file_index is None:
+            context.file_index = FileIndex.from_directory(context.root_path)
+        return context.file_index
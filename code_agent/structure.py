@@ -2,6 +2,7 @@
 import os
 import ast
 from typing import Dict, Optional
+from .line_index import get_line_index
 
 def get_docstring(node):
     """Extract docstring from AST node if it exists."""
@@ -47,13 +48,98 @@ def get_function_signature(node):
     return signature
 
 
+def get_decorator_name(node) -> str:
+    """Render a decorator expression such as `property`, `app.route` or `lru_cache(...)`."""
+    if isinstance(node, ast.Call):
+        return get_decorator_name(node.func) + "(...)"
+    if isinstance(node, ast.Attribute):
+        return get_decorator_name(node.value) + "." + node.attr
+    if isinstance(node, ast.Name):
+        return node.id
+    return "..."
+
+
+class DefinitionScanner(ast.NodeVisitor):
+    """Collect class and function definitions in a single shallow pass.
+
+    Only module and class bodies (and the blocks of compound statements such as
+    `if` or `try` inside them) are visited. Function bodies are never entered, so
+    nested functions are not reported as top-level ones.
+    """
+
+    def __init__(self, node_text):
+        self.node_text = node_text
+        self.class_info = []
+        self.function_names = []
+        self._methods = []  # Method lists of the enclosing classes
+
+    def visit_Module(self, node):
+        self.visit_block(node.body)
+
+    def visit_block(self, statements):
+        for statement in statements:
+            self.visit(statement)
+
+    def visit_compound(self, node):
+        """Descend into the statement blocks of `if`, `try`, `with` and loop statements."""
+        for field in ("body", "orelse", "finalbody"):
+            self.visit_block(getattr(node, field, []))
+        for handler in getattr(node, "handlers", []):
+            self.visit_block(handler.body)
+
+    visit_If = visit_Try = visit_With = visit_AsyncWith = visit_compound
+    visit_For = visit_AsyncFor = visit_While = visit_compound
+    if hasattr(ast, "TryStar"):
+        visit_TryStar = visit_compound
+
+    def visit_ClassDef(self, node):
+        methods = []
+        self.class_info.append(
+            {
+                "name": node.name,
+                "start_line": node.lineno,
+                "end_line": node.end_lineno,
+                "text": self.node_text(node),
+                "decorators": [get_decorator_name(d) for d in node.decorator_list],
+                "methods": methods
+            }
+        )
+        self._methods.append(methods)
+        self.visit_block(node.body)
+        self._methods.pop()
+
+    def visit_FunctionDef(self, node):
+        is_async = isinstance(node, ast.AsyncFunctionDef)
+        info = {
+            "name": node.name,
+            "signature": get_function_signature(node),
+            "start_line": node.lineno,
+            "end_line": node.end_lineno,
+            "text": self.node_text(node),
+            "decorators": [get_decorator_name(d) for d in node.decorator_list],
+            "is_async": is_async,
+        }
+        if self._methods:
+            info["signature"] = ("async def " if is_async else "def ") + info["signature"]
+            self._methods[-1].append(info)
+        else:
+            self.function_names.append(info)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def generic_visit(self, node):
+        # Expressions and simple statements never contain definitions we report
+        pass
+
+
 def parse_python_file(file_path, file_content=None):
     """Parse a Python file to extract class and function definitions with their line numbers."""
+    index = None
     if file_content is None:
         try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                file_content = file.read()
-                parsed_data = ast.parse(file_content)
+            index = get_line_index(file_path)
+            file_content = index.read_text()
+            parsed_data = ast.parse(file_content)
         except Exception as e:
             print(f"Error in file {file_path}: {e}")
             return [], [], ""
@@ -64,53 +150,41 @@ def parse_python_file(file_path, file_content=None):
             print(f"Error in file {file_path}: {e}")
             return [], [], ""
 
-    class_info = []
-    function_names = []
-    class_methods = set()
-
-    for node in ast.walk(parsed_data):
-        if isinstance(node, ast.ClassDef):
-            methods = []
-            for n in node.body:
-                if isinstance(n, ast.FunctionDef):
-                    methods.append(
-                        {
-                            "name": n.name,
-                            "signature": "def " + get_function_signature(n),
-                            "start_line": n.lineno,
-                            "end_line": n.end_lineno,
-                            "text": "\n".join(file_content.splitlines()[
-                                n.lineno - 1 : n.end_lineno
-                            ]),
-                        }
-                    )
-                    class_methods.add(n.name)
-            class_info.append(
-                {
-                    "name": node.name,
-                    "start_line": node.lineno,
-                    "end_line": node.end_lineno,
-                    "text": "\n".join(file_content.splitlines()[
-                        node.lineno - 1 : node.end_lineno
-                    ]),
-                    "methods": methods
-                }
-            )
-        elif isinstance(node, ast.FunctionDef):
-            if node.name not in class_methods:
-                function_names.append(
-                    {
-                        "name": node.name,
-                        "signature": get_function_signature(node),
-                        "start_line": node.lineno,
-                        "end_line": node.end_lineno,
-                        "text": "\n".join(file_content.splitlines()[
-                            node.lineno - 1 : node.end_lineno
-                        ]),
-                    }
-                )
-
-    return class_info, function_names, file_content.splitlines()
+    # Split once, every definition is sliced from the same list (or from the line index)
+    lines = file_content.splitlines()
+
+    def node_text(node):
+        if index is not None:
+            return index.get_text(node.lineno, node.end_lineno)
+        return "\n".join(lines[node.lineno - 1 : node.end_lineno])
+
+    scanner = DefinitionScanner(node_text)
+    scanner.visit(parsed_data)
+    return scanner.class_info, scanner.function_names, lines
+
+def get_directory_node(structure: Dict, directory_path: str, root: str) -> Dict:
+    """Return the structure node for directory `root` of the repository at `directory_path`, creating it if needed."""
+    repo_name = os.path.basename(directory_path)
+    relative_root = os.path.relpath(root, directory_path)
+    if relative_root == ".":
+        relative_root = repo_name
+    curr_struct = structure
+    for part in relative_root.split(os.sep):
+        if part not in curr_struct:
+            curr_struct[part] = {}
+        curr_struct = curr_struct[part]
+    return curr_struct
+
+def create_file_entry(file_path: str, file_content: Optional[str] = None) -> Dict:
+    """Create the structure entry for a single file."""
+    if not file_path.endswith(".py"):
+        return {}
+    class_info, function_names, file_lines = parse_python_file(file_path, file_content)
+    return {
+        "classes": class_info,
+        "functions": function_names,
+        "text": file_lines,
+    }
 
 def create_structure(directory_path: str) -> Dict:
     """Create the structure of the repository directory by parsing Python files.
@@ -120,25 +194,8 @@ def create_structure(directory_path: str) -> Dict:
     structure = {}
 
     for root, _, files in os.walk(directory_path):
-        repo_name = os.path.basename(directory_path)
-        relative_root = os.path.relpath(root, directory_path)
-        if relative_root == ".":
-            relative_root = repo_name
-        curr_struct = structure
-        for part in relative_root.split(os.sep):
-            if part not in curr_struct:
-                curr_struct[part] = {}
-            curr_struct = curr_struct[part]
+        curr_struct = get_directory_node(structure, directory_path, root)
         for file_name in files:
-            if file_name.endswith(".py"):
-                file_path = os.path.join(root, file_name)
-                class_info, function_names, file_lines = parse_python_file(file_path)
-                curr_struct[file_name] = {
-                    "classes": class_info,
-                    "functions": function_names,
-                    "text": file_lines,
-                }
-            else:
-                curr_struct[file_name] = {}
-
-    return structure
\ No newline at end of file
+            curr_struct[file_name] = create_file_entry(os.path.join(root, file_name))
+
+    return structure
@@ -0,0 +1,151 @@
+"""Per-role models, escalation to the base model and per-role statistics.
+
+Each agent role can run on its own model: a small, fast one for the mostly
+mechanical analyzer and editor turns, the strongest for the planner. With
+escalation, a step whose response is unusable is retried once on the run's base
+model. Unusable means an invalid tool call, a call to a tool the agent doesn't
+have or with arguments its schema rejects, or a stall: no tool call and no
+routing keyword, which would only send the agent back to itself.
+
+`RoleStats` collects calls, escalations, latency and tokens per role and model,
+so the effect of a tiering shows at the end of the run.
+"""
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import BaseTool
+from pydantic import ValidationError
+
+from .actions import ACTION_KEYWORDS
+from .compaction import estimate_tokens, message_text
+from .governor import RunGovernor
+
+ROLES = ("planner", "code_analysis", "code_editor")
+
+
+def model_label(model) -> str:
+    """Short name of a model given by name or as an instance, for the statistics."""
+    if isinstance(model, str):
+        return model
+    for attribute in ("model_id", "model_name", "model"):
+        value = getattr(model, attribute, None)
+        if isinstance(value, str) and value:
+            return value
+    return type(model).__name__
+
+
+def escalation_reason(message: BaseMessage, tools: Dict[str, BaseTool]) -> Optional[str]:
+    """Why a response should be retried on the stronger model, or None when it is usable."""
+    if not isinstance(message, AIMessage):
+        return None
+    if message.invalid_tool_calls:
+        return f"invalid tool call {message.invalid_tool_calls[0].get('name')!r}"
+    for call in message.tool_calls:
+        tool = tools.get(call["name"])
+        if tool is None:
+            return f"unknown tool {call['name']!r}"
+        schema = tool.args_schema
+        if schema is not None and hasattr(schema, "model_validate"):
+            try:
+                schema.model_validate(call["args"])
+            except ValidationError as e:
+                return f"invalid arguments for {call['name']!r} ({e.error_count()} errors)"
+    if not message.tool_calls:
+        text = message_text(message)
+        if not any(keyword in text for keyword in ACTION_KEYWORDS.values()):
+            return "stalled without a tool call or routing keyword"
+    return None
+
+
+class RoleStats:
+    """Calls, escalations, latency and tokens of one run, per agent role."""
+
+    def __init__(self):
+        self.roles: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, role: str, model: str, message: BaseMessage, seconds: float,
+               escalation: Optional[str] = None) -> None:
+        usage = getattr(message, "usage_metadata", None) or {}
+        with self._lock:
+            row = self.roles.setdefault(role, {"calls": 0, "escalations": 0, "latency_s": 0.0,
+                                               "prompt_tokens": 0, "completion_tokens": 0, "models": {}})
+            row["calls"] += 1
+            row["latency_s"] += seconds
+            row["prompt_tokens"] += usage.get("input_tokens", 0)
+            row["completion_tokens"] += usage.get("output_tokens", 0) if usage else estimate_tokens(message)
+            row["models"][model] = row["models"].get(model, 0) + 1
+            if escalation:
+                row["escalations"] += 1
+                row["last_escalation"] = escalation
+
+    def report(self) -> Dict:
+        with self._lock:
+            return {role: {**row, "latency_s": round(row["latency_s"], 3), "models": dict(row["models"])}
+                    for role, row in self.roles.items()}
+
+    def summary(self) -> str:
+        parts = []
+        for role, row in self.report().items():
+            models = ", ".join(f"{model} x{calls}" for model, calls in row["models"].items())
+            text = (f"{role}: {row['calls']} calls ({models}), {row['latency_s']:.1f} s, "
+                    f"{row['prompt_tokens']}/{row['completion_tokens']} tokens")
+            if row["escalations"]:
+                text += f", {row['escalations']} escalated"
+            parts.append(text)
+        return "; ".join(parts)
+
+
+def role_agent(role: str, agent, label: str, fallback=None, fallback_label: str = "",
+               tools: Iterable[BaseTool] = (), stats: Optional[RoleStats] = None,
+               governor: Optional[RunGovernor] = None) -> RunnableLambda:
+    """Wrap a role's agent to record its statistics and, with a `fallback`, escalate unusable responses.
+
+    The run's stats and governor can also come from the config's configurable, as
+    "role_stats" and "governor", for graphs shared between runs.
+    """
+    tools_by_name = {tool.name: tool for tool in tools}
+
+    def run_parts(config):
+        configurable = (config or {}).get("configurable", {})
+        return configurable.get("role_stats", stats), configurable.get("governor", governor)
+
+    def review(message, began, stats, governor) -> Optional[str]:
+        reason = escalation_reason(message, tools_by_name) if fallback is not None else None
+        if stats is not None:
+            stats.record(role, label, message, time.perf_counter() - began, reason)
+        if reason and governor is not None:
+            # The discarded response still counts against the budget
+            governor.count_call(message)
+        return reason
+
+    def record_fallback(message, began, stats) -> None:
+        if stats is not None:
+            stats.record(role, fallback_label, message, time.perf_counter() - began)
+
+    def invoke(state, config):
+        stats, governor = run_parts(config)
+        began = time.perf_counter()
+        message = agent.invoke(state)
+        if review(message, began, stats, governor) is None:
+            return message
+        began = time.perf_counter()
+        message = fallback.invoke(state)
+        record_fallback(message, began, stats)
+        return message
+
+    async def ainvoke(state, config):
+        stats, governor = run_parts(config)
+        began = time.perf_counter()
+        message = await agent.ainvoke(state)
+        if review(message, began, stats, governor) is None:
+            return message
+        began = time.perf_counter()
+        message = await fallback.ainvoke(state)
+        record_fallback(message, began, stats)
+        return message
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=f"{role}_agent")
@@ -1,12 +1,17 @@
 import os
 import ast
-from typing import Optional
-from langchain_core.tools import tool
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+import contextvars
+import functools
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from langchain_core.tools import BaseTool, StructuredTool, tool
 from typing import Dict, Optional
-from .shared_context import get_structure
+from .shared_context import get_structure, get_file_index, get_repo_index, get_repo_listing, resolve_path
+from .line_index import get_line_index, invalidate
 from code_agent.config import GOOGLE_API_KEY, GROQ_API_KEY, ANTHROPIC_API_KEY
-from langchain_anthropic import ChatAnthropic
 
 @tool
 def get_class_info(relative_file_path: str, class_name: str) -> Optional[str]:
@@ -70,7 +75,8 @@ def format_class_and_function_info(info: Dict) -> str:
     if 'functions' in info:
         result.append("\n")
         for func in info['functions']:
-            result.append(f"def {func['name']}{func['signature'][func['signature'].find('('):]} (Lines {func['start_line']}-{func['end_line']}) :")
+            keyword = "async def" if func.get('is_async') else "def"
+            result.append(f"{keyword} {func['name']}{func['signature'][func['signature'].find('('):]} (Lines {func['start_line']}-{func['end_line']}) :")
     return "\n".join(result)
 
 @tool
@@ -81,6 +87,10 @@ def get_class_and_function_info(relative_file_path: str) -> Optional[str]:
     :param relative_file_path: str, The relative file path to look up in the structure
     :return: dict, Information about the file's classes and functions, or None if not found
     """
+    repo_index = get_repo_index()
+    if repo_index is not None:
+        return repo_index.outline(relative_file_path)
+
     structure = get_structure()
     if not structure:
         return "Error: Repository structure not initialized"
@@ -104,13 +114,22 @@ def get_repo_tree(repo_path: str = None) -> str:
 
     Args:
         repo_path (str, optional): Path to the repository.
-                                   If None, uses the current working directory.
+                                   If None, uses the workspace root.
 
     Returns:
         str: The repository tree or an error message.
     """
+    return build_repo_tree(repo_path)
+
+def build_repo_tree(repo_path: str = None) -> str:
+    """Return the repository tree, from the repository index when it covers `repo_path`."""
     try:
-        repo_path = repo_path or os.getcwd()
+        repo_path = resolve_path(repo_path)
+        # Only the listing is needed, the rest of the index may still be building
+        repo_index = get_repo_listing()
+        if repo_index is not None and os.path.realpath(repo_path) == str(repo_index.root_path):
+            return repo_index.repo_tree()
+
         tree = []
         
         for dirpath, dirnames, filenames in os.walk(repo_path):
@@ -137,26 +156,28 @@ def get_repo_tree(repo_path: str = None) -> str:
 import os
 from typing import Optional
 
+# Number of lines shown around `line_number` by open_file
+WINDOW_SIZE = 100
+
 @tool
 def open_file(relative_file_path: str, line_number: Optional[int] = None) -> None:
-    """Opens the file at the given path in the editor with each line prefixed by its line number."""
+    """Opens the file at the given path in the editor with each line prefixed by its line number.
+    If `line_number` is given, only a window of 100 lines around that line is shown."""
     try:
-        # First try as absolute path
-        if os.path.isabs(relative_file_path):
-            file_path = relative_file_path
-        else:
-            # Try relative to current directory
-            file_path = os.path.abspath(relative_file_path)
-            if not os.path.exists(file_path):
-                # Try relative to workspace root if exists
-                workspace = os.getenv("WORKSPACE_ROOT", os.getcwd())
-                file_path = os.path.join(workspace, relative_file_path)
+        # Absolute paths are used as is, relative ones are resolved against the run's workspace
+        file_path = resolve_path(relative_file_path)
 
         print(f"Opening file: {relative_file_path}")
-        with open(file_path, "r", encoding="utf-8") as file:
-            lines_with_numbers = [
-                f"{line_no:2d}: {line.rstrip()}" for line_no, line in enumerate(file, start=1)
-            ]
+        index = get_line_index(file_path)
+        start_line, end_line = 1, index.line_count
+        if line_number:
+            start_line = max(1, line_number - WINDOW_SIZE // 2)
+            end_line = min(index.line_count, start_line + WINDOW_SIZE - 1)
+
+        lines_with_numbers = [
+            f"{line_no:2d}: {line.rstrip()}"
+            for line_no, line in enumerate(index.get_lines(start_line, end_line), start=start_line)
+        ]
         return "\n".join(lines_with_numbers)
     except FileNotFoundError:
         return f"Error: The file at {file_path} was not found."
@@ -179,11 +200,41 @@ def scroll_up() -> None:
     """Moves the window up by 100 lines."""
     print("Scrolling up by 100 lines.")
 
+def replace_file(filename: str, *chunks: bytes) -> None:
+    """Write a file through a temporary file renamed over it.
+
+    Threads still reading the old contents through a line index keep their mapping
+    of the old file, which truncating it in place would pull out from under them.
+    """
+    directory = os.path.dirname(filename) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".codehawk-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        if os.path.exists(filename):
+            shutil.copymode(filename, temp_path)
+        os.replace(temp_path, filename)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def record_file_change(filename: str) -> None:
+    """Keep the repository index (or the plain file index) in sync after a file is written."""
+    repo_index = get_repo_index()
+    if repo_index is not None:
+        repo_index.update_file(filename)
+    else:
+        get_file_index().add(filename)
+
 @tool
 def create_file(filename: str, content: str) -> None:
     """Creates and opens a new file with the given name and writes the provided content to it."""
-    with open(filename, 'w') as file:
-        file.write(content)
+    filename = resolve_path(filename)
+    invalidate(filename)
+    replace_file(filename, content.encode('utf-8'))
+    record_file_change(filename)
     print(f"File '{filename}' created and content written.")
 
 @tool
@@ -208,23 +259,17 @@ def edit_file(start_line: int, end_line: int, content: str, filename: str) -> No
                        - Creates new file if it doesn't exist
                        - Supports both UTF-8 and system default encodings
     """
+    filename = resolve_path(filename)
     if not os.path.exists(filename):
         # Create new file if it doesn't exist
         with open(filename, 'w') as file:
             file.write(content)
+        record_file_change(filename)
         print(f"Created new file '{filename}' with content")
         return
 
-    # Read existing content    
-    try:
-        with open(filename, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-    except UnicodeDecodeError:
-        # Fallback to system default encoding if UTF-8 fails
-        with open(filename, 'r') as file:
-            lines = file.readlines()
-            
-    total_lines = len(lines)
+    index = get_line_index(filename)
+    total_lines = index.line_count
     
     # Validate inputs
     if start_line < 1:
@@ -233,8 +278,10 @@ def edit_file(start_line: int, end_line: int, content: str, filename: str) -> No
         
     # Handle empty files
     if total_lines == 0:
+        invalidate(filename)
         with open(filename, 'w') as file:
             file.write(content + '\n')
+        record_file_change(filename)
         print(f"Added content to empty file '{filename}'")
         return
 
@@ -243,44 +290,49 @@ def edit_file(start_line: int, end_line: int, content: str, filename: str) -> No
     
     # Determine indentation from first non-empty line of existing content
     existing_indent = ""
-    for line in lines:
+    for line_no in range(1, total_lines + 1):
+        line = index.get_line(line_no)
         if line.strip():
             existing_indent = line[:len(line) - len(line.lstrip())]
             break
-            
+
+    # Prepare content with proper indentation, ending the lines as the file's own lines end
+    newline = index.newline.decode('ascii')
+    indented_content = []
+    for line in content_lines:
+        if line.strip():  # Only indent non-empty lines
+            indented_content.append(existing_indent + line + newline)
+        else:
+            indented_content.append(newline)
+    new_bytes = ''.join(indented_content).encode('utf-8')
+
+    # Only the bytes around the edited range are copied, untouched lines are never decoded
+    data = index.data
     # Case 1: Append to end of file
     if start_line > total_lines:
+        prefix = data[:]
         # Ensure there's a newline before appending
-        if lines and not lines[-1].endswith('\n'):
-            lines.append('\n')
-            
-        # Add content with proper indentation
-        for line in content_lines:
-            if line.strip():  # Only indent non-empty lines
-                lines.append(existing_indent + line + '\n')
-            else:
-                lines.append('\n')
+        if not prefix.endswith(b'\n'):
+            prefix += index.newline
+        suffix = b''
                 
     # Case 2: Insert or replace within file
     else:
         # Adjust end_line if it exceeds file length
         end_line = min(end_line, total_lines)
-        
-        # Prepare content with proper indentation
-        indented_content = []
-        for line in content_lines:
-            if line.strip():  # Only indent non-empty lines
-                indented_content.append(existing_indent + line + '\n')
-            else:
-                indented_content.append('\n')
-                
-        # Replace the lines
-        lines[start_line-1:end_line] = indented_content
+        if end_line < start_line:
+            # An empty range inserts before start_line, as the list slice assignment did
+            start_offset = end_offset = index.offsets[start_line - 1]
+        else:
+            start_offset, end_offset = index.byte_range(start_line, end_line)
+        prefix = data[:start_offset]
+        suffix = data[end_offset:]
         
     # Write back to file with error handling
     try:
-        with open(filename, 'w', encoding='utf-8') as file:
-            file.writelines(lines)
+        invalidate(filename)
+        replace_file(filename, prefix, new_bytes, suffix)
+        record_file_change(filename)
             
         if start_line > total_lines:
             print(f"Appended content to '{filename}'")
@@ -293,7 +345,7 @@ def edit_file(start_line: int, end_line: int, content: str, filename: str) -> No
 @tool
 def search_dir(search_term: str, dir_path: str = './') -> None:
     """Searches for `search_term` in all files in the given directory."""
-    for root, _, files in os.walk(dir_path):
+    for root, _, files in os.walk(resolve_path(dir_path)):
         for file in files:
             file_path = os.path.join(root, file)
             with open(file_path, 'r', errors='ignore') as f:
@@ -301,53 +353,47 @@ def search_dir(search_term: str, dir_path: str = './') -> None:
                     print(f"Found '{search_term}' in {file_path}")
 
 @tool
-def search_file(search_term: str, file_path: Optional[str] = None) -> None:
-    """Searches for `search_term` in a specific file."""
+def search_file(search_term: str, file_path: Optional[str] = None) -> str:
+    """Searches for `search_term` in a specific file and returns the numbers of the lines containing it."""
     if not file_path:
         return "Error: No file path provided"
     
     try:
         # Handle file path similarly to open_file
-        if os.path.isabs(file_path):
-            abs_path = file_path
-        else:
-            abs_path = os.path.abspath(file_path)
-            if not os.path.exists(abs_path):
-                workspace = os.getenv("WORKSPACE_ROOT", os.getcwd())
-                abs_path = os.path.join(workspace, file_path)
+        abs_path = resolve_path(file_path)
         
-        with open(abs_path, "r", encoding="utf-8", errors="ignore") as file:
-            content = file.read()
-        
-        if search_term in content:
-            print(f"Found '{search_term}' in {file_path}")
-        else:
-            print(f"'{search_term}' not found in {file_path}")
+        line_numbers = get_line_index(abs_path).find_lines(search_term)
+        if line_numbers:
+            return f"Found '{search_term}' in {file_path} on lines: {', '.join(map(str, line_numbers))}"
+        return f"'{search_term}' not found in {file_path}"
     except FileNotFoundError:
-        print(f"Error: File '{file_path}' not found")
+        return f"Error: File '{file_path}' not found"
     except Exception as e:
-        print(f"Error reading file: {e}")
+        return f"Error reading file: {e}"
 
 @tool
-def find_file(file_name: str, dir_path: str = './') -> None:
-    """Finds all files with the given name in the specified directory."""
-    matches = []
-    for root, _, files in os.walk(dir_path):
-        if file_name in files:
-            matches.append(os.path.join(root, file_name))
-    
-    if matches:
-        print(f"Found {file_name} in:")
-        for match in matches:
-            print(match)
-    else:
-        print(f"File '{file_name}' not found in {dir_path}.")
+def find_file(file_name: str, dir_path: str = './') -> str:
+    """Finds files by name in the specified directory.
+
+    `file_name` may be an exact file name ("core.py"), a trailing path ("code_agent/core.py")
+    or a glob pattern ("test_*.py"). Matching paths are returned best match first.
+    """
+    max_results = 50
+    matches = get_file_index().lookup(file_name, dir_path)
+    if not matches:
+        return f"File '{file_name}' not found in {dir_path}."
+
+    result = [f"Found {len(matches)} match(es) for '{file_name}':"]
+    result.extend(path for _, path in matches[:max_results])
+    if len(matches) > max_results:
+        result.append(f"... {len(matches) - max_results} more, refine the name or pattern to narrow the search")
+    return "\n".join(result)
 
 @tool
 def list_files(dir_path: str = './') -> None:
     """Lists all files in the given directory."""
     try:
-        files = os.listdir(dir_path)
+        files = os.listdir(resolve_path(dir_path))
         print(f"Files in '{dir_path}':")
         for file in files:
             print(file)
@@ -359,7 +405,7 @@ def get_relevant_files(problem_statement: str, repo_path: str = None) -> str:
     """
     Retrieves a list of relevant files to edit based on the problem statement and repository structure.
     :param problem_statement: str, The GitHub problem description.
-    :param repo_path: str, The path to the repository. If None, the current working directory is used.
+    :param repo_path: str, The path to the repository. If None, the workspace root is used.
     :return: str, The list of relevant files.
     """
     obtain_relevant_files_prompt = """
@@ -385,12 +431,14 @@ def get_relevant_files(problem_statement: str, repo_path: str = None) -> str:
 
     """
 
-    repo_path = repo_path or os.getcwd()
-    structure = get_repo_tree(repo_path)
+    repo_path = resolve_path(repo_path)
+    structure = build_repo_tree(repo_path)
     prompt = obtain_relevant_files_prompt.format(problem_statement=problem_statement, structure=structure)
     message = [
         ("human", prompt)
     ]
+    from langchain_anthropic import ChatAnthropic
+
     llm1 = ChatAnthropic(
             model='claude-3-sonnet-20240229',
             temperature=0,
@@ -398,3 +446,33 @@ def get_relevant_files(problem_statement: str, repo_path: str = None) -> str:
         )
     response = llm1.invoke(input=message)
     return response.content
+
+
+# Shared pool for the file I/O of tools called from async runs
+TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="codehawk-tool")
+
+def to_async_tool(sync_tool: BaseTool) -> BaseTool:
+    """Give a sync tool a coroutine that runs it on TOOL_EXECUTOR, keeping the event loop free."""
+    if not isinstance(sync_tool, StructuredTool) or sync_tool.coroutine is not None:
+        return sync_tool
+
+    func = sync_tool.func
+
+    @functools.wraps(func)
+    async def coroutine(*args, **kwargs):
+        # Carry the caller's context (e.g. the current workspace) into the worker thread
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(TOOL_EXECUTOR, call)
+
+    return StructuredTool(
+        name=sync_tool.name,
+        description=sync_tool.description,
+        args_schema=sync_tool.args_schema,
+        func=func,
+        coroutine=coroutine,
+        return_direct=sync_tool.return_direct,
+    )
+
+def to_async_tools(tools: List[BaseTool]) -> List[BaseTool]:
+    return [to_async_tool(t) for t in tools]
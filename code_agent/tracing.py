@@ -0,0 +1,215 @@
+"""Per-node and per-tool tracing of agent runs.
+
+A `Tracer` wraps the agent nodes and the tools of the graph and records one span
+per call: start time, duration, prompt/completion tokens of the AI response,
+output size and the error if the call failed. A node interrupting the graph, e.g.
+to wait for an approval, isn't failing: its span is marked "interrupted". Spans are written as JSONL, one
+Chrome trace "complete" event per line:
+
+    {"name": "planner", "cat": "node", "ph": "X", "ts": ..., "dur": ..., "pid": ..., "tid": ..., "args": {...}}
+
+To open a trace in chrome://tracing or https://ui.perfetto.dev, convert it to the
+JSON object format, or print the summary of a finished trace:
+
+    python -m code_agent.tracing run.trace.jsonl --chrome run.trace.json
+"""
+import argparse
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import BaseTool, StructuredTool
+from langgraph.errors import GraphInterrupt
+from rich.table import Table
+
+
+def output_size(output: Any) -> int:
+    """Characters of a node's messages or a tool's result."""
+    if isinstance(output, dict):
+        return sum(len(str(message.content)) for message in output.get("messages", []))
+    return len(str(output)) if output is not None else 0
+
+
+def token_usage(output: Any) -> Dict[str, int]:
+    """Prompt and completion tokens reported on the AI messages of a node's output."""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    if isinstance(output, dict):
+        for message in output.get("messages", []):
+            metadata = getattr(message, "usage_metadata", None) if isinstance(message, AIMessage) else None
+            if metadata:
+                usage["prompt_tokens"] += metadata.get("input_tokens", 0)
+                usage["completion_tokens"] += metadata.get("output_tokens", 0)
+    return usage
+
+
+class Tracer:
+    """Records spans of node and tool calls and appends them to a JSONL trace file.
+
+    Without a path the spans are only kept in memory, for the summary.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    def record(self, name: str, category: str, start_ns: int, duration_ns: int, args: Dict) -> None:
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start_ns // 1000,
+            "dur": duration_ns // 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self._lock:
+            self.spans.append(event)
+            if self._file is not None:
+                self._file.write(json.dumps(event, default=str) + "\n")
+
+    def span_args(self, output: Any, error: Optional[BaseException], category: str) -> Dict:
+        args = {"output_chars": output_size(output)}
+        if category == "node":
+            args.update(token_usage(output))
+        if isinstance(error, GraphInterrupt):
+            args["interrupted"] = True
+        elif error is not None:
+            args["error"] = f"{type(error).__name__}: {error}"
+        return args
+
+    def timed(self, name: str, category: str, func):
+        """Wrap a sync function so each call is recorded as a span."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start_ns, began = time.time_ns(), time.perf_counter_ns()
+            output, error = None, None
+            try:
+                output = func(*args, **kwargs)
+                return output
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                self.record(name, category, start_ns, time.perf_counter_ns() - began,
+                            self.span_args(output, error, category))
+        return wrapper
+
+    def atimed(self, name: str, category: str, coroutine_func):
+        """Wrap a coroutine function so each call is recorded as a span."""
+        @functools.wraps(coroutine_func)
+        async def wrapper(*args, **kwargs):
+            start_ns, began = time.time_ns(), time.perf_counter_ns()
+            output, error = None, None
+            try:
+                output = await coroutine_func(*args, **kwargs)
+                return output
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                self.record(name, category, start_ns, time.perf_counter_ns() - began,
+                            self.span_args(output, error, category))
+        return wrapper
+
+    def trace_node(self, name: str, node) -> RunnableLambda:
+        """Wrap a graph node (a runnable or a function of the state) in a traced runnable."""
+        if not hasattr(node, "invoke"):
+            return RunnableLambda(self.timed(name, "node", node), name=name)
+
+        def invoke(state, config):
+            return node.invoke(state, config)
+
+        async def ainvoke(state, config):
+            return await node.ainvoke(state, config)
+
+        return RunnableLambda(self.timed(name, "node", invoke), afunc=self.atimed(name, "node", ainvoke), name=name)
+
+    def trace_tool(self, tool: BaseTool) -> BaseTool:
+        if not isinstance(tool, StructuredTool):
+            return tool
+        return StructuredTool(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            func=self.timed(tool.name, "tool", tool.func) if tool.func else None,
+            coroutine=self.atimed(tool.name, "tool", tool.coroutine) if tool.coroutine else None,
+            return_direct=tool.return_direct,
+        )
+
+    def trace_tools(self, tools: List[BaseTool]) -> List[BaseTool]:
+        return [self.trace_tool(t) for t in tools]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def summary_table(self, top: int = 10) -> Table:
+        return summary_table(self.spans, top)
+
+
+def aggregate(spans: Iterable[Dict]) -> List[Dict]:
+    """Per (category, name) totals, slowest total time first."""
+    totals: Dict = defaultdict(lambda: {"calls": 0, "total_us": 0, "max_us": 0, "errors": 0,
+                                        "prompt_tokens": 0, "completion_tokens": 0, "output_chars": 0})
+    for span in spans:
+        row = totals[(span["cat"], span["name"])]
+        args = span.get("args", {})
+        row["calls"] += 1
+        row["total_us"] += span["dur"]
+        row["max_us"] = max(row["max_us"], span["dur"])
+        row["errors"] += "error" in args
+        for key in ("prompt_tokens", "completion_tokens", "output_chars"):
+            row[key] += args.get(key, 0)
+    rows = [{"category": category, "name": name, **row} for (category, name), row in totals.items()]
+    return sorted(rows, key=lambda row: row["total_us"], reverse=True)
+
+
+def summary_table(spans: Iterable[Dict], top: int = 10) -> Table:
+    """Table of the slowest nodes and tools by total time."""
+    table = Table(title="Slowest nodes and tools", show_header=True, header_style="bold magenta")
+    for column in ("Kind", "Name", "Calls", "Total ms", "Mean ms", "Max ms", "Tokens in/out", "Output chars", "Errors"):
+        table.add_column(column, justify="left" if column in ("Kind", "Name") else "right")
+    for row in aggregate(spans)[:top]:
+        tokens = f"{row['prompt_tokens']}/{row['completion_tokens']}" if row["category"] == "node" else ""
+        table.add_row(
+            row["category"], row["name"], str(row["calls"]),
+            f"{row['total_us'] / 1000:.1f}", f"{row['total_us'] / row['calls'] / 1000:.1f}",
+            f"{row['max_us'] / 1000:.1f}", tokens, str(row["output_chars"]), str(row["errors"] or ""),
+        )
+    return table
+
+
+def load_trace(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    from rich.console import Console
+
+    parser = argparse.ArgumentParser(description="Summarize a JSONL trace of an agent run.")
+    parser.add_argument("trace", help="JSONL trace written with --trace")
+    parser.add_argument("--top", type=int, default=15, help="Number of rows in the summary")
+    parser.add_argument("--chrome", help="Also write the trace in Chrome's JSON format to this file")
+    args = parser.parse_args()
+
+    spans = load_trace(args.trace)
+    Console().print(summary_table(spans, args.top))
+    if args.chrome:
+        with open(args.chrome, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": spans, "displayTimeUnit": "ms"}, f)
+
+
+if __name__ == "__main__":
+    main()
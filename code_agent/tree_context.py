@@ -3,6 +3,7 @@ from pathlib import Path
 from collections import defaultdict, namedtuple
 import ast
 import os
+from .line_index import LineIndex, get_line_index
 
 Tag = namedtuple("Tag", "rel_fname fname line name kind")
 
@@ -12,7 +13,7 @@ class TreeContext:
     def __init__(
         self,
         rel_fname: str,
-        code: str,
+        code: Optional[str],
         color: bool = False,
         line_number: bool = False,
         child_context: bool = False,
@@ -21,6 +22,7 @@ class TreeContext:
         mark_lois: bool = False,
         loi_pad: int = 0,
         show_top_of_file_parent_scope: bool = False,
+        line_index: Optional[LineIndex] = None,
     ):
         self.rel_fname = rel_fname
         self.code = code
@@ -32,6 +34,7 @@ class TreeContext:
         self.mark_lois = mark_lois
         self.loi_pad = loi_pad
         self.show_top_of_file_parent_scope = show_top_of_file_parent_scope
+        self.line_index = line_index
         self.lines_of_interest = set()
         self._parsed = None
 
@@ -53,21 +56,33 @@ class TreeContext:
             expanded_lines.update(range(start, end))
         self.lines_of_interest = expanded_lines
 
+    def _numbered_lines(self):
+        """Yield the (0-based index, line) pairs that should be shown."""
+        if self.line_index is None:
+            for i, line in enumerate(self.code.splitlines()):
+                if not self.lines_of_interest or i in self.lines_of_interest:
+                    yield i, line
+        elif not self.lines_of_interest:
+            yield from enumerate(self.line_index.get_lines(1, self.line_index.line_count))
+        else:
+            # Only the lines of interest are sliced out of the file
+            for i in sorted(self.lines_of_interest):
+                if 0 <= i < self.line_index.line_count:
+                    yield i, self.line_index.get_line(i + 1)
+
     def format(self) -> str:
         """Format the code with proper indentation and highlighting."""
-        lines = self.code.splitlines()
         output = []
         
-        for i, line in enumerate(lines):
-            if not self.lines_of_interest or i in self.lines_of_interest:
-                if self.line_number:
-                    line_num = f"{i+1:4d} "
-                else:
-                    line_num = ""
-                    
-                margin = " " * self.margin
-                marked = "→ " if self.mark_lois and i in self.lines_of_interest else "  "
-                output.append(f"{margin}{marked}{line_num}{line}")
+        for i, line in self._numbered_lines():
+            if self.line_number:
+                line_num = f"{i+1:4d} "
+            else:
+                line_num = ""
+                
+            margin = " " * self.margin
+            marked = "→ " if self.mark_lois and i in self.lines_of_interest else "  "
+            output.append(f"{margin}{marked}{line_num}{line}")
 
         return "\n".join(output)
 
@@ -108,17 +123,13 @@ def to_tree(tags: List[tuple], chat_rel_fnames: Set[str]) -> str:
 def render_tree(abs_fname: str, rel_fname: str, lois: List[int]) -> str:
     """Render a tree view of the code file highlighting specific lines."""
     try:
-        with open(abs_fname, 'r', encoding="utf-8") as f:
-            code = f.read()
+        index = get_line_index(abs_fname)
     except Exception as e:
         return f"Error reading file {abs_fname}: {str(e)}"
 
-    if not code.endswith("\n"):
-        code += "\n"
-
     context = TreeContext(
         rel_fname,
-        code,
+        None,
         color=False,
         line_number=False,
         child_context=False,
@@ -127,6 +138,7 @@ def render_tree(abs_fname: str, rel_fname: str, lois: List[int]) -> str:
         mark_lois=False,
         loi_pad=0,
         show_top_of_file_parent_scope=False,
+        line_index=index,
     )
     
     context.lines_of_interest = set()
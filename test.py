@@ -43,13 +43,47 @@ def main():
     parser = argparse.ArgumentParser(description="Run the GitHub Code Agent with a natural language request.")
     parser.add_argument("-q", "--question", type=str, help="The natural language request for the agent")
     parser.add_argument("-m", "--model", type=str, help="The model to use (Claude, Gemini, or LLaMA)")  
+    parser.add_argument("--analysis-model", type=str, help="Model of the code analysis agent (e.g. haiku), defaults to --model")
+    parser.add_argument("--editor-model", type=str, help="Model of the code editing agent (e.g. haiku), defaults to --model")
+    parser.add_argument("--escalate", action="store_true", help="Retry invalid tool calls and stalls of the analysis/editor models on --model")
+    parser.add_argument("--stream", action="store_true", help="Print the agents' responses token by token as they are generated")
+    parser.add_argument("--verbosity", choices=["quiet", "summary", "full"], default="summary", help="Print only the run statistics, the messages with truncated tool results, or everything")
+    parser.add_argument("--fanout", type=int, default=0, help="Analyze up to this many candidate files in parallel, one analyzer each (0 disables)")
+    parser.add_argument("--fanout-concurrency", type=int, default=4, help="Analyzers of --fanout running at once")
+    parser.add_argument("--no-prefetch", action="store_true", help="Don't warm the files and symbols the agents mention ahead of their tool calls")
     parser.add_argument("-w", "--workspace", type=str, help="The workspace directory to analyze (defaults to current working directory)")
+    parser.add_argument("--compaction-threshold", type=int, default=50_000, help="Estimated prompt tokens above which old tool outputs are compacted (0 disables)")
+    parser.add_argument("--llm-cache", choices=["record", "replay", "record-on-miss"], help="Record LLM responses to the cache directory, or replay them")
+    parser.add_argument("--max-llm-calls", type=int, default=60, help="Stop the run after this many LLM calls (0 disables)")
+    parser.add_argument("--max-tokens", type=int, default=0, help="Stop the run after this many prompt + completion tokens (0 disables)")
+    parser.add_argument("--max-tool-calls", type=int, default=120, help="Stop the run after this many tool calls (0 disables)")
+    parser.add_argument("--max-wall-time", type=float, default=0, help="Stop the run after this many seconds (0 disables)")
+    parser.add_argument("--max-repeats", type=int, default=3, help="Identical tool calls or responses in a row that count as a loop (0 disables)")
+    parser.add_argument("--checkpoint-db", type=str, help="SQLite file the run is checkpointed to after every step")
+    parser.add_argument("--thread-id", type=str, help="Checkpoint thread of the run (enables checkpointing)")
+    parser.add_argument("--resume", action="store_true", help="Resume the checkpointed run of --thread-id")
+    parser.add_argument("--log-file", type=str, help="Append a structured JSONL event log of the run to this file")
+    parser.add_argument("--trace", type=str, help="Append a JSONL span per node and tool call to this file")
+    parser.add_argument("--llm-cache-dir", type=str, default=".llm_cache", help="Directory of recorded LLM responses")
+    parser.add_argument("--approval", choices=["interactive", "auto", "policy", "queue"], default="interactive", help="How proposed changes are approved")
+    parser.add_argument("--approve-max-lines", type=int, help="Policy: approve proposals of at most this many lines of code")
+    parser.add_argument("--approve-paths", nargs="+", metavar="GLOB", help="Policy: approve proposals touching only these workspace paths")
+    parser.add_argument("--approval-fallback", choices=["interactive", "queue"], help="Policy: ask or queue the proposals it doesn't approve instead of rejecting them")
+    parser.add_argument("--approval-queue", type=str, default=".codehawk/approvals", help="Directory of queued approvals (see python -m code_agent.approval)")
 
     # Parse arguments
     args = parser.parse_args()
 
+    if args.resume and not args.thread_id:
+        parser.error("--resume needs the --thread-id of the run to resume")
+
+    approval = {"mode": args.approval, "queue_dir": args.approval_queue}
+    if args.approval == "policy":
+        approval.update(max_lines=args.approve_max_lines, allowed_paths=args.approve_paths,
+                        fallback=args.approval_fallback and {"mode": args.approval_fallback, "queue_dir": args.approval_queue})
+
     # Interactive user input
-    if not args.question:
+    if not args.question and not args.resume:
         console.print("\n[bold yellow]💡 What do you need help with?[/]")
         console.print("[bold white]Example: 'Fix a bug in my script' or 'Generate unit tests for my function'[/]\n")
         args.question = Prompt.ask("[bold cyan]🔎 Enter your request[/]")
@@ -85,7 +119,34 @@ def main():
     console.print(f"[bold yellow]📂 Directory:[/] [bold white]{args.workspace}[/]\n")
 
     # Run the agent with provided input
-    run_agent(question=args.question, model=args.model, temperature=0, workspace_dir=args.workspace)
+    run_agent(
+        question=args.question,
+        model=args.model,
+        temperature=0,
+        workspace_dir=args.workspace,
+        compaction_threshold=args.compaction_threshold or None,
+        llm_cache_mode=args.llm_cache,
+        llm_cache_dir=args.llm_cache_dir,
+        log_file=args.log_file,
+        checkpoint_db=args.checkpoint_db,
+        thread_id=args.thread_id,
+        resume=args.resume,
+        trace_file=args.trace,
+        role_models={"code_analysis": args.analysis_model, "code_editor": args.editor_model},
+        escalate=args.escalate,
+        stream_tokens=args.stream,
+        verbosity=args.verbosity,
+        approval=approval,
+        prefetch=not args.no_prefetch,
+        fanout={"max_files": args.fanout, "concurrency": args.fanout_concurrency} if args.fanout else None,
+        budget={
+            "max_llm_calls": args.max_llm_calls or None,
+            "max_tokens": args.max_tokens or None,
+            "max_tool_calls": args.max_tool_calls or None,
+            "max_wall_time": args.max_wall_time or None,
+            "max_repeats": args.max_repeats or None,
+        },
+    )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,100 @@
+"""Cache-control breakpoints placed by create_agent for models that support them."""
+from typing import Any, List, Optional, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from code_agent.core import create_agent
+from code_agent.prompt_cache import CACHE_CONTROL
+
+
+class RecordingChatModel(BaseChatModel):
+    """Answers "done" and records the messages and tool schemas it receives."""
+
+    supports_cache_control: bool = True
+    received: List[List[BaseMessage]] = []
+    tools: List[Any] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording-chat-model"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        self.tools = list(tools)
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        self.received.append(list(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="done"))])
+
+
+@tool
+def open_file(relative_file_path: str) -> str:
+    """Open a file."""
+    return ""
+
+
+@tool
+def search_file(search_term: str, file_path: str) -> str:
+    """Search a file."""
+    return ""
+
+
+def marked(message: BaseMessage) -> bool:
+    return isinstance(message.content, list) and any(
+        isinstance(block, dict) and block.get("cache_control") == CACHE_CONTROL for block in message.content)
+
+
+def conversation() -> List[BaseMessage]:
+    return [
+        HumanMessage(content="Fix the crash in load_settings"),
+        AIMessage(content="Opening the settings module.",
+                  tool_calls=[{"name": "open_file", "args": {"relative_file_path": "settings.py"}, "id": "call_1"}]),
+        ToolMessage(content="1: def load_settings(path):", tool_call_id="call_1"),
+        HumanMessage(content="Keep the public API unchanged"),
+    ]
+
+
+def test_breakpoints_on_system_prompt_tools_and_conversation_prefix():
+    llm = RecordingChatModel()
+    agent = create_agent("You are a planner.", [open_file, search_file], llm)
+    messages = conversation()
+    agent.invoke({"messages": messages})
+
+    sent = llm.received[-1]
+    assert isinstance(sent[0], SystemMessage) and marked(sent[0])
+    assert [schema["name"] for schema in llm.tools] == ["open_file", "search_file"]
+    assert llm.tools[-1]["cache_control"] == CACHE_CONTROL
+    assert "cache_control" not in llm.tools[0]
+
+    # The breakpoint ends the prefix already sent on the previous call: the message before the newest
+    assert [marked(message) for message in sent[1:]] == [False, False, True, False]
+    assert sent[-2].content[-1]["text"] == "1: def load_settings(path):"
+
+
+def test_breakpoint_skips_messages_without_text():
+    llm = RecordingChatModel()
+    agent = create_agent("You are a planner.", [open_file], llm)
+    messages = conversation()[:2]
+    messages[1] = messages[1].model_copy(update={"content": ""})
+    messages.append(ToolMessage(content="1: def load_settings(path):", tool_call_id="call_1"))
+    agent.invoke({"messages": messages})
+
+    sent = llm.received[-1]
+    assert [marked(message) for message in sent[1:]] == [True, False, False]
+
+
+def test_stored_messages_are_not_mutated():
+    llm = RecordingChatModel()
+    agent = create_agent("You are a planner.", [open_file], llm)
+    messages = conversation()
+    before = [message.model_copy(deep=True) for message in messages]
+    agent.invoke({"messages": messages})
+    agent.invoke({"messages": messages + [AIMessage(content="done"), HumanMessage(content="Go on")]})
+
+    assert messages == before
+    assert not any(marked(message) for message in messages)
+    assert all(isinstance(message.content, str) for message in messages)
@@ -0,0 +1,82 @@
+"""Escalation of unusable responses from a role's model to the fallback model."""
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+
+from code_agent.core import create_agent
+from code_agent.fake_llm import FakeChatModel
+from code_agent.governor import RunGovernor
+from code_agent.tiering import RoleStats, escalation_reason, role_agent
+
+
+@tool
+def open_file(relative_file_path: str) -> str:
+    """Open a file."""
+    return ""
+
+
+TOOLS = {"open_file": open_file}
+
+
+def calling(name: str, args: dict) -> AIMessage:
+    return AIMessage(content="Opening the settings module.",
+                     tool_calls=[{"name": name, "args": args, "id": "call_1"}])
+
+
+def tiered(response: AIMessage, governor: RunGovernor, stats: RoleStats):
+    small = FakeChatModel(responses=[response])
+    strong = FakeChatModel(responses=[calling("open_file", {"relative_file_path": "settings.py"})])
+    return role_agent("code_analysis", create_agent("You are an analyzer.", [open_file], small), "small",
+                      fallback=create_agent("You are an analyzer.", [open_file], strong), fallback_label="strong",
+                      tools=[open_file], stats=stats, governor=governor)
+
+
+def state():
+    return {"messages": [HumanMessage(content="Fix the crash in load_settings")]}
+
+
+def test_usable_responses_are_not_escalated():
+    assert escalation_reason(calling("open_file", {"relative_file_path": "settings.py"}), TOOLS) is None
+    assert escalation_reason(AIMessage(content="The loader is fine.\nANALYSIS COMPLETE"), TOOLS) is None
+
+
+def test_stall_unknown_tool_and_rejected_arguments_are_escalated():
+    assert escalation_reason(AIMessage(content="Let me think about it."), TOOLS).startswith("stalled")
+    assert escalation_reason(calling("delete_file", {"path": "settings.py"}), TOOLS) == "unknown tool 'delete_file'"
+    assert escalation_reason(calling("open_file", {"path": "settings.py"}), TOOLS).startswith(
+        "invalid arguments for 'open_file'")
+
+
+def test_unusable_response_is_retried_on_the_fallback():
+    governor, stats = RunGovernor(), RoleStats()
+    agent = tiered(AIMessage(content="Let me think about it."), governor, stats)
+    message = agent.invoke(state())
+
+    assert message.tool_calls[0]["args"] == {"relative_file_path": "settings.py"}
+    row = stats.report()["code_analysis"]
+    assert row["calls"] == 2 and row["escalations"] == 1
+    assert row["models"] == {"small": 1, "strong": 1}
+    assert row["last_escalation"].startswith("stalled")
+    # The discarded response is counted here; the fallback's by the graph node that receives it
+    assert governor.llm_calls == 1
+
+
+def test_async_escalation_counts_the_discarded_call():
+    governor, stats = RunGovernor(), RoleStats()
+    agent = tiered(calling("delete_file", {"path": "settings.py"}), governor, stats)
+    message = asyncio.run(agent.ainvoke(state()))
+
+    assert message.tool_calls[0]["name"] == "open_file"
+    assert stats.report()["code_analysis"]["last_escalation"] == "unknown tool 'delete_file'"
+    assert governor.llm_calls == 1
+
+
+def test_usable_response_skips_the_fallback():
+    governor, stats = RunGovernor(), RoleStats()
+    agent = tiered(AIMessage(content="The loader is fine.\nANALYSIS COMPLETE"), governor, stats)
+    message = agent.invoke(state())
+
+    assert message.content.endswith("ANALYSIS COMPLETE")
+    assert stats.report()["code_analysis"]["models"] == {"small": 1}
+    assert governor.llm_calls == 0